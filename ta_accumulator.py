@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import numpy as np
+
+class SweepAccumulator():
+    '''
+    Running mean and variance of repeated sweeps over the same delay x
+    wavelength grid (Welford's algorithm, one row at a time).
+
+    Memory is the three preallocated arrays whatever the number of sweeps;
+    the individual sweeps are kept on disk by the caller. The mean can be
+    written into an array owned by the caller (for example the rows of
+    TransientAbsorption.ta_array below the wavelength row).
+
+    Usage
+    -----
+    import ta_accumulator
+
+    accumulator = ta_accumulator.SweepAccumulator(n_delays, n_pixels)
+    accumulator.add(i, deltaO)
+    mean, stderr = accumulator.mean, accumulator.stderr()
+    '''
+
+    def __init__(self, n_delays, n_pixels, mean=None):
+        self.count = np.zeros(n_delays, dtype=int)
+        self.mean = mean if mean is not None else np.empty((n_delays, n_pixels))
+        self.mean[:] = 0
+        self.m2 = np.zeros((n_delays, n_pixels))
+
+    def add(self, i, row):
+        self.count[i] += 1
+        delta = row - self.mean[i]
+        self.mean[i] += delta/self.count[i]
+        self.m2[i] += delta*(row - self.mean[i])
+
+    def variance(self):
+        n = self.count[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(n > 1, self.m2/np.maximum(n - 1, 1), np.nan)
+
+    def stderr(self, i=None):
+        '''Standard error of the mean, per pixel (of row i, or of all rows).'''
+        if i is not None:
+            n = self.count[i]
+            return np.sqrt(self.m2[i]/(n - 1)/n) if n > 1 else np.full(self.m2.shape[1], np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.variance()/self.count[:, None])
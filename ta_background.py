@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import numpy as np
+
+class BackgroundCache():
+    '''
+    Dark and pump-scatter reference frames for transient absorption spectra.
+
+    Frames are cached per integration time (us) together with the time they
+    were taken, so they are refreshed on a schedule instead of before every
+    shot.
+
+    -----------------------------------------------------------------------------------------
+        Frame        | Acquired with               | Removed from
+    -----------------------------------------------------------------------------------------
+    dark             | probe blocked, pump closed  | pump-off and pump-on frames
+    -----------------------------------------------------------------------------------------
+    scatter          | probe blocked, pump open    | pump-on frames (includes the dark level)
+    -----------------------------------------------------------------------------------------
+
+    Usage
+    -----
+    import ta_background as bg
+
+    background = bg.BackgroundCache(refresh_s=1800)
+    background.store_dark(10000, dark_frames)
+    background.store_scatter(10000, scatter_frames)
+    off, on = background.correct(10000, spec_off, spec_on)
+    deltaO = bg.delta_od(on, off)
+    '''
+
+    def __init__(self, refresh_s=1800):
+        self.refresh_s = refresh_s
+        self.dark = {}              #integration time -> (timestamp, frame)
+        self.scatter = {}
+
+    def store_dark(self, int_time, frames):
+        self.dark[int_time] = (time.monotonic(), _mean_frame(frames))
+
+    def store_scatter(self, int_time, frames):
+        self.scatter[int_time] = (time.monotonic(), _mean_frame(frames))
+
+    def stale(self, int_time):
+        '''True when the dark or scatter frame for int_time is missing or older than refresh_s.'''
+        now = time.monotonic()
+        for cache in (self.dark, self.scatter):
+            if int_time not in cache or now - cache[int_time][0] > self.refresh_s:
+                return True
+        return False
+
+    def correct(self, int_time, off, on):
+        '''Subtract the cached frames from pump-off and pump-on counts (any leading shape).'''
+        off = np.asarray(off, dtype=float)
+        on = np.asarray(on, dtype=float)
+        if int_time in self.dark:
+            off = off - self.dark[int_time][1]
+        if int_time in self.scatter:
+            on = on - self.scatter[int_time][1]
+        elif int_time in self.dark:
+            on = on - self.dark[int_time][1]
+        return off, on
+
+    def clear(self):
+        self.dark = {}
+        self.scatter = {}
+
+def _mean_frame(frames):
+    frames = np.asarray(frames, dtype=float)
+    if frames.ndim > 1:
+        frames = frames.mean(axis=0)
+    return frames
+
+def delta_od(on, off, floor=1.0):
+    '''
+    -log10(on/off) with counts clipped at floor, so zero or negative
+    background-corrected pixels give a finite deltaO instead of NaN/inf.
+    '''
+    on = np.clip(on, floor, None)
+    off = np.clip(off, floor, None)
+    return - np.log10(on/off)
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Benchmarks of the acquisition and analysis hot paths, run against the
+simulated devices of ta_simulation (no hardware needed).
+
+Usage
+-----
+python ta_benchmark.py
+python ta_benchmark.py --grids 10 50 200 --output bench_<commit>.json
+
+Results are written as JSON together with the git commit, so runs made on
+different commits can be compared.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import importlib.util
+import importlib.machinery
+import numpy as np
+import ta_simulation as sim
+import ta_storage
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APPLICATION = os.path.join(HERE, 'transient_absorption_v3_ed.pyw')
+
+def load_application():
+    '''Import the .pyw program as a module with an offscreen Qt platform.'''
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    loader = importlib.machinery.SourceFileLoader('transient_absorption_v3_ed', APPLICATION)
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    module.escape_pressed = lambda: False           #the Escape polling needs a physical keyboard
+    return module
+
+def simulated_window(module, time_scale, settle):
+    window = module.TransientAbsorption()
+    window.stage = sim.SimulatedBBD201(home=False, position=2200000, time_scale=time_scale)
+    window.shutter = sim.SimulatedSC10(time_scale=time_scale)
+    window.shutter.rs232_set_up('SIM')
+    window.oceanoptics = sim.SimulatedSpectrometer(window.stage, window.shutter, zero=2200000,
+                                                   time_scale=time_scale)
+    window.reference = None
+    window.zero = 2200000
+    window.shutter_settle = settle
+    window.stage_settle = settle
+    window.int_time = 10000
+    window.background.refresh_s = float('inf')
+    window.background.store_dark(window.int_time, np.full(2048, 1500.0))
+    window.background.store_scatter(window.int_time, np.full(2048, 1500.0))
+    return window
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=HERE, capture_output=True,
+                              text=True).stdout.strip()
+    except OSError:
+        return ''
+
+HARDWARE_MODULES = ('seabreeze', 'thorlabs_apt_device', 'pyvisa', 'keyboard', 'serial')
+
+def bench_import(statement, repeats=3):
+    '''Import time of statement in a fresh interpreter and hardware modules it loads.'''
+    code = ('import sys, time\n'
+            't0 = time.perf_counter()\n' + statement + '\n'
+            'print(time.perf_counter() - t0)\n'
+            'print(" ".join(m for m in ' + repr(HARDWARE_MODULES) + ' if m in sys.modules))')
+    times = []
+    for i in range(repeats):
+        result = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True)
+        if result.returncode != 0:
+            return {'error': result.stderr.strip().split('\n')[-1]}
+        lines = result.stdout.split('\n')
+        times.append(float(lines[0]))
+    return {'seconds': min(times), 'hardware_modules': lines[1].split()}
+
+def bench_ta_spectrum(window, repeats):
+    t0 = time.perf_counter()
+    for i in range(repeats):
+        window.ta_spectrum()
+    elapsed = time.perf_counter() - t0
+    return {'repeats': repeats, 'seconds': elapsed, 'spectra_per_s': repeats/elapsed}
+
+def bench_ta_dynamics(window, grids):
+    results = []
+    for n_points in grids:
+        window.dyn_inidelay_lineEdit.setText("-1000")
+        window.dyn_findelay_lineEdit.setText(str(-1000 + 100*(n_points - 1)))
+        window.dyn_stpdelay_lineEdit.setText("100")
+        window.dyn_inttime_lineEdit.setText(str(window.int_time//1000))
+        window.clear()
+        t0 = time.perf_counter()
+        window.ta_dynamics(False)
+        elapsed = time.perf_counter() - t0
+        results.append({'points': n_points, 'seconds': elapsed, 'seconds_per_point': elapsed/n_points})
+    return results
+
+def bench_settle(module, time_scale, settle, n_points=10):
+    '''
+    Seconds per point of a short scan with the program settings (time scale 1,
+    0.5 s settle) and with the ones benchmarked: the latter should be lower,
+    or the benchmark is measuring waits that --settle/--time-scale do not set.
+    '''
+    results = {}
+    for name, (scale, wait) in (('program', (1.0, 0.5)), ('benchmarked', (time_scale, settle))):
+        window = simulated_window(module, scale, wait)
+        results[name] = bench_ta_dynamics(window, [n_points])[0]['seconds_per_point']
+        if window.telemetry is not None:
+            window.telemetry.stop()
+    results['faster'] = results['benchmarked'] < results['program'] or (time_scale, settle) == (1.0, 0.5)
+    return results
+
+def bench_save_load(n_delays, n_pixels):
+    ta_data = np.random.default_rng(0).normal(scale=1e-3, size=(n_pixels, n_delays + 1))    #deltaO-like noise
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        formats = {'txt': (lambda name: np.savetxt(name, ta_data), np.loadtxt),
+                   'npy': (lambda name: np.save(name, ta_data), np.load),
+                   'tac': (lambda name: ta_storage.save_chunked(name, ta_data[:, 1:].T,
+                                                                codec=ta_storage.best_codec()),
+                           lambda name: np.asarray(ta_storage.ChunkedArray(name))),     #program defaults, lossless
+                   'tac_precision': (lambda name: ta_storage.save_chunked(name, ta_data[:, 1:].T,
+                                                                          codec=ta_storage.best_codec(),
+                                                                          precision=1e-6),
+                                     lambda name: np.asarray(ta_storage.ChunkedArray(name)))}     #lossy, opt-in
+        for fmt, (save, load) in formats.items():
+            name = os.path.join(folder, 'scan.' + fmt)
+            t0 = time.perf_counter()
+            save(name)
+            t1 = time.perf_counter()
+            load(name)
+            t2 = time.perf_counter()
+            results[fmt] = {'save_s': t1 - t0, 'load_s': t2 - t1, 'bytes': os.path.getsize(name),
+                            'ratio': ta_data[:, 1:].nbytes/os.path.getsize(name)}     #smaller than float64 by
+    return results
+
+def bench_choose_delay(module, window, repeats):
+    dynamics = module.DynamicsWindow(window)
+    wl = module.TransientAbsorption.wl_array[len(module.TransientAbsorption.wl_array)//2]
+    t0 = time.perf_counter()
+    for i in range(repeats):
+        dynamics.clear()
+        dynamics.choose_delay(str(wl))
+    elapsed = time.perf_counter() - t0
+    dynamics.close()
+    return {'repeats': repeats, 'ms_per_trace': 1000*elapsed/repeats}
+
+def bench_plot(window, repeats):
+    wl = window.oceanoptics.wavelengths()
+    deltaO = np.random.default_rng(0).normal(size=wl.size)
+    window.clear()
+    t0 = time.perf_counter()
+    for i in range(repeats):
+        window.graphicsView.plot(wl, deltaO, pen =(0, 114, 189), symbolPen ='w',
+                                 symbol='o', symbolSize=3, clear=False)
+        window.app.processEvents()
+    elapsed = time.perf_counter() - t0
+    window.clear()
+    return {'repeats': repeats, 'ms_per_plot': 1000*elapsed/repeats}
+
+def bench_burst(window, frames, averages=5):
+    '''
+    Frames/s averaged by spectrum(), one read per frame and with the burst
+    reader thread. Burst mode only helps when averaging (spectra of one frame
+    are read directly), hence averages > 1. The simulated spectrometer has no
+    USB transfer time to hide, so here burst shows its cost only: the frame
+    in flight skipped by every average().
+    '''
+    results = {}
+    window.averages = averages
+    spectra = max(1, frames//averages)
+    for mode in ('single', 'burst'):
+        if mode == 'burst':
+            window.start_burst()
+        t0 = time.perf_counter()
+        for i in range(spectra):
+            window.spectrum()
+        results[mode] = {'frames': spectra*averages, 'averages': averages,
+                         'frames_per_s': spectra*averages/(time.perf_counter() - t0)}
+        if mode == 'burst':
+            results[mode]['reader_frames_per_s'] = window.burst.frame_rate()
+            window.stop_burst()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--grids', type=int, nargs='+', default=[10, 50, 200],
+                        help='number of delay points of the ta_dynamics scans')
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help='scale of the simulated device latencies (0 = instantaneous)')
+    parser.add_argument('--settle', type=float, default=0.0,
+                        help='shutter and stage settle time in s (the program uses 0.5)')
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args(argv)
+
+    module = load_application()
+    app = module.qtw.QApplication.instance() or module.qtw.QApplication([])
+    window = simulated_window(module, args.time_scale, args.settle)
+    window.app = app
+
+    results = {}
+    results['import_analysis'] = bench_import('import ta_benchmark; ta_benchmark.load_application()')
+    results['import_hardware'] = bench_import('import ta_devices, thorlabs_sc10, keyboard, pyvisa, '
+                                              'seabreeze.spectrometers, thorlabs_apt_device')
+    results['ta_spectrum'] = bench_ta_spectrum(window, args.repeats)
+    results['ta_dynamics'] = bench_ta_dynamics(window, args.grids)
+    results['settle'] = bench_settle(module, args.time_scale, args.settle)
+    if not results['settle']['faster']:
+        print('warning: lower --settle/--time-scale did not make the scan points faster', file=sys.stderr)
+    results['save_load'] = bench_save_load(max(args.grids), window.oceanoptics.wl.size)
+    results['choose_delay'] = bench_choose_delay(module, window, args.repeats)
+    results['plot'] = bench_plot(window, args.repeats)
+    results['burst'] = bench_burst(window, args.repeats)
+
+    report = {'commit': git_commit(),
+              'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'settings': vars(args),
+              'results': results}
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(results, indent=2))
+
+if __name__ == '__main__':
+    sys.exit(main())
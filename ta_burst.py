@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import threading
+import numpy as np
+
+class FrameBuffer():
+    '''
+    Preallocated ring buffer of spectra with their arrival time. Frames are
+    numbered from 0 since the last clear(); only the latest capacity frames
+    are kept.
+    '''
+
+    def __init__(self, capacity, pixels):
+        self.frames = np.zeros((capacity, pixels))
+        self.times = np.zeros(capacity)
+        self.count = 0                  #frames written since clear()
+        self.condition = threading.Condition()
+
+    def clear(self):
+        with self.condition:
+            self.count = 0
+
+    def write(self, frame, t):
+        with self.condition:
+            k = self.count % len(self.frames)
+            self.frames[k] = frame
+            self.times[k] = t
+            self.count += 1
+            self.condition.notify_all()
+
+    def get(self, first, n):
+        '''Copy of frames first .. first + n - 1 (they must still be in the buffer).'''
+        with self.condition:
+            if first < self.count - len(self.frames):
+                raise IndexError('Frames overwritten, ring buffer too small')
+            k = np.arange(first, first + n) % len(self.frames)
+            return self.frames[k], self.times[k]
+
+    def wait(self, count, timeout=None):
+        '''Block until count frames have been written; False on timeout.'''
+        with self.condition:
+            return self.condition.wait_for(lambda: self.count >= count, timeout)
+
+class BurstReader():
+    '''
+    Free-running acquisition: a reader thread calls intensities() back to back
+    and stores every frame in a FrameBuffer, so the USB round trip of one
+    frame overlaps the integration of the next and averaging or alignment run
+    at the frame rate of the detector. A single spectrum gains nothing from
+    it (the first frame after a call only ends a frame time later), so
+    spectra of one frame are read directly with read(): burst mode speeds
+    up scans with averages > 1 and the alignment stream only.
+
+    Spectrometers with an on-board spectrum buffer (seabreeze data_buffer
+    feature) keep buffering between reads; mark() clears that buffer too, so
+    frames taken after a mark were integrated after it (the first one may
+    have started before and is skipped by average()).
+
+    Usage
+    -----
+    import ta_burst
+
+    burst = ta_burst.BurstReader(oceanoptics)
+    burst.start(10000)
+    shutter.open_shutter()
+    counts = burst.average(20)              #mean of 20 frames integrated after the call
+    burst.stop()
+    '''
+
+    def __init__(self, spectrometer, capacity=1000):
+        self.spectrometer = spectrometer
+        self.capacity = capacity
+        self.wl = spectrometer.wavelengths()
+        self.buffer = FrameBuffer(capacity, len(self.wl))
+        self.device_buffer = self._device_buffer()
+        self.lock = threading.Lock()    #held by the reader during a read
+        self.int_time = None
+        self.next = 0                   #first frame not returned by stream()
+        self.running = threading.Event()
+        self.reading = threading.Event()    #cleared by read(): the thread pauses
+        self.thread = None
+
+    def _device_buffer(self):
+        data_buffer = getattr(getattr(self.spectrometer, 'f', None), 'data_buffer', None)
+        if data_buffer is None:
+            return None
+        try:
+            data_buffer.set_buffer_capacity(max(data_buffer.get_buffer_capacity_minimum(),
+                                                min(self.capacity, data_buffer.get_buffer_capacity_maximum())))
+            data_buffer.clear()
+        except Exception:                #the feature exists but this model does not support it
+            return None
+        return data_buffer
+
+    def start(self, int_time):
+        self.set_integration_time(int_time)
+        if self.thread is None:
+            self.running.set()
+            self.reading.set()
+            self.thread = threading.Thread(target=self._read, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _read(self):
+        while self.running.is_set():
+            if not self.reading.wait(0.1):
+                continue
+            with self.lock:
+                frame = self.spectrometer.intensities()
+            self.buffer.write(frame, time.monotonic())
+
+    def set_integration_time(self, int_time):
+        if int_time == self.int_time:
+            return
+        with self.lock:
+            self.spectrometer.integration_time_micros(int_time)
+            self.int_time = int_time
+            if self.device_buffer is not None:
+                self.device_buffer.clear()
+            self.buffer.clear()
+            self.next = 0
+
+    def mark(self):
+        '''Number of the first frame whose integration starts after this call (or the one before).'''
+        with self.lock:
+            if self.device_buffer is not None:
+                self.device_buffer.clear()
+            return self.buffer.count
+
+    def read(self):
+        '''
+        One frame read directly, as without burst mode: average(1) waits for
+        the frame in flight and then one more, read() only for its own. The
+        reader thread pauses until the next frames()/average()/stream() call.
+        '''
+        self.reading.clear()
+        with self.lock:
+            if self.device_buffer is not None:
+                self.device_buffer.clear()
+            return self.spectrometer.intensities()
+
+    def frames(self, n, first=None, skip=1, timeout=10.0):
+        '''n frames from first (by default taken after the call), skipping the first skip frames.'''
+        self.reading.set()
+        if first is None:
+            first = self.mark()
+        first += skip
+        if not self.buffer.wait(first + n, timeout + 2*n*self.int_time/1e6):
+            raise TimeoutError('No frames from ' + str(self.spectrometer))
+        return self.buffer.get(first, n)
+
+    def average(self, n=1, first=None, skip=1):
+        return self.frames(n, first, skip)[0].mean(axis=0)
+
+    def stream(self, n=1):
+        '''
+        Mean of the n frames following the ones returned by the previous call
+        (newer ones if those were overwritten): consecutive calls see every
+        frame once, at the full frame rate (alignment, monitoring).
+        '''
+        first = max(self.next, self.buffer.count - self.capacity + n)
+        self.next = first + n
+        return self.frames(n, first, skip=0)[0].mean(axis=0)
+
+    def frame_rate(self, n=20):
+        count = self.buffer.count
+        n = min(n, count, self.capacity)
+        if n < 2:
+            return 0.0
+        times = self.buffer.get(count - n, n)[1]
+        return (n - 1)/(times[-1] - times[0])
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+SQLite catalog of saved TA scans.
+
+Every scan saved by the program is registered with its metadata (sample,
+date, delay and wavelength ranges, integration time, number of sweeps) and
+its path; the columns used for searching are indexed, so a query over
+thousands of scans returns in milliseconds without opening any file. Scans
+saved before the catalog existed are added with index_folder().
+
+Usage
+-----
+import ta_catalog
+
+catalog = ta_catalog.Catalog()
+catalog.register('scans/sample_a.tas', sample='sample_a')
+for entry in catalog.find(sample='sample_a', date_from='2026-10-01', delay=50000):
+    scan = ta_storage.load(entry['path'])
+'''
+
+import os
+import json
+import time
+import sqlite3
+import numpy as np
+import ta_storage
+
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ta_catalog.sqlite')
+
+COLUMNS = ('path', 'sample', 'date', 'format', 'int_time', 'sweeps', 'delay_min', 'delay_max', 'n_delays',
+           'wl_min', 'wl_max', 'n_pixels', 'meta')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,      -- absolute path of the .tas folder or text file
+    sample TEXT,
+    date TEXT,                      -- YYYY-MM-DD HH:MM:SS
+    format TEXT,                    -- tas or txt
+    int_time REAL,                  -- us
+    sweeps INTEGER,
+    delay_min REAL,                 -- fs
+    delay_max REAL,
+    n_delays INTEGER,
+    wl_min REAL,                    -- nm
+    wl_max REAL,
+    n_pixels INTEGER,
+    meta TEXT                       -- meta.json of the scan
+);
+CREATE INDEX IF NOT EXISTS scans_sample ON scans (sample);
+CREATE INDEX IF NOT EXISTS scans_date ON scans (date);
+CREATE INDEX IF NOT EXISTS scans_int_time ON scans (int_time);
+CREATE INDEX IF NOT EXISTS scans_delays ON scans (delay_min, delay_max);
+'''
+
+class Catalog():
+    def __init__(self, file_name=None):
+        self.file_name = file_name if file_name is not None else CATALOG_FILE
+        self.connection = sqlite3.connect(self.file_name)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def describe(self, path, scan=None):
+        '''Catalog fields of the scan at path (read memory-mapped if scan is None).'''
+        if scan is None:
+            scan = ta_storage.load(path)
+        meta = scan.meta
+        date = meta.get('date') or time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(path)))
+        sweeps = meta.get('sweeps')
+        if sweeps is None and 'sweep_count' in scan.extra:
+            sweeps = int(np.max(scan.extra['sweep_count']))
+        delays = np.asarray(scan.delays)
+        return {'path': os.path.abspath(path), 'sample': meta.get('sample'), 'date': date,
+                'format': 'tas' if os.path.isdir(path) else 'txt', 'int_time': meta.get('int_time'),
+                'sweeps': sweeps,
+                'delay_min': float(delays.min()) if delays.size else None,
+                'delay_max': float(delays.max()) if delays.size else None,
+                'n_delays': int(delays.size),
+                'wl_min': float(np.min(scan.wl)) if len(scan.wl) else None,
+                'wl_max': float(np.max(scan.wl)) if len(scan.wl) else None,
+                'n_pixels': int(len(scan.wl)), 'meta': json.dumps(meta)}
+
+    def register(self, path, scan=None, **fields):
+        '''Add or update the scan at path; fields override what is read from the scan.'''
+        entry = self.describe(path, scan)
+        entry.update({name: value for name, value in fields.items() if value is not None})
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO scans (' + ', '.join(COLUMNS) + ') VALUES ('
+                                    + ', '.join('?'*len(COLUMNS)) + ')', [entry[name] for name in COLUMNS])
+        return entry
+
+    def remove(self, path):
+        with self.connection:
+            self.connection.execute('DELETE FROM scans WHERE path = ?', (os.path.abspath(path),))
+
+    def find(self, sample=None, text=None, date_from=None, date_to=None, delay=None, int_time=None,
+             limit=1000):
+        '''
+        Scans matching every criterion given, newest first: sample (SQL LIKE
+        pattern, '%' = any text), text (in sample or path), dates (prefixes
+        such as '2026-10' work), delay (fs, inside the delay range) and
+        int_time (us).
+        '''
+        where, values = [], []
+        if sample is not None:
+            where.append('sample LIKE ?')
+            values.append(sample)
+        if text:
+            where.append('(sample LIKE ? OR path LIKE ?)')
+            values += ['%' + text + '%']*2
+        if date_from is not None:
+            where.append('date >= ?')
+            values.append(date_from)
+        if date_to is not None:
+            where.append('date < ?')
+            values.append(date_to + '\uffff')   #the whole day/month of a prefix
+        if delay is not None:
+            where.append('delay_min <= ? AND delay_max >= ?')
+            values += [delay, delay]
+        if int_time is not None:
+            where.append('int_time = ?')
+            values.append(int_time)
+        query = ('SELECT * FROM scans' + (' WHERE ' + ' AND '.join(where) if where else '')
+                 + ' ORDER BY date DESC LIMIT ?')
+        return [dict(row) for row in self.connection.execute(query, values + [limit])]
+
+    def index_folder(self, folder):
+        '''Register every .tas scan and .txt scan found under folder; returns the number added.'''
+        added = 0
+        for root, folders, files in os.walk(folder):
+            for name in list(folders):
+                if name.endswith(ta_storage.EXTENSION):
+                    folders.remove(name)                #no need to walk inside a scan
+                    added += self._try_register(os.path.join(root, name))
+            for name in files:
+                if name.endswith('.txt') and not name.endswith(('_timing.txt', '_off_index.txt',
+                                                                '_remeasured.txt')):
+                    added += self._try_register(os.path.join(root, name))
+        return added
+
+    def _try_register(self, path):
+        try:
+            self.register(path)
+        except Exception:                               #not a scan
+            return 0
+        return 1
+
+    def prune(self):
+        '''Drop the entries whose file no longer exists; returns how many.'''
+        missing = [row['path'] for row in self.connection.execute('SELECT path FROM scans')
+                   if not os.path.exists(row['path'])]
+        with self.connection:
+            self.connection.executemany('DELETE FROM scans WHERE path = ?', [(path,) for path in missing])
+        return len(missing)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import numpy as np
+
+COUNTS_PER_MM = 20000                   #BBD201 encoder
+MM_PER_FS = 0.0003                      #stage travel per fs of delay
+TRAVEL = (0, 4400000)                   #counts
+BACKLASH = 200                          #counts (10 um) past the target of moves against the approach
+
+class DelayCalibration():
+    '''
+    Conversion between delays (fs) and stage positions (encoder counts),
+    travel limits and the approach of every target.
+
+    counts() and delay() take a number or a whole grid (numpy array) and
+    round the same way everywhere; check() raises ValueError for positions
+    outside the travel, before any move is made. With backlash (counts,
+    BACKLASH by default, 0 turns it off), approach() makes every target be
+    reached moving in the approach direction (+1 = increasing counts):
+    moves the other way first go backlash counts past the target, so the
+    leadscrew is always loaded from the same side and the stage settles on
+    the same position without hunting around it. The controller's own
+    backlash correction (set_move_params) is then set to 0.
+
+    Usage
+    -----
+    import ta_delay
+
+    calibration = ta_delay.DelayCalibration(zero=2200000)
+    counts = calibration.counts(np.arange(-1000, 50000, 500))     #whole grid, checked against the travel
+    calibration.check(counts)
+    for position in calibration.approach(stage.status["position"], counts[0]):
+        stage.move_absolute(position)
+    '''
+
+    def __init__(self, zero=None, counts_per_mm=COUNTS_PER_MM, mm_per_fs=MM_PER_FS, limits=TRAVEL, backlash=BACKLASH,
+                 approach=1):
+        self.zero = zero                #counts at zero delay, None until it is set
+        self.counts_per_mm = counts_per_mm
+        self.mm_per_fs = mm_per_fs
+        self.limits = tuple(limits)     #(min, max) counts
+        self.backlash = backlash        #counts, 0 = no unidirectional approach
+        self.direction = 1 if approach >= 0 else -1
+
+    @property
+    def counts_per_fs(self):
+        return self.mm_per_fs*self.counts_per_mm
+
+    @property
+    def defined(self):
+        return self.zero is not None
+
+    def at(self, zero):
+        '''Same calibration with another zero (for example the center of a zero search).'''
+        return DelayCalibration(zero, self.counts_per_mm, self.mm_per_fs, self.limits, self.backlash, self.direction)
+
+    def distance(self, delay_fs):
+        '''Counts of a delay difference (int, or int64 array for an array).'''
+        counts = np.rint(np.asarray(delay_fs, dtype=float)*self.counts_per_fs).astype(np.int64)
+        return int(counts) if counts.ndim == 0 else counts
+
+    def counts(self, delay_fs):
+        '''Stage position of a delay or of every delay of a grid.'''
+        if self.zero is None:
+            raise ValueError('Delay zero not defined')
+        return self.zero + self.distance(delay_fs)
+
+    def delay(self, counts):
+        '''Delay (fs, float) of a stage position or of an array of them.'''
+        if self.zero is None:
+            raise ValueError('Delay zero not defined')
+        delay = (np.asarray(counts, dtype=float) - self.zero)/self.counts_per_fs
+        return float(delay) if delay.ndim == 0 else delay
+
+    def mm(self, counts):
+        return counts/self.counts_per_mm
+
+    def from_mm(self, position_mm):
+        return int(round(position_mm*self.counts_per_mm))
+
+    def inside(self, counts):
+        counts = np.asarray(counts)
+        return (counts >= self.limits[0]) & (counts <= self.limits[1])
+
+    def check(self, counts):
+        '''Raise ValueError if any position is outside the travel; returns counts.'''
+        outside = ~self.inside(counts)
+        if np.any(outside):
+            first = np.asarray(counts)[outside].flat[0]
+            raise ValueError('Position ' + str(int(first)) + ' counts (' + str(self.mm(first)) + ' mm) outside the '
+                             'stage travel ' + str(self.limits[0]) + ' - ' + str(self.limits[1]) + ' counts')
+        return counts
+
+    def approach(self, current, target):
+        '''Positions to move through from current to target: [target], or [pre-position, target].'''
+        if self.backlash and (target - current)*self.direction < 0:
+            before = min(max(target - self.direction*self.backlash, self.limits[0]), self.limits[1])
+            if before != target:
+                return [before, target]
+        return [target]
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Device discovery and connection for the transient absorption setup.
+
+The stage, the shutter and the spectrometers are connected in parallel, the
+stage is homed only when the controller does not already report it homed,
+and the ports found are written back to ta_devices.json so the next start
+skips the discovery. The driver packages (thorlabs_apt_device, pyvisa,
+seabreeze) are imported only when a device is connected. With a
+ta_replay.Recorder the devices are handed out wrapped by it, and with
+'replay' in the configuration they are played back from a recorded log
+instead of being connected.
+
+Usage
+-----
+import ta_devices
+
+config = ta_devices.load_config()
+futures = ta_devices.connect(config)
+stage = futures['stage'].result()
+'''
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import thorlabs_sc10 as tl
+import ta_reference as ref
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ta_devices.json')
+
+DEFAULTS = {'stage_port': None,             #None = auto-discovery
+            'stage_serial_number': '73',    #BBD201 USB serial numbers start with 73
+            'shutter_port': None,
+            'spectrometer_serial_number': None,
+            'reference_serial_number': None,
+            'simulate': False,
+            'record': None,                 #ta_replay log file of the device traffic, None = not recorded
+            'replay': None,                 #{'file': log, 'speed': 1.0, 'strict': False}: devices played back
+            'delay_calibration': {},       #ta_delay.DelayCalibration arguments: counts_per_mm, mm_per_fs,
+                                            #limits, backlash (counts), approach (+1/-1)
+            'motion_grid': {}}             #ta_motion.MotionTuner.tune settings grid: velocities, accelerations,
+                                            #backlashes (none given = ta_motion.FACTORS of the current ones)
+
+def load_config(file_name=CONFIG_FILE):
+    config = dict(DEFAULTS)
+    if os.path.exists(file_name):
+        with open(file_name) as file:
+            config.update(json.load(file))
+    return config
+
+def save_config(config, file_name=CONFIG_FILE):
+    with open(file_name, 'w') as file:
+        json.dump(config, file, indent=4)
+
+def visa_resource(device):
+    '''pyvisa resource name of a serial port ('COM5' is accepted as it is on Windows).'''
+    if device.upper().startswith('COM'):
+        return device
+    return 'ASRL' + device + '::INSTR'
+
+def home_if_needed(stage, status_wait=0.3):
+    stage.set_enabled(True)
+    time.sleep(status_wait)                         #first status update from the controller
+    if not stage.status_[0][0]['homed']:
+        stage.home()
+    return stage
+
+def connect_stage(port):
+    from thorlabs_apt_device import BBD201
+    return home_if_needed(BBD201(serial_port=port, home=False))  #set up thorlabs translation stage
+
+def find_shutter(exclude=(), timeout=500):
+    '''Ask every serial port (except exclude) for an SC10 id; returns (shutter, port).'''
+    import serial.tools.list_ports
+    for port in serial.tools.list_ports.comports():
+        if port.device in exclude:
+            continue
+        shutter = tl.ThorlabsSC10()
+        try:
+            shutter.rs232_set_up(visa_resource(port.device), timeout)
+            if 'SC10' in shutter.id():
+                shutter.ser.timeout = 25000
+                return shutter, port.device
+            shutter.rs232_close()
+        except Exception:
+            if hasattr(shutter, 'ser'):
+                shutter.rs232_close()
+    raise IOError('Thorlabs SC10 shutter not found')
+
+def connect_shutter(port, exclude=()):
+    if port is None:
+        return find_shutter(exclude)
+    shutter = tl.ThorlabsSC10()                     #set up thorlabs shutter
+    shutter.rs232_set_up(visa_resource(port))
+    shutter.id()
+    return shutter, port
+
+def connect_spectrometers(serial_number, reference_serial_number):
+    '''Main spectrometer and, when a second one is attached, the probe reference.'''
+    from seabreeze.spectrometers import Spectrometer, list_devices
+    devices = list_devices()
+    if serial_number is None:
+        oceanoptics = Spectrometer.from_first_available()  #set up ocean optics spectrometer
+    else:
+        oceanoptics = Spectrometer.from_serial_number(serial_number)
+    reference = None
+    for device in devices:
+        if device.serial_number == oceanoptics.serial_number:
+            continue
+        if reference_serial_number in (None, device.serial_number):
+            reference = ref.SpectrometerReference(Spectrometer(device))
+            break
+    return oceanoptics, reference
+
+def connect_simulated():
+    import ta_simulation as sim
+    stage = home_if_needed(sim.SimulatedBBD201(home=False))
+    shutter = sim.SimulatedSC10()
+    shutter.rs232_set_up('SIM')
+    shutter.id()
+    return {'stage': stage, 'shutter': (shutter, 'SIM'),
+            'spectrometers': (sim.SimulatedSpectrometer(stage, shutter), None)}
+
+def connect_replay(replay):
+    import ta_replay
+    replay = ta_replay.Replay(replay['file'], replay.get('speed', 1.0), replay.get('strict', False))
+    reference = ref.SpectrometerReference(replay.spectrometer('reference')) if 'reference' in replay.info else None
+    return {'stage': replay.stage(), 'shutter': (replay.shutter(), 'REPLAY'),
+            'spectrometers': (replay.spectrometer(), reference)}
+
+def recorded(recorder, name, device):
+    '''Devices of connect() wrapped by a ta_replay.Recorder.'''
+    if name == 'stage':
+        return recorder.stage(device)
+    if name == 'shutter':
+        return recorder.shutter(device[0]), device[1]
+    oceanoptics, reference = device
+    if isinstance(reference, ref.SpectrometerReference):
+        reference.spectrometer = recorder.spectrometer(reference.spectrometer, 'reference')
+    return recorder.spectrometer(oceanoptics), reference
+
+def connect(config, skip=(), recorder=None):
+    '''
+    Start connecting every device not in skip; returns a dict of futures
+    ('stage', 'shutter', 'spectrometers') that finish independently.
+    '''
+    executor = ThreadPoolExecutor(max_workers=3)
+    if config['simulate'] or config['replay']:
+        devices = connect_replay(config['replay']) if config['replay'] else connect_simulated()
+        futures = {name: executor.submit(lambda name=name, device=device: recorded(recorder, name, device)
+                                         if recorder is not None else device)
+                   for name, device in devices.items() if name not in skip}
+        executor.shutdown(wait=False)
+        return futures
+    stage_port = config['stage_port']
+    if stage_port is None:
+        from thorlabs_apt_device import find_device
+        found = find_device(serial_number=config['stage_serial_number'])
+        stage_port = found.device if found is not None else None
+    connections = {'stage': (connect_stage, stage_port),
+                   'shutter': (connect_shutter, config['shutter_port'], (stage_port,)),
+                   'spectrometers': (connect_spectrometers, config['spectrometer_serial_number'],
+                                     config['reference_serial_number'])}
+    futures = {}
+    for name, (function, *arguments) in connections.items():
+        if name in skip:
+            continue
+        if recorder is not None:
+            futures[name] = executor.submit(lambda name=name, function=function, arguments=arguments:
+                                            recorded(recorder, name, function(*arguments)))
+        else:
+            futures[name] = executor.submit(function, *arguments)
+    executor.shutdown(wait=False)
+    if stage_port is not None:
+        config['stage_port'] = stage_port
+    return futures
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import numpy as np
+
+class AutoExposure():
+    '''
+    Integration time and number of averages per spectrum.
+
+    The probe is shot-noise limited, so the signal-to-noise per second is
+    best with the longest exposure that does not saturate: optimize() scales
+    the integration time until the brightest pixels of the region of interest
+    (a high percentile, so a few hot pixels do not count) reach target times
+    the saturation level, then splits the time budget per spectrum into
+    averages of that exposure. recheck() tells when a long scan should run
+    optimize() again: after a saturated frame, when the probe level has
+    drifted by more than drift, or every recheck_s seconds.
+
+    Usage
+    -----
+    import ta_exposure
+
+    exposure = ta_exposure.AutoExposure(read, saturation=65535, limits=(1000, 1000000))
+    int_time, averages = exposure.optimize(10000, budget=100000)    #us
+    '''
+
+    def __init__(self, read, saturation, limits, target=0.8, tolerance=0.1, percentile=99.5,
+                 roi=slice(None), max_iter=8, drift=0.3, recheck_s=600):
+        self.read = read                #callable(int_time) returning the raw counts of one frame
+        self.saturation = saturation
+        self.limits = limits            #(min, max) integration time, us
+        self.target = target
+        self.tolerance = tolerance
+        self.percentile = percentile
+        self.roi = roi
+        self.max_iter = max_iter
+        self.drift = drift
+        self.recheck_s = recheck_s
+        self.int_time = None
+        self.level = None               #probe level of the last optimize()
+        self.t_optimized = None
+        self.saturated = False
+
+    def measure(self, counts):
+        counts = np.asarray(counts)[self.roi]
+        return np.percentile(counts, self.percentile), counts.max() >= self.saturation
+
+    def optimize(self, int_time, budget=None):
+        '''
+        Integration time (us) for the target level, starting from int_time, and
+        the averages filling budget (us per spectrum, one exposure if None).
+        '''
+        goal = self.target*self.saturation
+        for i in range(self.max_iter):
+            level, saturated = self.measure(self.read(int_time))
+            if saturated:
+                new = int_time/4                            #true level unknown above saturation
+            else:
+                if abs(level/goal - 1) <= self.tolerance:
+                    break
+                new = int_time*goal/max(level, 1.0)
+            new = min(max(new, self.limits[0]), self.limits[1])
+            new = max(int(round(new, -3)), 1000)            #whole ms, as typed in the GUI
+            if new == int_time:                             #at a limit
+                break
+            int_time = new
+        else:
+            level, saturated = self.measure(self.read(int_time))
+        self.int_time = int_time
+        self.level = level
+        self.t_optimized = time.monotonic()
+        self.saturated = False
+        averages = max(1, int(round(budget/int_time))) if budget else 1
+        return int_time, averages
+
+    def check(self, counts):
+        '''Watch the frames of a scan; returns True when they call for a new optimize().'''
+        level, saturated = self.measure(counts)
+        self.saturated |= saturated
+        return self.recheck(level)
+
+    def recheck(self, level=None):
+        if self.t_optimized is None or self.saturated:
+            return True
+        if level is not None and abs(level/max(self.level, 1.0) - 1) > self.drift:
+            return True
+        return time.monotonic() - self.t_optimized > self.recheck_s
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Kinetic analysis of saved TA scans: background subtraction, chirp
+correction and multi-exponential fits (with a Gaussian instrument response)
+of wavelength bands, for one scan or a whole series in a process pool.
+
+Every scan is analyzed by one worker, which opens it with ta_storage.load.
+Uncompressed .npy scans are memory-mapped, so only the pages of the columns
+of the chirp grid and of the bands are read, from the page cache shared by
+all processes. Compressed scans (delta_od.tac, the default) are not: every
+delay is needed, so the worker decompresses the whole deltaO block by block
+(kept in the ChunkedArray cache for the band fits) into its own memory.
+
+Usage
+-----
+python ta_kinetics.py scans/*.tas --bands 580:620 700:740 --exp 2 --output series.txt
+python ta_kinetics.py --sample "ZnO%" --bands 580:620
+
+import ta_kinetics
+
+fit = ta_kinetics.fit_kinetic(delays, kinetic, n_exp=2)
+rows = ta_kinetics.batch(paths, [(580, 620)], n_exp=2, output='series.txt')
+'''
+
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+from scipy.optimize import curve_fit
+from scipy.special import erfc, erfcx
+import ta_storage
+
+def exp_irf(t, t0, sigma, tau):
+    '''exp(-(t - t0)/tau) from t0 on, convolved with a Gaussian of width sigma (unit amplitude).'''
+    x = np.asarray(t, dtype=float) - t0
+    z = (sigma**2/tau - x)/(np.sqrt(2)*sigma)
+    with np.errstate(over='ignore', invalid='ignore'):
+        early = 0.5*np.exp(-x**2/(2*sigma**2))*erfcx(np.maximum(z, 0))     #z > 0, no overflow
+        late = 0.5*np.exp(sigma**2/(2*tau**2) - x/tau)*erfc(np.minimum(z, 0))
+    return np.where(z > 0, early, late)
+
+def step_irf(t, t0, sigma):
+    '''Component living longer than the scan: step at t0 convolved with the IRF.'''
+    return 0.5*erfc(-(np.asarray(t, dtype=float) - t0)/(np.sqrt(2)*sigma))
+
+def kinetic(t, t0, sigma, offset, *components):
+    '''offset*step + sum of amplitude*exp for components = (amplitude1, tau1, amplitude2, tau2, ...).'''
+    y = offset*step_irf(t, t0, sigma)
+    for amplitude, tau in zip(components[0::2], components[1::2]):
+        y = y + amplitude*exp_irf(t, t0, sigma, tau)
+    return y
+
+def initial_guess(t, y, n_exp):
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    peak = y[np.argmax(np.abs(y))]
+    step = np.min(np.diff(np.unique(t)))
+    taus = np.geomspace(max(3*step, 50), max(t.max()/3, 6*step), n_exp)
+    p0 = [t[np.argmax(np.abs(y))] - step, max(step, 50), y[-max(1, len(y)//10):].mean()]
+    for tau in taus:
+        p0 += [(peak - p0[2])/n_exp, tau]
+    return p0
+
+def fit_model(function, t, y, p0, lower, sigma_y=None, maxfev=20000):
+    '''
+    Least-squares fit of function(t, *params) to the finite points of y from
+    p0, with params >= lower. Returns params, cov, the residual sum of
+    squares (weighted by sigma_y when given) and the number of points used.
+    '''
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    use = np.isfinite(y)
+    upper = [np.inf]*len(p0)
+    p0 = np.clip(p0, np.array(lower) + 1e-9, upper)
+    params, cov = curve_fit(function, t[use], y[use], p0=p0, bounds=(lower, upper),
+                            sigma=None if sigma_y is None else np.asarray(sigma_y)[use],
+                            absolute_sigma=sigma_y is not None, maxfev=maxfev)
+    residual = y[use] - function(t[use], *params)
+    if sigma_y is not None:
+        residual = residual/np.asarray(sigma_y)[use]
+    return params, cov, float(residual @ residual), int(use.sum())
+
+def fit_kinetic(t, y, n_exp=1, p0=None, sigma_y=None, maxfev=20000):
+    '''
+    Least-squares fit of kinetic(); p0 (for example the parameters of a
+    previous fit) is the starting point. Returns a dict with the parameters,
+    their standard errors ('errors') and the reduced chi-square.
+    '''
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    use = np.isfinite(y)
+    if p0 is None:
+        p0 = initial_guess(t[use], y[use], n_exp)
+    lower = [-np.inf, 1.0, -np.inf] + [-np.inf, 1.0]*n_exp            #sigma, tau > 1 fs
+    params, cov, rss, n = fit_model(kinetic, t, y, p0, lower, sigma_y, maxfev)
+    errors = np.sqrt(np.diag(cov))
+    dof = max(n - len(params), 1)
+    return {'params': params, 'cov': cov, 'chi2': rss/dof,
+            't0': params[0], 'sigma': params[1], 'offset': params[2],
+            'amplitudes': params[3::2], 'taus': params[4::2],
+            'errors': {'t0': errors[0], 'sigma': errors[1], 'offset': errors[2],
+                       'amplitudes': errors[3::2], 'taus': errors[4::2]}}
+
+def subtract_background(delays, delta_od, before=-300):
+    '''Subtract the mean deltaO of the delays before (fs) the pump, column by column.'''
+    pre = np.asarray(delays) < before
+    if not pre.any():
+        return delta_od
+    return delta_od - np.nanmean(delta_od[pre], axis=0)
+
+def estimate_chirp(delays, delta_od, wl, window=2000, degree=2, min_snr=5):
+    '''
+    Time zero of the columns of delta_od, smoothed by a polynomial in
+    wavelength; returns a callable t0(wl). The rise within window fs of zero
+    delay gives a first t0 (ta_zero.fit), refined by a one-exponential fit of
+    the same points, since a fast decay pulls the rise alone early. Columns
+    without a clear signal are ignored.
+    '''
+    import ta_zero                      #here: ta_zero imports this module
+    delays = np.asarray(delays, dtype=float)
+    near = np.abs(delays) <= window
+    t0, weight, used = [], [], []
+    for j in range(delta_od.shape[1]):
+        column = delta_od[near, j]
+        if np.count_nonzero(np.isfinite(column)) < 8:
+            continue
+        rise = ta_zero.fit(delays[near], np.nan_to_num(column))
+        try:
+            fit = fit_kinetic(delays[near], column, 1, p0=[rise[0], rise[1], 0, rise[3], window])
+        except (RuntimeError, ValueError):      #no convergence
+            continue
+        snr = abs(fit['amplitudes'][0])/fit['errors']['amplitudes'][0]
+        if snr > min_snr and np.isfinite(fit['errors']['t0']) and abs(fit['t0']) < window:
+            t0.append(fit['t0'])
+            weight.append(1/max(fit['errors']['t0'], 1.0))
+            used.append(wl[j])
+    if len(used) <= degree:
+        return np.poly1d([0.0])                 #not enough signal: no correction
+    return np.poly1d(np.polyfit(used, t0, degree, w=weight))
+
+def correct_chirp(delays, delta_od, t0):
+    '''Shift every column so that its time zero (t0, one per column) is at zero delay.'''
+    delays = np.asarray(delays, dtype=float)
+    corrected = np.empty(delta_od.shape)
+    for j in range(delta_od.shape[1]):
+        corrected[:, j] = np.interp(delays + t0[j], delays, delta_od[:, j], left=np.nan, right=np.nan)
+    return corrected
+
+def analyze_scan(path, bands, n_exp=1, chirp=True, chirp_stride=32, background_before=-300):
+    '''
+    Background, chirp correction and fit of the mean kinetic of each band
+    (wl_min, wl_max) of the scan at path; one result dict per band.
+    '''
+    scan = ta_storage.load(path)
+    delays = np.asarray(scan.delays, dtype=float)
+    chirp_t0 = np.poly1d([0.0])
+    if chirp:
+        columns = np.arange(0, len(scan.wl), chirp_stride)
+        grid = subtract_background(delays, np.asarray(scan.delta_od[:, columns], dtype=float), background_before)
+        chirp_t0 = estimate_chirp(delays, grid, scan.wl[columns])
+    rows = []
+    for wl_min, wl_max in bands:
+        columns = np.flatnonzero((scan.wl >= wl_min) & (scan.wl <= wl_max))
+        row = {'path': str(scan.path), 'sample': scan.meta.get('sample', ''), 'wl_min': wl_min, 'wl_max': wl_max,
+               'chirp_t0': float(chirp_t0((wl_min + wl_max)/2))}
+        if columns.size == 0:
+            rows.append(dict(row, error='band outside the wavelength range'))
+            continue
+        band = subtract_background(delays, np.asarray(scan.delta_od[:, columns], dtype=float), background_before)
+        band = correct_chirp(delays, band, chirp_t0(scan.wl[columns]))
+        try:
+            measured = np.isfinite(band).any(axis=1)      #shifted rows at the ends are NaN
+            fit = fit_kinetic(delays[measured], np.nanmean(band[measured], axis=1), n_exp)
+        except (RuntimeError, ValueError) as error:     #no convergence
+            rows.append(dict(row, error=str(error)))
+            continue
+        row.update({'t0': fit['t0'], 't0_err': fit['errors']['t0'], 'sigma': fit['sigma'],
+                    'offset': fit['offset'], 'chi2': fit['chi2']})
+        for i in np.argsort(fit['taus']):
+            n = len([name for name in row if name.startswith('tau') and not name.endswith('_err')]) + 1
+            row.update({'A%d' % n: fit['amplitudes'][i], 'A%d_err' % n: fit['errors']['amplitudes'][i],
+                        'tau%d' % n: fit['taus'][i], 'tau%d_err' % n: fit['errors']['taus'][i]})
+        rows.append(row)
+    return rows
+
+def write_table(rows, file_name):
+    columns = []
+    for row in rows:
+        columns += [name for name in row if name not in columns]
+    with open(file_name, 'w') as file:
+        file.write('\t'.join(columns) + '\n')
+        for row in rows:
+            file.write('\t'.join(('%.6g' % row[name] if isinstance(row.get(name), (float, np.floating))
+                                  else str(row.get(name, ''))) for name in columns) + '\n')
+
+def batch(paths, bands, n_exp=1, processes=None, output=None, **options):
+    '''analyze_scan() of every path on all cores; rows in the order of paths.'''
+    rows = []
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for scan_rows in pool.map(partial(analyze_scan, bands=bands, n_exp=n_exp, **options), paths):
+            rows += scan_rows
+    if output is not None:
+        write_table(rows, output)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Kinetic fits of a series of saved TA scans.')
+    parser.add_argument('paths', nargs='*', help='.tas folders or text scans')
+    parser.add_argument('--sample', help='add the catalog scans whose sample matches (SQL LIKE pattern)')
+    parser.add_argument('--bands', nargs='+', required=True, help='wavelength bands in nm, wl_min:wl_max')
+    parser.add_argument('--exp', type=int, default=1, help='number of exponentials')
+    parser.add_argument('--no-chirp', action='store_true')
+    parser.add_argument('--background-before', type=float, default=-300,
+                        help='delays (fs) before this are the background')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default='kinetics.txt')
+    args = parser.parse_args(argv)
+
+    paths = list(args.paths)
+    if args.sample:
+        import ta_catalog
+        catalog = ta_catalog.Catalog()
+        paths += [entry['path'] for entry in catalog.find(sample=args.sample) if entry['path'] not in paths]
+        catalog.close()
+    bands = [tuple(float(value) for value in band.split(':')) for band in args.bands]
+    rows = batch(paths, bands, args.exp, args.processes, args.output, chirp=not args.no_chirp,
+                 background_before=args.background_before)
+    print(str(len(paths)) + ' scans, ' + str(len(rows)) + ' fits -> ' + args.output)
+
+if __name__ == '__main__':
+    sys.exit(main())
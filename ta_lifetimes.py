@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Lifetime density analysis of TA scans.
+
+deltaO(t, wl) is written as a sum over a log-spaced grid of lifetimes of
+exponentials convolved with the Gaussian instrument response
+(ta_kinetics.exp_irf), plus a step for what outlives the scan, and the
+amplitudes of every wavelength column are found by non-negative least
+squares with a Tikhonov (ridge) penalty alpha. deltaO changes sign between
+bleach and absorption bands, so the kernel holds every exponential twice,
+with + and - sign, and the map is the difference of the two halves.
+
+All columns are solved at once by ADMM: every iteration is one (lifetimes x
+lifetimes) by (lifetimes x wavelengths) matrix product with the inverse of
+the regularized Gram matrix, and a couple of dozen iterations are enough,
+so a full detector (2048 columns) takes well under a second. The kernel
+and that inverse depend only on the delay axis, the grid, the IRF and
+alpha, and are cached: a series of scans with the same delays builds them
+once.
+
+Usage
+-----
+import ta_lifetimes
+
+taus = ta_lifetimes.tau_grid(100, 1e6, 100)                         #fs
+result = ta_lifetimes.distribution(delays, delta_od, taus, sigma=80, alpha=0.01)
+result.amplitudes                                                   #lifetimes x wavelengths
+result = ta_lifetimes.analyze_scan('sample.tas', taus)              #background, chirp, map
+'''
+
+from functools import lru_cache
+import numpy as np
+import ta_kinetics
+import ta_storage
+
+def tau_grid(tau_min, tau_max, n=100):
+    '''Log-spaced lifetimes (fs).'''
+    return np.geomspace(tau_min, tau_max, n)
+
+def kernel(delays, taus, sigma, t0=0.0, offset=True):
+    '''Delays x (lifetimes [+ step]) matrix of unit-amplitude decays convolved with the IRF.'''
+    delays = np.asarray(delays, dtype=float)
+    columns = [ta_kinetics.exp_irf(delays, t0, sigma, tau) for tau in taus]
+    if offset:
+        columns.append(ta_kinetics.step_irf(delays, t0, sigma))
+    return np.column_stack(columns)
+
+@lru_cache(maxsize=16)
+def _system(delays, taus, sigma, t0, offset, alpha):
+    '''Signed kernel, ADMM matrix and penalty rho; arguments are hashable copies.'''
+    k = kernel(np.frombuffer(delays), np.frombuffer(taus), sigma, t0, offset)
+    k = np.hstack((k, -k))
+    gram = k.T @ k
+    scale = np.linalg.eigvalsh(gram)[-1]
+    rho = max(alpha**2, 1e-6)*scale                         #about the ridge: fastest convergence
+    gram += alpha**2*scale*np.eye(len(gram))               #alpha relative to the largest singular value
+    return k, np.linalg.inv(gram + rho*np.eye(len(gram))), rho
+
+def system(delays, taus, sigma, t0=0.0, offset=True, alpha=0.01):
+    return _system(np.ascontiguousarray(delays, dtype=float).tobytes(),
+                   np.ascontiguousarray(taus, dtype=float).tobytes(), float(sigma), float(t0), bool(offset),
+                   float(alpha))
+
+def nnls(inverse, kty, rho, max_iter=500, tol=1e-6):
+    '''
+    min |K x - y|^2 + penalty over x >= 0, for every column of y at once
+    (ADMM), given inverse = (K'K + penalty + rho)^-1 and kty = K'y.
+    '''
+    start = inverse @ kty
+    z = np.zeros_like(kty)
+    u = np.zeros_like(kty)
+    for iteration in range(max_iter):
+        x = start + rho*(inverse @ (z - u))
+        previous = z
+        z = np.maximum(x + u, 0)
+        u += x - z
+        if (np.linalg.norm(x - z) <= tol*np.linalg.norm(z)
+                and rho*np.linalg.norm(z - previous) <= tol*np.linalg.norm(kty)):
+            break
+    return z, iteration + 1
+
+class Distribution():
+    def __init__(self, taus, wl, amplitudes, offset, fitted, residual, iterations):
+        self.taus = taus                #fs
+        self.wl = wl                    #nm (None if not given)
+        self.amplitudes = amplitudes    #lifetimes x wavelengths, signed
+        self.offset = offset            #per wavelength, None without the step component
+        self.fitted = fitted            #delays x wavelengths
+        self.residual = residual        #rms per wavelength
+        self.iterations = iterations
+
+    def save(self, file_name):
+        '''Text map: first column the lifetimes, one column per wavelength, wavelengths in the header.'''
+        header = ' '.join('%.3f' % value for value in self.wl) if self.wl is not None else ''
+        np.savetxt(file_name, np.column_stack((self.taus, self.amplitudes)), header=header)
+
+def distribution(delays, delta_od, taus, sigma=100.0, t0=0.0, alpha=0.01, offset=True, wl=None,
+                 max_iter=500, tol=1e-6):
+    '''
+    Lifetime density of every column of delta_od (delays x wavelengths).
+    Delays with a NaN in any column are left out; alpha is the ridge
+    penalty relative to the largest singular value of the kernel.
+    '''
+    delays = np.asarray(delays, dtype=float)
+    delta_od = np.asarray(delta_od, dtype=float)
+    rows = np.isfinite(delta_od).all(axis=1)
+    k, inverse, rho = system(delays[rows], taus, sigma, t0, offset, alpha)
+    x, iterations = nnls(inverse, k.T @ delta_od[rows], rho, max_iter, tol)
+    half = len(x)//2
+    signed = x[:half] - x[half:]
+    fitted = kernel(delays, taus, sigma, t0, offset) @ signed
+    residual = np.sqrt(np.mean((fitted[rows] - delta_od[rows])**2, axis=0))
+    return Distribution(np.asarray(taus), wl, signed[:len(taus)], signed[len(taus)] if offset else None,
+                        fitted, residual, iterations)
+
+def analyze_scan(path, taus=None, sigma=None, alpha=0.01, chirp=True, background_before=-300, **options):
+    '''
+    Background subtraction, chirp correction and lifetime map of the scan at
+    path. Without sigma, the IRF width is fitted on the strongest column.
+    '''
+    scan = ta_storage.load(path)
+    delays = np.asarray(scan.delays, dtype=float)
+    delta_od = ta_kinetics.subtract_background(delays, np.asarray(scan.delta_od, dtype=float), background_before)
+    if chirp:
+        columns = np.arange(0, len(scan.wl), 32)
+        t0 = ta_kinetics.estimate_chirp(delays, delta_od[:, columns], scan.wl[columns])
+        delta_od = ta_kinetics.correct_chirp(delays, delta_od, t0(scan.wl))
+    if taus is None:
+        step = np.min(np.diff(np.unique(delays)))
+        taus = tau_grid(max(step, 10), 2*delays.max(), 100)
+    if sigma is None:
+        strongest = np.nanargmax(np.nanmax(np.abs(delta_od), axis=0))
+        sigma = ta_kinetics.fit_kinetic(delays, delta_od[:, strongest], 1)['sigma']
+    return distribution(delays, delta_od, taus, sigma, 0.0, alpha, wl=np.asarray(scan.wl), **options)
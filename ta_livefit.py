@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import numpy as np
+from scipy.stats import norm
+import ta_kinetics
+
+class LiveFit():
+    '''
+    Kinetic fit of wavelength bands updated while a scan runs.
+
+    update() is called with the mean deltaO of the delays measured so far;
+    every band is fitted again starting from its previous parameters, so an
+    update costs a few model evaluations instead of a fit from scratch (the
+    first fit of a band, and any fit that fails, start from
+    ta_kinetics.initial_guess). A band has converged when, for patience
+    updates in a row, no lifetime moved by more than rtol and every lifetime
+    is known within ci_target (relative half width of the confidence
+    interval at level).
+
+    Usage
+    -----
+    import ta_livefit
+
+    live = ta_livefit.LiveFit([(580, 620), (700, 740)], n_exp=2)
+    live.update(wl, delays[measured], mean[measured])      #after every delay point
+    print(live.summary())
+    if live.converged: ...
+    '''
+
+    def __init__(self, bands, n_exp=1, rtol=0.02, ci_target=0.1, patience=3, level=0.95,
+                 background_before=-300, maxfev=400):
+        self.bands = bands              #(wl_min, wl_max) in nm
+        self.n_exp = n_exp
+        self.rtol = rtol
+        self.ci_target = ci_target
+        self.patience = patience
+        self.z = norm.ppf(0.5 + level/2)  #half width of the intervals in standard errors
+        self.background_before = background_before
+        self.maxfev = maxfev            #per update, warm started
+        self.reset()
+
+    def reset(self):
+        self.fits = [None]*len(self.bands)
+        self.stable = [0]*len(self.bands)  #updates in a row meeting the convergence criteria
+
+    def interval(self, fit):
+        '''Half width of the confidence intervals of the lifetimes of fit.'''
+        return self.z*fit['errors']['taus']
+
+    def update(self, wl, delays, delta_od):
+        '''Fit every band of delta_od (delays x wl, measured delays only); returns the fits.'''
+        delays = np.asarray(delays, dtype=float)
+        for b, (wl_min, wl_max) in enumerate(self.bands):
+            columns = (wl >= wl_min) & (wl <= wl_max)
+            if not columns.any() or len(delays) < 3 + 2*self.n_exp + 2:
+                continue
+            kinetic = ta_kinetics.subtract_background(delays, np.nanmean(delta_od[:, columns], axis=1),
+                                                      self.background_before)
+            previous = self.fits[b]
+            try:
+                fit = ta_kinetics.fit_kinetic(delays, kinetic, self.n_exp,
+                                              None if previous is None else previous['params'], maxfev=self.maxfev)
+            except (RuntimeError, ValueError):                  #not converged within maxfev
+                try:
+                    fit = ta_kinetics.fit_kinetic(delays, kinetic, self.n_exp, maxfev=self.maxfev)
+                except (RuntimeError, ValueError):
+                    self.stable[b] = 0
+                    continue
+            order = np.argsort(fit['taus'])                     #components keep their place between updates
+            for key in ('amplitudes', 'taus'):
+                fit[key] = fit[key][order]
+                fit['errors'][key] = fit['errors'][key][order]
+            fit['params'][3:] = np.column_stack((fit['amplitudes'], fit['taus'])).ravel()
+            steady = (previous is not None
+                      and np.all(np.abs(fit['taus']/previous['taus'] - 1) < self.rtol)
+                      and np.all(self.interval(fit) < self.ci_target*fit['taus']))
+            self.stable[b] = self.stable[b] + 1 if steady else 0
+            self.fits[b] = fit
+        return self.fits
+
+    @property
+    def converged(self):
+        return all(stable >= self.patience for stable in self.stable)
+
+    def summary(self):
+        lines = []
+        for (wl_min, wl_max), fit, stable in zip(self.bands, self.fits, self.stable):
+            text = '%g-%g nm: ' % (wl_min, wl_max)
+            if fit is None:
+                lines.append(text + 'waiting for data')
+                continue
+            lines.append(text + ', '.join('tau = %.4g +/- %.2g fs' % (tau, ci)
+                                          for tau, ci in zip(fit['taus'], self.interval(fit)))
+                         + (' (converged)' if stable >= self.patience else ''))
+        return '\n'.join(lines)
+
+    def results(self):
+        '''JSON-friendly fits, for remote clients and the scan metadata.'''
+        return [{'band': list(band), 'taus': fit['taus'].tolist(), 'taus_ci': self.interval(fit).tolist(),
+                 'amplitudes': fit['amplitudes'].tolist(), 't0': float(fit['t0']), 'sigma': float(fit['sigma']),
+                 'converged': stable >= self.patience}
+                for band, fit, stable in zip(self.bands, self.fits, self.stable) if fit is not None]
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Stage motion parameters tuned per step size.
+
+The fastest settings for a 1 fs step (a few counts, limited by the settling
+of the servo) are not those of a 10 ps step (limited by acceleration and
+velocity), and a hard acceleration that shortens the move can make the
+stage ring around the target for longer. MotionTuner times move plus
+settle for a grid of step sizes and velocity/acceleration (and backlash)
+settings, stepping back and forth around a position, and keeps for every
+step size the quickest setting whose position stayed within tolerance once
+settled. The result is a MotionProfile, saved in ta_motion.json, which the
+scan engine applies before every move according to its length.
+
+Velocities and accelerations are in the units of set_velocity_params(),
+steps and tolerance in encoder counts. Without a grid, the settings tried
+are FACTORS times the ones the controller has when tuning starts; those
+settings are always a candidate too, and are restored at the end. With a
+ta_delay.DelayCalibration, every target is checked against the stage
+travel (a step that does not fit above center is made below it).
+
+Usage
+-----
+import ta_motion
+
+tuner = ta_motion.MotionTuner(stage, tolerance=3, calibration=calibration)
+profile = tuner.tune(steps=[6, 60, 600, 6000, 60000], center=2200000)
+profile.save()
+profile = ta_motion.MotionProfile.load()
+profile.apply(stage, 600)
+'''
+
+import os
+import json
+import time
+import threading
+import itertools
+import numpy as np
+
+PROFILE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ta_motion.json')
+
+FACTORS = (0.5, 1.0, 1.5)                       #of the current velocity and acceleration
+
+class MotionProfile():
+    '''Settings per step size: entries sorted by their largest step (counts).'''
+
+    def __init__(self, entries=None):
+        self.entries = sorted(entries or [], key=lambda entry: entry['max_step'])
+        self.current = None             #settings last sent to the stage
+
+    def entry(self, step):
+        '''Entry of the smallest step range holding step (the largest one beyond).'''
+        for entry in self.entries:
+            if abs(step) <= entry['max_step']:
+                return entry
+        return self.entries[-1] if self.entries else None
+
+    def apply(self, stage, step):
+        '''Send the settings for a move of step counts, if they differ from the last ones; returns the entry.'''
+        entry = self.entry(step)
+        if entry is None:
+            return None
+        settings = (entry['velocity'], entry['acceleration'], entry.get('backlash'))
+        if settings != self.current:    #every call is a USB round trip
+            stage.set_velocity_params(entry['acceleration'], entry['velocity'])
+            if entry.get('backlash') is not None:
+                stage.set_move_params(entry['backlash'])
+            self.current = settings
+        return entry
+
+    def save(self, file_name=None):
+        temporary = (file_name or PROFILE_FILE) + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.entries, file, indent=4)
+        os.replace(temporary, file_name or PROFILE_FILE)
+
+    @classmethod
+    def load(cls, file_name=None):
+        '''Saved profile, None if there is none.'''
+        file_name = file_name or PROFILE_FILE
+        if not os.path.exists(file_name):
+            return None
+        with open(file_name) as file:
+            return cls(json.load(file))
+
+def current_settings(stage):
+    '''(velocity, acceleration, backlash) the controller reports (backlash None if unknown).'''
+    velparams = stage.velparams
+    backlash = getattr(stage, 'genmoveparams', {}).get('backlash_distance')
+    return velparams['max_velocity'], velparams['acceleration'], backlash
+
+class MotionTuner():
+    def __init__(self, stage, tolerance=3, poll=0.002, observe=0.05, timeout=10.0, calibration=None):
+        self.stage = stage
+        self.tolerance = tolerance      #counts
+        self.poll = poll                #s between status reads
+        self.observe = observe          #s the position is watched after reaching the target
+        self.timeout = timeout          #s for one move
+        self.calibration = calibration  #ta_delay.DelayCalibration: travel limits
+        self.results = []
+        self.progress = (0, 0)          #settings measured, settings to measure
+        self.stopped = threading.Event()
+
+    def move(self, target):
+        '''
+        Move to target and time it: returns the time until the position first
+        came within tolerance, the time until it stayed there for good
+        (watched for observe s) and the largest error after that.
+        '''
+        if self.calibration is not None:
+            self.calibration.check(target)
+        t0 = time.monotonic()
+        self.stage.move_absolute(target)
+        first = last = None
+        error = 0
+        while True:
+            now = time.monotonic() - t0
+            off = abs(self.stage.status["position"] - target)
+            if off <= self.tolerance:
+                if first is None:
+                    first = now
+                if last is None:
+                    last = now
+                    error = 0
+                error = max(error, off)
+                if now - last >= self.observe:
+                    return first, last, error
+            else:
+                last = None
+            if now > self.timeout or self.stopped.is_set():
+                return first if first is not None else np.inf, np.inf, off
+            time.sleep(self.poll)
+
+    def measure(self, step, velocity, acceleration, backlash=None, center=None, repeats=3):
+        '''Median settle time (s) of repeats moves of step counts back and forth, the hold needed and the error.'''
+        self.stage.set_velocity_params(acceleration, velocity)
+        if backlash is not None:
+            self.stage.set_move_params(backlash)
+        start = self.stage.status["position"] if center is None else center
+        if self.calibration is not None and not self.calibration.inside(start + step):
+            step = -step                #calibration.check() in move() raises if this does not fit either
+        self.move(start)
+        times = []
+        for k in range(repeats):
+            for target in (start + step, start):
+                if self.stopped.is_set():
+                    return np.inf, np.inf, np.inf
+                times.append(self.move(target))
+        first, last, error = np.array(times).T
+        return float(np.median(last)), float(np.max(last - first)), float(np.max(error))
+
+    def tune(self, steps, velocities=None, accelerations=None, backlashes=(None,), center=None, repeats=3):
+        '''
+        Profile with the quickest settings for every step size (counts); the
+        controller is left with the settings it had before. stop() ends the
+        tuning early (the profile then holds the steps finished so far).
+        '''
+        velocity, acceleration, backlash = current_settings(self.stage)
+        velocities = velocities or [int(round(factor*velocity)) for factor in FACTORS]
+        accelerations = accelerations or [int(round(factor*acceleration)) for factor in FACTORS]
+        settings = [(velocity, acceleration, None)]          #the untuned settings compete too
+        settings += [candidate for candidate in itertools.product(velocities, accelerations, backlashes)
+                     if candidate != settings[0]]
+        entries = []
+        self.results = []
+        self.progress = (0, len(steps)*len(settings))
+        try:
+            for step in sorted(steps):
+                best = None
+                for candidate in settings:
+                    if self.stopped.is_set():
+                        return MotionProfile(entries)
+                    settle, hold, error = self.measure(step, *candidate, center=center, repeats=repeats)
+                    self.progress = (self.progress[0] + 1, self.progress[1])
+                    self.results.append({'step': step, 'velocity': candidate[0], 'acceleration': candidate[1],
+                                         'backlash': candidate[2], 'settle': settle, 'hold': hold, 'error': error})
+                    if (np.isfinite(settle) and error <= self.tolerance
+                            and (best is None or settle < best['settle'])):
+                        best = self.results[-1]
+                if best is not None:
+                    entries.append({'max_step': step, 'velocity': best['velocity'],
+                                    'acceleration': best['acceleration'], 'backlash': best['backlash'],
+                                    'settle': best['settle'], 'hold': best['hold']})
+            return MotionProfile(entries)
+        finally:
+            self.stage.set_velocity_params(acceleration, velocity)
+            if backlash is not None:
+                self.stage.set_move_params(backlash)
+
+    def stop(self):
+        self.stopped.set()
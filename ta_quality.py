@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+from collections import deque
+import numpy as np
+
+class QualityCheck():
+    '''
+    Checks of every pump-off/pump-on pair before its deltaO is stored.
+
+    -----------------------------------------------------------------------------------------
+        Check            | Fails when
+    -----------------------------------------------------------------------------------------
+    probe dropout        | mean probe counts of the off or on frame fall below drop times the
+                         | median of the last window accepted off frames
+    -----------------------------------------------------------------------------------------
+    saturation           | any pixel of the off or on frame reaches the detector saturation
+    -----------------------------------------------------------------------------------------
+    bad read             | any pixel of the raw off or on frame is NaN, inf or <= 0 counts (a
+                         | real frame holds at least the dark counts; ta_background.delta_od
+                         | clips such pixels, so their deltaO would look valid)
+    -----------------------------------------------------------------------------------------
+
+    All checks are computed on whole frames at once; roi (a boolean pixel mask
+    or slice) restricts them to the useful part of the detector.
+
+    Usage
+    -----
+    import ta_quality
+
+    quality = ta_quality.QualityCheck(saturation=oceanoptics.max_intensity)
+    reason = quality.check(off_counts, on_counts)     #raw counts, None when the pair is good
+    '''
+
+    def __init__(self, saturation=None, window=20, drop=0.7, roi=slice(None)):
+        self.saturation = saturation
+        self.drop = drop
+        self.roi = roi
+        self.history = deque(maxlen=window)
+
+    def baseline(self):
+        return np.median(self.history) if len(self.history) >= 3 else None
+
+    def check(self, off, on):
+        off = np.asarray(off, dtype=float)[self.roi]
+        on = np.asarray(on, dtype=float)[self.roi]
+        if not (np.all(np.isfinite(off)) and np.all(np.isfinite(on))) or min(off.min(), on.min()) <= 0:
+            return 'bad read (NaN or no counts)'
+        if self.saturation is not None and max(off.max(), on.max()) >= self.saturation:
+            return 'saturation'
+        level_off = off.mean()
+        level_on = on.mean()
+        baseline = self.baseline()
+        if baseline is not None and min(level_off, level_on) < self.drop*baseline:
+            return ('probe dropout (' + str(int(min(level_off, level_on))) + ' counts, baseline '
+                    + str(int(baseline)) + ')')
+        self.history.append(level_off)
+        return None
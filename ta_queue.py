@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Persistent queue of scan recipes for unattended measurements.
+
+A recipe is a dict with the fields of the Dynamics tab (delays in fs,
+integration time in ms, frames averaged per spectrum, number of sweeps) and
+the name of the output scan. The pending recipes are kept in ta_queue.json
+and every finished recipe is appended to ta_queue_log.json, both rewritten
+after every change, so the queue and the log survive a crash or a restart
+of the program. A recipe is removed from the queue only when it has
+finished: a recipe interrupted by a crash is measured again on the next run.
+
+Usage
+-----
+import ta_queue
+
+queue = ta_queue.ScanQueue()
+queue.add(ta_queue.recipe('sample_a', ini_delay=-1000, fin_delay=50000, stp_delay=500, sweeps=4))
+recipe = queue.next()
+queue.start(recipe)
+...
+queue.finish(recipe, 'done', output='scans/sample_a.tas')
+'''
+
+import os
+import json
+import time
+import uuid
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+QUEUE_FILE = os.path.join(HERE, 'ta_queue.json')
+LOG_FILE = os.path.join(HERE, 'ta_queue_log.json')
+
+FIELDS = {'ini_delay': -10000,          #fs
+          'fin_delay': 50000,           #fs
+          'stp_delay': 10000,           #fs
+          'int_time': 10,               #ms
+          'averages': 1,                #frames per spectrum
+          'sweeps': 1}
+
+def recipe(name, **fields):
+    '''New recipe; fields not given take the defaults of FIELDS.'''
+    unknown = set(fields) - set(FIELDS)
+    if unknown:
+        raise ValueError('Unknown recipe fields: ' + ', '.join(sorted(unknown)))
+    new = dict(FIELDS)
+    new.update(fields)
+    new['name'] = name
+    new['id'] = uuid.uuid4().hex[:8]
+    new['added'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    return new
+
+def describe(recipe):
+    return (recipe['name'] + ': ' + str(recipe['ini_delay']) + ' to ' + str(recipe['fin_delay']) + ' fs, step '
+            + str(recipe['stp_delay']) + ' fs, ' + str(recipe['int_time']) + ' ms x '
+            + str(recipe.get('averages', 1)) + ', '
+            + str(recipe['sweeps']) + ' sweep(s)' + (' (interrupted)' if 'started' in recipe else ''))
+
+def _write(file_name, data):
+    temporary = file_name + '.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(data, file, indent=4)
+    os.replace(temporary, file_name)    #never leaves a half-written file behind
+
+def _read(file_name):
+    if not os.path.exists(file_name):
+        return []
+    with open(file_name) as file:
+        return json.load(file)
+
+class ScanQueue():
+    def __init__(self, file_name=QUEUE_FILE, log_file=LOG_FILE):
+        self.file_name = file_name
+        self.log_file = log_file
+        self.recipes = _read(file_name)
+        self.log = _read(log_file)
+        self.paused = False             #checked between recipes
+
+    def save(self):
+        _write(self.file_name, self.recipes)
+
+    def add(self, recipe, index=None):
+        self.recipes.insert(len(self.recipes) if index is None else index, recipe)
+        self.save()
+
+    def remove(self, index):
+        recipe = self.recipes.pop(index)
+        self.save()
+        return recipe
+
+    def move(self, index, step):
+        '''Move recipe index by step places (negative = earlier); returns its new index.'''
+        new_index = min(max(index + step, 0), len(self.recipes) - 1)
+        self.recipes.insert(new_index, self.recipes.pop(index))
+        self.save()
+        return new_index
+
+    def next(self):
+        if self.paused or not self.recipes:
+            return None
+        return self.recipes[0]
+
+    def start(self, recipe):
+        recipe['started'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self.save()
+
+    def finish(self, recipe, status, output=None, **notes):
+        '''Take recipe out of the queue and log it with status ('done', 'stopped', 'failed').'''
+        self.recipes = [pending for pending in self.recipes if pending['id'] != recipe['id']]
+        entry = dict(recipe)
+        entry.update(notes)
+        entry.update({'status': status, 'output': output, 'finished': time.strftime('%Y-%m-%d %H:%M:%S')})
+        self.log.append(entry)
+        self.save()
+        _write(self.log_file, self.log)
+        return entry
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+class SpectrometerReference():
+    '''
+    Second seabreeze spectrometer looking at a pick-off of the probe.
+
+    The reference frame is read on its own thread, started right before the
+    main spectrometer read, so both detectors integrate the same probe shots.
+    The reference spectrum is interpolated onto the main wavelength axis.
+
+    Usage
+    -----
+    import ta_reference as ref
+
+    reference = ref.SpectrometerReference(Spectrometer(device))
+    reference.start(int_time)
+    wl, counts = main_spectrometer_read()
+    ref_counts = reference.finish(wl, counts)
+    '''
+
+    def __init__(self, spectrometer):
+        self.spectrometer = spectrometer
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = None
+        self.int_time = None
+        self.dark = 0
+
+    def _read(self, int_time):
+        if int_time != self.int_time:
+            self.spectrometer.integration_time_micros(int_time)
+            self.int_time = int_time
+        return self.spectrometer.wavelengths(), self.spectrometer.intensities()
+
+    def start(self, int_time):
+        self.pending = self.executor.submit(self._read, int_time)
+
+    def finish(self, wl, counts):
+        ref_wl, ref_counts = self.pending.result()
+        self.pending = None
+        return np.interp(wl, ref_wl, ref_counts) - self.dark
+
+    def store_dark(self, frames):
+        '''frames: finish() results taken with the probe blocked and dark reset to 0.'''
+        self.dark = np.mean(np.asarray(frames, dtype=float), axis=0)
+
+    def close(self):
+        self.executor.shutdown()
+        self.spectrometer.close()
+
+    def __str__(self):
+        return 'Reference ' + str(self.spectrometer)[1:-10]
+
+class RegionReference():
+    '''
+    Reference region of the main detector: a wavelength window (nm) where the
+    probe is not affected by the pump. Its mean counts normalize the frame.
+    '''
+
+    def __init__(self, wl_min, wl_max):
+        self.wl_min = wl_min
+        self.wl_max = wl_max
+        self.dark = 0
+
+    def start(self, int_time):
+        pass
+
+    def finish(self, wl, counts):
+        window = (wl >= self.wl_min) & (wl <= self.wl_max)
+        return np.mean(counts[window]) - self.dark
+
+    def store_dark(self, frames):
+        self.dark = np.mean(frames)
+
+    def close(self):
+        pass
+
+    def __str__(self):
+        return 'Reference region ' + str(self.wl_min) + '-' + str(self.wl_max) + ' nm'
+
+def normalize(on, ref_on, ref_off, floor=1.0):
+    '''
+    Rescale pump-on counts by the probe drift seen by the reference between
+    the pump-off and pump-on frames, so -log10(on/off) compares equal probe.
+    '''
+    ref_on = np.clip(ref_on, floor, None)
+    ref_off = np.clip(ref_off, floor, None)
+    return on * (ref_off/ref_on)
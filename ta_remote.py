@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Local remote control of the transient absorption program (JSON-RPC 2.0,
+one JSON object per line over TCP).
+
+The server only accepts connections on localhost by default. Requests are
+received on one thread per connection but executed by the owner of the
+server, which calls process() from its own thread (the GUI thread, from a
+QTimer), so the methods can use the devices and the widgets safely. Clients
+may subscribe to topics; publish() sends a notification (a request without
+id) to every subscriber of the topic.
+
+    -> {"jsonrpc": "2.0", "method": "move", "params": {"delay_fs": 500}, "id": 1}
+    <- {"jsonrpc": "2.0", "result": {...}, "id": 1}
+    -> {"jsonrpc": "2.0", "method": "subscribe", "params": {"topic": "point"}, "id": 2}
+    <- {"jsonrpc": "2.0", "method": "point", "params": {"delay": 500, ...}}
+
+Usage
+-----
+import ta_remote
+
+server = ta_remote.RemoteServer({'status': window.remote_status}, port=5555)
+server.start()
+timer.timeout.connect(server.process)
+
+client = ta_remote.RemoteClient(port=5555)
+client.subscribe('point')
+print(client.call('status'))
+'''
+
+import json
+import queue
+import inspect
+import socket
+import threading
+
+PORT = 5555
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+SERVER_ERROR = -32000
+
+class RemoteError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+def _send(connection, lock, message):
+    data = (json.dumps(message) + '\n').encode()
+    with lock:
+        connection.sendall(data)
+
+class RemoteServer():
+    def __init__(self, methods, host='127.0.0.1', port=PORT):
+        self.methods = methods          #name -> callable(**params), run by process()
+        self.host = host
+        self.port = port
+        self.calls = queue.Queue()
+        self.clients = {}               #connection -> (send lock, subscribed topics)
+        self.clients_lock = threading.Lock()
+        self.listener = None
+
+    def start(self):
+        self.listener = socket.create_server((self.host, self.port))
+        self.port = self.listener.getsockname()[1]      #port=0 picks a free port
+        threading.Thread(target=self._accept, daemon=True).start()
+        return self.port
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+        with self.clients_lock:
+            for connection in self.clients:
+                connection.close()
+            self.clients = {}
+
+    def _accept(self):
+        while self.listener is not None:
+            try:
+                connection, address = self.listener.accept()
+            except OSError:
+                break
+            with self.clients_lock:
+                self.clients[connection] = (threading.Lock(), set())
+            threading.Thread(target=self._receive, args=(connection,), daemon=True).start()
+
+    def _receive(self, connection):
+        lock, topics = self.clients[connection]
+        try:
+            for line in connection.makefile('r'):
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    _send(connection, lock, self.error(None, PARSE_ERROR, 'Parse error'))
+                    continue
+                if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+                    _send(connection, lock, self.error(request, INVALID_REQUEST, 'Invalid request'))
+                    continue
+                params = request.get('params', {})
+                if request['method'] in ('subscribe', 'unsubscribe'):   #answered here, nothing to execute
+                    if request['method'] == 'subscribe':
+                        topics.add(params.get('topic'))
+                    else:
+                        topics.discard(params.get('topic'))
+                    _send(connection, lock, self.result(request, sorted(topics)))
+                    continue
+                self.calls.put((connection, lock, request))
+        except OSError:
+            pass
+        finally:
+            with self.clients_lock:
+                self.clients.pop(connection, None)
+            connection.close()
+
+    def result(self, request, result):
+        return {'jsonrpc': '2.0', 'result': result, 'id': request.get('id')}
+
+    def error(self, request, code, message):
+        return {'jsonrpc': '2.0', 'error': {'code': code, 'message': message},
+                'id': request.get('id') if isinstance(request, dict) else None}
+
+    def process(self):
+        '''Execute the pending requests on the calling thread.'''
+        while True:
+            try:
+                connection, lock, request = self.calls.get_nowait()
+            except queue.Empty:
+                return
+            method = self.methods.get(request['method'])
+            params = request.get('params', {})
+            if method is None:
+                reply = self.error(request, METHOD_NOT_FOUND, 'Method not found: ' + request['method'])
+            else:
+                reply = self.execute(request, method, params)
+            if 'id' not in request:         #notification, no reply
+                continue
+            try:
+                _send(connection, lock, reply)
+            except OSError:
+                pass
+
+    def execute(self, request, method, params):
+        '''
+        Reply to a call of method: INVALID_PARAMS when params do not fit its
+        signature, SERVER_ERROR for the errors the methods raise on purpose
+        (ValueError, RuntimeError: busy, out of range...) and INTERNAL_ERROR
+        for any other exception, a bug of the program.
+        '''
+        try:
+            if isinstance(params, list):
+                arguments = inspect.signature(method).bind(*params)
+            elif isinstance(params, dict):
+                arguments = inspect.signature(method).bind(**params)
+            else:
+                raise TypeError('params must be an array or an object')
+        except TypeError as error:
+            return self.error(request, INVALID_PARAMS, str(error))
+        try:
+            return self.result(request, method(*arguments.args, **arguments.kwargs))
+        except RemoteError as error:
+            return self.error(request, error.code, str(error))
+        except (ValueError, RuntimeError) as error:
+            return self.error(request, SERVER_ERROR, repr(error))
+        except Exception as error:
+            return self.error(request, INTERNAL_ERROR, repr(error))
+
+    def subscribed(self, topic):
+        with self.clients_lock:
+            return any(topic in topics for lock, topics in self.clients.values())
+
+    def publish(self, topic, params):
+        '''Notify the subscribers of topic (safe to call from any thread).'''
+        with self.clients_lock:
+            subscribers = [(connection, lock) for connection, (lock, topics) in self.clients.items()
+                           if topic in topics]
+        for connection, lock in subscribers:
+            try:
+                _send(connection, lock, {'jsonrpc': '2.0', 'method': topic, 'params': params})
+            except OSError:
+                pass
+
+class RemoteClient():
+    '''Blocking client; notifications of the subscribed topics are kept in self.notifications.'''
+
+    def __init__(self, host='127.0.0.1', port=PORT, timeout=None):
+        self.connection = socket.create_connection((host, port), timeout=timeout)
+        self.lines = self.connection.makefile('r')
+        self.notifications = queue.Queue()
+        self.replies = queue.Queue()
+        self.next_id = 0
+        threading.Thread(target=self._receive, daemon=True).start()
+
+    def _receive(self):
+        try:
+            for line in self.lines:
+                message = json.loads(line)
+                if 'id' in message:
+                    self.replies.put(message)
+                else:
+                    self.notifications.put((message['method'], message.get('params')))
+        except (OSError, ValueError):
+            pass
+        self.replies.put(None)
+
+    def call(self, method, timeout=None, **params):
+        self.next_id += 1
+        self.connection.sendall((json.dumps({'jsonrpc': '2.0', 'method': method, 'params': params,
+                                             'id': self.next_id}) + '\n').encode())
+        reply = self.replies.get(timeout=timeout)
+        if reply is None:
+            raise ConnectionError('Connection closed by the server')
+        if 'error' in reply:
+            raise RemoteError(reply['error']['code'], reply['error']['message'])
+        return reply['result']
+
+    def subscribe(self, topic):
+        return self.call('subscribe', topic=topic)
+
+    def unsubscribe(self, topic):
+        return self.call('unsubscribe', topic=topic)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Record the device traffic of the setup and replay it off the table.
+
+A Recorder wraps the connected stage (thorlabs_apt_device.BBD201), the
+serial resource of the shutter (ThorlabsSC10.ser) and the seabreeze
+spectrometers: every call is logged with its arguments, result and how long
+it took, every spectrum read is kept (uint16 when the counts allow it) and
+every distinct stage status read is kept with its timestamp. save() writes
+it all to one compressed .npz file. The program marks the start and the end
+of every scan, with the settings needed to run it again and a checksum of
+the result.
+
+A Replay built from that file hands out devices that answer the same calls
+in the same order: results and frames come from the log, calls take their
+recorded time divided by speed, and the stage status follows the recorded
+trajectory since the last command, on the same (sped up) clock. Calls that
+differ from the log are kept in mismatches; with strict they raise
+ReplayError instead, otherwise the replay looks a few calls ahead for the
+same call and carries on (ReplayError when there is none), and a move to
+another target shifts the recorded trajectory onto the new one. The
+waits of the program (settle times, frame ages) are divided by speed too.
+
+Run from the command line, the scans of a log are run again through
+ta_dynamics of the program (offscreen) and compared with the recorded ones:
+
+    python ta_replay.py session.npz --speed 10
+
+Usage
+-----
+import ta_replay
+
+recorder = ta_replay.Recorder('session.npz')
+stage = recorder.stage(stage)
+shutter = recorder.shutter(shutter)
+oceanoptics = recorder.spectrometer(oceanoptics)
+...
+recorder.save()
+
+replay = ta_replay.Replay('session.npz', speed=10)
+stage, shutter, oceanoptics = replay.stage(), replay.shutter(), replay.spectrometer()
+'''
+
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import numpy as np
+import thorlabs_sc10 as tl
+import ta_storage
+
+STATUS = np.dtype([('t', 'f8'), ('position', 'i8'), ('velocity', 'f4'), ('moving_forward', 'i1'),
+                   ('moving_reverse', 'i1'), ('homing', 'i1'), ('homed', 'i1'), ('settled', 'i1'),
+                   ('channel_enabled', 'i1')])
+FLAGS = STATUS.names[3:]
+SPECTROMETER_INFO = ('model', 'serial_number', 'max_intensity', 'integration_time_micros_limits')
+LOOKAHEAD = 8                           #calls searched for a match after a mismatch
+
+class ReplayError(Exception):
+    pass
+
+def _plain(value):
+    '''JSON-friendly copy of call arguments and results (numpy scalars, tuples).'''
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value)
+
+def checksum(*arrays):
+    '''Short hash of the values of arrays, to tell whether a replayed scan came out the same.'''
+    digest = hashlib.sha1()
+    for array in arrays:
+        digest.update(np.ascontiguousarray(array, dtype=float).tobytes())
+    return digest.hexdigest()[:16]
+
+class Recorder():
+    def __init__(self, file_name='session.npz'):
+        self.file_name = file_name
+        self.t0 = time.monotonic()
+        self.events = []                #[t, device, name, args, kwargs, duration, result]
+        self.info = {}                  #device -> attributes read once
+        self.arrays = {}                #name -> list of frames (or one array)
+        self.status = []
+        self.marks = []                 #[t, name, values, cursor]
+        self.lock = threading.Lock()
+
+    def now(self):
+        return time.monotonic() - self.t0
+
+    def stage(self, stage, name='stage'):
+        self.info[name] = {'serial_port': _plain(getattr(stage, 'serial_port', None))}
+        return _RecordingStage(stage, self, name)
+
+    def shutter(self, shutter, name='shutter'):
+        '''Record the serial traffic of a ThorlabsSC10 (the instance is returned, wrapped in place).'''
+        self.info[name] = {'identity': getattr(shutter, 'identity', None)}
+        shutter.ser = _Recording(shutter.ser, self, name)
+        return shutter
+
+    def spectrometer(self, spectrometer, name='spectrometer'):
+        self.info[name] = {key: _plain(getattr(spectrometer, key)) for key in SPECTROMETER_INFO
+                           if hasattr(spectrometer, key)}
+        return _RecordingSpectrometer(spectrometer, self, name)
+
+    def log(self, t, device, name, args, kwargs, duration, result):
+        if isinstance(result, np.ndarray):      #frames: kept apart, the event holds where
+            with self.lock:
+                key = device + '_' + str(result.size)
+                frames = self.arrays.setdefault(key, [])
+                frames.append(result.copy())
+                result = {'frame': [key, len(frames) - 1]}
+                self.events.append([t, device, name, _plain(args), _plain(kwargs), duration, result])
+            return
+        event = [t, device, name, _plain(args), _plain(kwargs), duration, _plain(result)]
+        with self.lock:
+            self.events.append(event)
+
+    def log_status(self, status):
+        sample = ((status['position'], status.get('velocity', 0))
+                  + tuple(bool(status.get(flag, False)) for flag in FLAGS))
+        with self.lock:
+            if not self.status or self.status[-1][1:] != sample:    #only changes are kept
+                self.status.append((self.now(),) + sample)
+
+    def mark(self, name, values=None, **arrays):
+        '''Note an event of the program (scan start, settings), with the position in the log of every device.'''
+        with self.lock:
+            cursor = {}
+            for event in self.events:
+                cursor[event[1]] = cursor.get(event[1], 0) + 1
+            for key, array in arrays.items():
+                self.arrays['mark%d_%s' % (len(self.marks), key)] = np.asarray(array)
+            self.marks.append([self.now(), name, _plain(values or {}), cursor, sorted(arrays)])
+
+    def save(self, file_name=None):
+        with self.lock:
+            arrays = {}
+            for key, frames in self.arrays.items():
+                if isinstance(frames, list):
+                    frames = np.array(frames)
+                    dtype = ta_storage.compact_dtype(frames)
+                    if dtype is np.uint16:              #spectrometer counts, stored without loss
+                        frames = frames.astype(dtype)
+                arrays['array_' + key] = frames
+            log = {'version': 1, 'info': self.info, 'events': self.events, 'marks': self.marks}
+            arrays['status'] = np.array(self.status, dtype=STATUS)
+            arrays['log'] = np.frombuffer(json.dumps(log).encode(), dtype=np.uint8)
+        np.savez_compressed(file_name or self.file_name, **arrays)
+
+class _Recording():
+    '''Device proxy logging every method call; other attributes are read and set on the device.'''
+
+    def __init__(self, device, recorder, name):
+        object.__setattr__(self, '_device', device)
+        object.__setattr__(self, '_recorder', recorder)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute):
+        value = getattr(self._device, attribute)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            t = self._recorder.now()
+            result = value(*args, **kwargs)
+            self._recorder.log(t, self._name, attribute, args, kwargs, self._recorder.now() - t, result)
+            return result
+        return call
+
+    def __setattr__(self, attribute, value):
+        setattr(self._device, attribute, value)
+
+    def __repr__(self):
+        return repr(self._device)
+
+    def __str__(self):
+        return str(self._device)
+
+class _RecordingStage(_Recording):
+    @property
+    def status(self):
+        status = self._device.status
+        self._recorder.log_status(status)
+        return status
+
+    @property
+    def status_(self):
+        status_ = self._device.status_
+        self._recorder.log_status(status_[0][0])
+        return status_
+
+class _RecordingSpectrometer(_Recording):
+    def wavelengths(self):
+        '''Not logged as a call: the axis of the device, kept once.'''
+        wl = self._device.wavelengths()
+        self._recorder.arrays[self._name + '_wavelengths'] = np.array(wl)
+        return wl
+
+class Replay():
+    def __init__(self, file_name, speed=1.0, strict=False):
+        self.speed = speed              #device time = replay time*speed
+        self.strict = strict
+        with np.load(file_name, allow_pickle=False) as data:
+            log = json.loads(data['log'].tobytes().decode())
+            self.status = data['status']
+            self.arrays = {key[len('array_'):]: data[key] for key in data.files if key.startswith('array_')}
+        self.info = log['info']
+        self.marks = log['marks']
+        self.events = {}                #device -> its events in order
+        for event in log['events']:
+            self.events.setdefault(event[1], []).append(event)
+        self.index = {device: 0 for device in self.events}
+        self.mismatches = []
+        self.lock = threading.Lock()
+        self.clock = (0.0, time.monotonic())        #(recorded time, replay time) of the last stage command
+        self.stage_offset = 0                       #counts, target moved from the recorded one
+        self.next_command = self._stage_time(0)
+
+    def _stage_time(self, index):
+        stage = self.events.get('stage', [])
+        return stage[index][0] if index < len(stage) else np.inf
+
+    def seek(self, mark):
+        '''Continue from a mark (a scan start): every device at the call it was at then.'''
+        t, name, values, cursor = mark[:4]
+        with self.lock:
+            self.index = {device: cursor.get(device, 0) for device in self.events}
+            self.clock = (t, time.monotonic())
+            self.stage_offset = 0
+            self.next_command = self._stage_time(self.index.get('stage', 0))
+
+    def mark_arrays(self, mark):
+        k = self.marks.index(mark)
+        return {key: self.arrays['mark%d_%s' % (k, key)] for key in mark[4]}
+
+    def call(self, device, name, args, kwargs):
+        '''Result of the next recorded call of device, after its recorded duration.'''
+        args, kwargs = _plain(args), _plain(kwargs)
+        with self.lock:
+            events = self.events.get(device, [])
+            i = self.index.get(device, 0)
+            if not (i < len(events) and events[i][2:5] == [name, args, kwargs]):
+                expected = events[i][2:5] if i < len(events) else None
+                self.mismatches.append({'device': device, 'call': [name, args, kwargs], 'expected': expected})
+                if self.strict:
+                    raise ReplayError(device + ': ' + name + str(tuple(args)) + ' instead of ' + str(expected))
+                ahead = events[i:i + LOOKAHEAD]
+                found = ([k for k, event in enumerate(ahead) if event[2:5] == [name, args, kwargs]]
+                         or [k for k, event in enumerate(ahead) if event[2] == name])
+                if not found:                       #a call the recorded run did not make
+                    raise ReplayError(device + ': ' + name + str(tuple(args)) + ' not in the log')
+                i += found[0]
+            event = events[i]
+            self.index[device] = i + 1
+            if device == 'stage':
+                if name in ('move_absolute', 'move_relative') and args and event[3]:
+                    self.stage_offset = args[0] - event[3][0]
+                self.clock = (event[0], time.monotonic())
+                self.next_command = self._stage_time(i + 1)
+        time.sleep(event[5]/self.speed)
+        result = event[6]
+        if isinstance(result, dict) and 'frame' in result:
+            key, row = result['frame']
+            return self.arrays[key][row].astype(float)
+        return result
+
+    def stage_status(self):
+        '''Recorded status at the replayed time, on the trajectory since the last stage command.'''
+        with self.lock:
+            t_command, t_replayed = self.clock
+            t = min(t_command + (time.monotonic() - t_replayed)*self.speed, self.next_command)
+            offset = self.stage_offset
+        k = max(np.searchsorted(self.status['t'], t, side='right') - 1, 0)
+        sample = self.status[k]
+        status = {'position': int(sample['position']) + offset, 'velocity': float(sample['velocity'])}
+        status.update({flag: bool(sample[flag]) for flag in FLAGS})
+        return status
+
+    def stage(self, name='stage'):
+        return _ReplayStage(self, name)
+
+    def shutter(self, name='shutter'):
+        shutter = ReplaySC10(self, name)
+        shutter.rs232_set_up(name)
+        return shutter
+
+    def spectrometer(self, name='spectrometer'):
+        return _ReplaySpectrometer(self, name)
+
+class _ReplayDevice():
+    def __init__(self, replay, name):
+        self._replay = replay
+        self._name = name
+        for key, value in replay.info.get(name, {}).items():
+            setattr(self, key, tuple(value) if isinstance(value, list) else value)
+
+    def __getattr__(self, attribute):
+        if attribute.startswith('_'):
+            raise AttributeError(attribute)
+        return lambda *args, **kwargs: self._replay.call(self._name, attribute, args, kwargs)
+
+class _ReplayStage(_ReplayDevice):
+    @property
+    def status(self):
+        return self._replay.stage_status()
+
+    @property
+    def status_(self):
+        return [[self._replay.stage_status()]]
+
+class _ReplaySpectrometer(_ReplayDevice):
+    def wavelengths(self):
+        return self._replay.arrays[self._name + '_wavelengths'].copy()
+
+    def __repr__(self):
+        return '<Spectrometer ' + str(getattr(self, 'model', '')) + ':' + str(getattr(self, 'serial_number', '')) + '>'
+
+class ReplaySC10(tl.ThorlabsSC10):
+    '''ThorlabsSC10 whose serial resource answers from the log.'''
+
+    def __init__(self, replay, name='shutter'):
+        super().__init__()
+        self.replay = replay
+        self.name = name
+        self.identity = replay.info.get(name, {}).get('identity') or 'THORLABS SC10 (replay)'
+
+    def rs232_set_up(self, com_port, timeout=25000):
+        self.ser = _ReplayDevice(self.replay, self.name)
+
+def main(argv=None):
+    '''Run the scans of a log again through ta_dynamics and compare them with the recorded ones.'''
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('log', help='.npz file written by Recorder.save()')
+    parser.add_argument('--speed', type=float, default=1.0, help='device time per replay time (10 = 10x faster)')
+    parser.add_argument('--strict', action='store_true', help='stop at the first call that differs from the log')
+    args = parser.parse_args(argv)
+
+    import ta_benchmark
+    import ta_reference as ref
+    module = ta_benchmark.load_application()
+    app = module.qtw.QApplication.instance() or module.qtw.QApplication([])
+    box = module.qtw.QMessageBox
+    box.question = box.information = staticmethod(lambda *a, **k: box.Ok)     #background prompts
+
+    replay = Replay(args.log, args.speed, args.strict)
+    window = module.TransientAbsorption()
+    window.app = app
+    window.background_prompt = lambda text, buttons, answered: answered(True)     #prompts of a paused scan
+    window.stage, window.shutter = replay.stage(), replay.shutter()
+    window.oceanoptics = replay.spectrometer()
+    window.reference = ref.SpectrometerReference(replay.spectrometer('reference')) if 'reference' in replay.info \
+        else None
+    scans = [(mark, end[2] if end[1] == 'ta_dynamics_end' else {})     #scans stopped before starting have no end
+             for mark, end in zip(replay.marks, replay.marks[1:] + [[0, None, {}]]) if mark[1] == 'ta_dynamics']
+    failed = 0
+    for k, (mark, recorded) in enumerate(scans):
+        values = mark[2]
+        window.zero = values['zero']
+        for name in ('dyn_inttime', 'dyn_inidelay', 'dyn_findelay', 'dyn_stpdelay', 'dyn_fitbands'):
+            getattr(window, name + '_lineEdit').setText(str(values[name]))
+        window.dyn_sweeps_spinBox.setValue(values['sweeps'])
+        window.dyn_averages_spinBox.setValue(values['averages'])
+        window.dyn_autoexposure_checkBox.setChecked(values['auto_exposure'])
+        for name in ('shutter_settle', 'stage_settle', 'off_frame_max_age', 'exposure_recheck_s'):
+            setattr(window, name, values.get(name, getattr(window, name))/args.speed)   #program time, sped up too
+        window.background.refresh_s = values.get('background_refresh_s', window.background.refresh_s)/args.speed
+        background = replay.mark_arrays(mark)
+        if 'dark' in background:
+            window.background.store_dark(values['int_time'], background['dark'])
+            window.background.store_scatter(values['int_time'], background['scatter'])
+        replay.seek(mark)
+        mismatches = len(replay.mismatches)
+        t = time.perf_counter()
+        try:
+            window.ta_dynamics(False)
+            result = checksum(module.TransientAbsorption.ta_array, module.TransientAbsorption.delay_array)
+        except ReplayError as error:
+            result = 'stopped: ' + str(error)
+        elapsed = time.perf_counter() - t
+        same = result == recorded.get('checksum')
+        failed += not same
+        print('scan %d: %.2f s (recorded %.2f s), %d mismatches, result %s'
+              % (k + 1, elapsed, recorded.get('seconds', np.nan), len(replay.mismatches) - mismatches,
+                 'identical' if same else 'differs (' + result + ')'))
+    if window.telemetry is not None:
+        window.telemetry.stop()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
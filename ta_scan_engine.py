@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import queue
+import threading
+import ta_timing
+import ta_delay
+
+class ScanEngine():
+    '''
+    Pipelined delay scan.
+
+    All device I/O (stage, shutter, spectrometer) runs on one worker thread:
+    it waits for the stage to reach delay d, acquires the frames, starts the
+    move to the next delay and hands the frames over. Meanwhile the calling
+    (GUI) thread computes deltaO, stores and plots point d, so processing and
+    plotting overlap with the next stage move instead of following it.
+    Points rejected by the GUI thread are requeued and measured again after
+    the last delay of the list. With a ta_motion.MotionProfile, the velocity
+    and acceleration tuned for the length of every move are set before it,
+    and a point is acquired no sooner than the hold time of that setting
+    after the stage first reached the target (ringing). Delays are converted
+    by a ta_delay.DelayCalibration: the whole grid is checked against the
+    stage travel before the first move, and targets are reached through its
+    unidirectional approach. pause() asks the worker to stop at the next
+    point boundary, with the stage on target and no frame in flight, and
+    run() calls on_pause() there (new exposure, background) before the
+    scan goes on; if on_pause() returns False, the worker stays parked,
+    with the GUI thread free, until resume() is called. A pause asked
+    after the last point of a run is served at the start of the next one.
+
+    Usage
+    -----
+    import ta_scan_engine
+
+    engine = ta_scan_engine.ScanEngine(stage, calibration, acquire=window.acquire_frames)
+    engine.run(delays, on_point=process, idle=qtw.QApplication.processEvents,
+               stop_requested=lambda: keyboard.is_pressed('Escape'))
+    '''
+
+    def __init__(self, stage, calibration, acquire, timer=None, tolerance=3, poll=0.002, profile=None):
+        self.stage = stage
+        if not isinstance(calibration, ta_delay.DelayCalibration):  #stage position of zero delay (counts)
+            calibration = ta_delay.DelayCalibration(calibration)
+        self.calibration = calibration
+        self.acquire = acquire          #callable returning the frames of one delay point
+        self.timer = timer if timer is not None else ta_timing.ScanTimer()
+        self.tolerance = tolerance      #counts
+        self.poll = poll                #s between stage status reads
+        self.profile = profile
+        self.hold = 0.0                 #s within tolerance before a point is acquired
+        self.target = None
+        self.via = []                   #positions to pass before the target (unidirectional approach)
+        self.row = None
+        self.window = None              #time.monotonic() at the start and end of the acquisition of a point
+        self.stopped = threading.Event()
+        self.pause_requested = threading.Event()
+        self.resumed = threading.Event()
+
+    @property
+    def zero(self):
+        return self.calibration.zero
+
+    def counts(self, position_fs):
+        return self.calibration.counts(position_fs)
+
+    def start_move(self, position_fs):
+        target = self.calibration.check(self.counts(position_fs))
+        start = self.target if self.target is not None else self.stage.status["position"]
+        if self.profile is not None:
+            entry = self.profile.apply(self.stage, target - start)
+            self.hold = entry['hold'] if entry is not None else 0.0
+        path = self.calibration.approach(start, target)
+        self.target = target
+        self.via = path[:-1]
+        self.stage.move_absolute(path[0])
+
+    def wait_move(self):
+        '''Block until the stage is within tolerance of the target; returns the position (counts).'''
+        while self.via and not self.stopped.is_set():
+            if abs(self.stage.status["position"] - self.via[0]) <= self.tolerance:
+                self.via.pop(0)
+                self.stage.move_absolute(self.via[0] if self.via else self.target)
+            else:
+                time.sleep(self.poll)
+        inside = None                   #time the stage came within tolerance
+        while not self.stopped.is_set():
+            position = self.stage.status["position"]
+            if abs(position - self.target) <= self.tolerance:
+                if inside is None:
+                    inside = time.monotonic()
+                if time.monotonic() - inside >= self.hold:
+                    return position
+            time.sleep(self.poll)
+        return self.stage.status["position"]
+
+    def _point(self, i, d, points, next_delay=None):
+        self.timer.point(d)
+        row = len(self.timer.rows) - 1
+        with self.timer.phase('move'):
+            position = self.wait_move()
+        if self.pause_requested.is_set():       #no device I/O here until run() resumes
+            with self.timer.phase('pause'):
+                self.resumed.clear()
+                points.put('paused')
+                while not (self.resumed.is_set() or self.stopped.is_set()):
+                    time.sleep(self.poll)
+        if self.stopped.is_set():
+            return False
+        t_start = time.monotonic()
+        frames = self.acquire()
+        window = (t_start, time.monotonic())
+        if next_delay is not None:
+            self.start_move(next_delay)         #next move overlaps the processing of d
+        self.issued += 1
+        points.put((i, d, position, frames, row, window))
+        return True
+
+    def _worker(self, delays, points):
+        try:
+            self.start_move(delays[0])
+            for i, d in enumerate(delays):
+                if not self._point(i, d, points, delays[i + 1] if i + 1 < len(delays) else None):
+                    break
+            while not self.stopped.is_set():    #points sent back by requeue()
+                while self.processed < self.issued and not self.stopped.is_set():
+                    time.sleep(self.poll)
+                try:
+                    i = self.retries.get_nowait()
+                except queue.Empty:
+                    break
+                self.start_move(delays[i])
+                self._point(i, delays[i], points)
+        except Exception as error:
+            points.put(error)
+        points.put(None)
+
+    def run(self, delays, on_point, idle=None, stop_requested=None, on_pause=None):
+        '''
+        Scan the delays (fs). on_point(i, delay, position, frames) is called on
+        this thread for every acquired point, with self.row set to its timer
+        row and self.window to its acquisition window; it may call requeue(i)
+        to have point i measured again at the end of the scan, or pause() to
+        have on_pause() called once every point acquired so far has been
+        processed, while the worker waits (until resume() if on_pause()
+        returns False). Returns the number of points acquired.
+        '''
+        delays = list(delays)
+        self.calibration.check(self.counts(delays))         #the whole grid, before moving at all
+        if self.profile is not None:
+            self.profile.current = None         #the stage may have been set up by someone else
+        self.stopped.clear()
+        self.retries = queue.Queue()
+        self.issued = 0
+        self.processed = 0
+        points = queue.Queue()
+        worker = threading.Thread(target=self._worker, args=(delays, points), daemon=True)
+        worker.start()
+        while True:
+            try:
+                item = points.get(timeout=0.02)
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                self.stopped.set()
+                worker.join()
+                raise item
+            if item == 'paused':
+                if on_pause is None or on_pause() is not False:
+                    self.resume()
+            elif item is not False:
+                self.row, self.window = item[4:]
+                on_point(*item[:4])
+                self.processed += 1
+            if idle is not None:
+                idle()
+            if stop_requested is not None and stop_requested():
+                self.stopped.set()
+        worker.join()
+        return self.processed
+
+    def requeue(self, i):
+        self.retries.put(i)
+
+    def pause(self):
+        '''Ask for on_pause() at the next point boundary (see run()).'''
+        self.pause_requested.set()
+
+    def resume(self):
+        '''Let the worker go on after a pause (see run()).'''
+        self.pause_requested.clear()
+        self.resumed.set()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import ta_timing
+
+class FrameSequencer():
+    '''
+    Pump-off/pump-on frame ordering that minimizes shutter toggles.
+
+    Consecutive delay points alternate between the orders off/on and on/off,
+    so the shutter keeps its state across the stage move between them:
+
+        point     0        1        2        3
+        frames  off on | on off | on off ...
+                         (off of point 1 reused by point 2 while fresh)
+
+    The pump-off frame taken at the end of an on/off point is reused by the
+    next point when it is younger than max_off_age seconds, so two delay
+    points cost two toggles and three frames instead of four and four.
+    off_index keeps, for every point, the number of the pump-off frame used.
+    acquire() is called right after a stage move: the pump-on frame is read
+    no sooner than stage_settle seconds after the call, which the shutter
+    settle (or the pump-off frame) usually covers; only on/off points with
+    the shutter already open wait for the stage on their own.
+
+    Usage
+    -----
+    import ta_sequencer
+
+    sequencer = ta_sequencer.FrameSequencer(shutter, read_spectrum, settle=0.5)
+    sequencer.start()
+    spec_off, ref_off, spec_on, ref_on, off_number = sequencer.acquire()
+    '''
+
+    def __init__(self, shutter, read, settle=0.5, max_off_age=5.0, timer=None, stage_settle=0.0):
+        self.shutter = shutter
+        self.read = read                #callable returning (spectrum, reference)
+        self.settle = settle
+        self.stage_settle = stage_settle    #s between the end of a stage move and a pump-on frame
+        self.max_off_age = max_off_age
+        self.timer = timer if timer is not None else ta_timing.ScanTimer()
+        self.start()
+
+    def start(self):
+        self.pump_open = None           #unknown until the first toggle
+        self.last_off = None            #(frame number, time, spectrum, reference)
+        self.n_off = 0
+        self.n_points = 0
+        self.toggles = 0
+        self.off_index = []
+
+    def _set_pump(self, pump_open):
+        if pump_open == self.pump_open:
+            return
+        with self.timer.phase('shutter'):
+            if pump_open:
+                self.shutter.open_shutter()
+            else:
+                self.shutter.close_shutter()
+        with self.timer.phase('settle'):
+            time.sleep(self.settle)
+        self.pump_open = pump_open
+        self.toggles += 1
+
+    def _off(self):
+        self._set_pump(False)
+        with self.timer.phase('spectrum'):
+            spec, reference = self.read()
+        self.last_off = (self.n_off, time.monotonic(), spec, reference)
+        self.n_off += 1
+        return self.last_off
+
+    def _on(self, t_moved):
+        self._set_pump(True)
+        wait = self.stage_settle - (time.monotonic() - t_moved)
+        if wait > 0:                            #not covered by the shutter settle
+            with self.timer.phase('settle'):
+                time.sleep(wait)
+        with self.timer.phase('spectrum'):
+            return self.read()
+
+    def _fresh_off(self):
+        off = self.last_off             #discard_off() may clear it from another thread
+        if off is not None and self.pump_open == False and time.monotonic() - off[1] <= self.max_off_age:
+            return off
+        return None
+
+    def discard_off(self, number=None):
+        '''Stop sharing pump-off frame number (the last one by default), e.g. after its point failed ta_quality.'''
+        off = self.last_off
+        if off is not None and (number is None or off[0] == number):
+            self.last_off = None
+
+    def acquire(self):
+        '''Frames of the next delay point: (spec_off, ref_off, spec_on, ref_on, off frame number).'''
+        t_moved = time.monotonic()
+        if self.n_points % 2 == 0 or self.pump_open == False:
+            off = self._fresh_off() or self._off()
+            spec_on, ref_on = self._on(t_moved)
+        else:
+            spec_on, ref_on = self._on(t_moved)
+            off = self._off()
+        self.n_points += 1
+        self.off_index.append(off[0])
+        return off[2], off[3], spec_on, ref_on, off[0]
+
+    def finish(self):
+        '''Leave the pump blocked at the end of a scan.'''
+        self._set_pump(False)
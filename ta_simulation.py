@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import threading
+import numpy as np
+import thorlabs_sc10 as tl
+import ta_delay
+
+class SimulatedBBD201():
+    '''
+    Stand-in for thorlabs_apt_device.BBD201 with the calls used by the TA
+    programs. Moves take distance/velocity seconds (times time_scale) and the
+    position is interpolated while moving, like the polled APT status. With
+    ringing, the stage overshoots by ringing counts per 1e6 counts/s^2 of
+    acceleration and the oscillation decays with ring_time seconds.
+
+    Usage
+    -----
+    import ta_simulation as sim
+
+    stage = sim.SimulatedBBD201(time_scale=0.1)
+    shutter = sim.SimulatedSC10()
+    shutter.rs232_set_up('COM5')
+    oceanoptics = sim.SimulatedSpectrometer(stage, shutter)
+    '''
+
+    def __init__(self, serial_port=None, home=True, position=0, velocity=1000000,
+                 acceleration=2000000, settle=0.005, time_scale=1.0, ringing=0.0, ring_time=0.01):
+        self.serial_port = serial_port
+        self.velocity = velocity                #counts/s
+        self.acceleration = acceleration        #counts/s^2
+        self.settle = settle                    #s after the move ends
+        self.time_scale = time_scale
+        self.ringing = ringing
+        self.ring_time = ring_time              #s
+        self.backlash_distance = 0
+        self.enabled = False
+        self.homed = False
+        self.homing = False
+        self.lock = threading.Lock()
+        self._start = self._target = position
+        self._t0 = self._t1 = time.monotonic()
+        if home:
+            self.home()
+
+    def _duration(self, distance):
+        distance = abs(distance)
+        ramp = self.velocity**2/self.acceleration       #distance spent accelerating and braking
+        if distance < ramp:
+            return 2*np.sqrt(distance/self.acceleration)
+        return (distance - ramp)/self.velocity + 2*self.velocity/self.acceleration
+
+    def _position(self):
+        now = time.monotonic()
+        if now >= self._t1:
+            if not self.ringing or not self.time_scale or self._target == self._start:
+                return self._target
+            t = (now - self._t1)/(self.time_scale*self.ring_time)
+            overshoot = self.ringing*self.acceleration/1e6*np.exp(-t)*np.cos(2*np.pi*t)
+            return self._target + int(round(np.sign(self._target - self._start)*overshoot))
+        fraction = (now - self._t0)/(self._t1 - self._t0)
+        return int(round(self._start + fraction*(self._target - self._start)))
+
+    def _go(self, target):
+        with self.lock:
+            self._start = self._position()
+            self._target = int(target)
+            self._t0 = time.monotonic()
+            self._t1 = self._t0 + self.time_scale*self._duration(self._target - self._start)
+
+    @property
+    def status(self):
+        with self.lock:
+            position = self._position()
+            moving = time.monotonic() < self._t1 + self.time_scale*self.settle
+            if self.homing and not moving:
+                self.homing = False
+                self.homed = True
+            return {'position': position,
+                    'velocity': self.velocity if moving else 0,
+                    'moving_forward': moving and self._target > self._start,
+                    'moving_reverse': moving and self._target < self._start,
+                    'homing': self.homing,
+                    'homed': self.homed,
+                    'settled': not moving,
+                    'channel_enabled': self.enabled}
+
+    @property
+    def status_(self):
+        return [[self.status]]
+
+    def home(self):
+        self.homing = True
+        self.homed = False
+        self._go(0)
+
+    def set_enabled(self, state=True):
+        self.enabled = state
+
+    def move_absolute(self, position):
+        self._go(position)
+
+    def move_relative(self, distance):
+        self._go(self._target + distance)
+
+    @property
+    def velparams(self):
+        return {'min_velocity': 0, 'max_velocity': self.velocity, 'acceleration': self.acceleration}
+
+    @property
+    def genmoveparams(self):
+        return {'backlash_distance': self.backlash_distance}
+
+    def set_velocity_params(self, acceleration, max_velocity, bay=0, channel=0):
+        self.acceleration = acceleration
+        self.velocity = max_velocity
+
+    def set_move_params(self, backlash_distance, bay=0, channel=0):
+        self.backlash_distance = backlash_distance
+
+    def stop(self, immediate=False, bay=0, channel=0):
+        with self.lock:
+            self._start = self._target = self._position()
+            self._t1 = time.monotonic()
+
+    def close(self):
+        pass
+
+class SimulatedSerial():
+    '''Answers the SC10 serial commands used by thorlabs_sc10.ThorlabsSC10.'''
+
+    def __init__(self, time_scale=1.0, latency=0.01):
+        self.time_scale = time_scale
+        self.latency = latency                  #s per serial round trip
+        self.closed = 1
+        self.last = ''
+
+    def _wait(self):
+        time.sleep(self.time_scale*self.latency)
+
+    def write(self, command):
+        self._wait()
+        if command == 'ens':
+            self.closed = 1 - self.closed
+        self.last = command
+
+    def read(self):
+        return self.last + '\r'
+
+    def query(self, command):
+        self._wait()
+        if command == 'id?':
+            return 'id?THORLABS SC10 VERSION 1.07'
+        if command == 'closed?':
+            return 'closed?\r' + str(self.closed) + '\r'
+        if command == 'open?':
+            return 'open?\r100\r'
+        return command + '\r'
+
+    def close(self):
+        pass
+
+class SimulatedSC10(tl.ThorlabsSC10):
+    '''ThorlabsSC10 talking to a SimulatedSerial instead of a pyvisa resource.'''
+
+    def __init__(self, time_scale=1.0, latency=0.01):
+        super().__init__()
+        self.time_scale = time_scale
+        self.latency = latency
+
+    def rs232_set_up(self, com_port, timeout=25000):
+        self.ser = SimulatedSerial(self.time_scale, self.latency)
+
+class SimulatedSpectrometer():
+    '''
+    Stand-in for seabreeze.spectrometers.Spectrometer. The probe is a Gaussian
+    spectrum with shot noise; while the shutter is open the pump bleaches it
+    with an exponentially decaying deltaO that rises at zero delay (counts).
+    '''
+
+    model = 'SIMULATED'
+    serial_number = 'SIM00001'
+    max_intensity = 65535.0
+    integration_time_micros_limits = (1000, 65000000)
+
+    def __init__(self, stage=None, shutter=None, zero=2200000, pixels=2048, wl_range=(340, 1030),
+                 amplitude=0.02, lifetime_fs=20000, time_scale=1.0, seed=0):
+        self.stage = stage
+        self.shutter = shutter
+        self.zero = zero
+        self.amplitude = amplitude
+        self.lifetime_fs = lifetime_fs
+        self.time_scale = time_scale
+        self.int_time = 10000
+        self.wl = np.linspace(wl_range[0], wl_range[1], pixels)
+        self.probe = 30000*np.exp(-((self.wl - 650)/150)**2)
+        self.band = np.exp(-((self.wl - 600)/40)**2) - 0.5*np.exp(-((self.wl - 720)/30)**2)
+        self.dark = 1500.0
+        self.rng = np.random.default_rng(seed)
+
+    def integration_time_micros(self, int_time):
+        self.int_time = int(int_time)
+
+    def wavelengths(self):
+        return self.wl.copy()
+
+    def delay_fs(self):
+        return (self.stage.status["position"] - self.zero)/(ta_delay.COUNTS_PER_MM*ta_delay.MM_PER_FS)
+
+    def intensities(self, correct_dark_counts=False, correct_nonlinearity=False):
+        time.sleep(self.time_scale*self.int_time/1e6)
+        probe = self.probe * self.int_time/10000
+        if self.shutter is not None and self.stage is not None and self.shutter.ser.closed == 0:
+            t = self.delay_fs()
+            if t > 0:
+                probe = probe * 10**(-self.amplitude*self.band*np.exp(-t/self.lifetime_fs))
+        counts = self.rng.poisson(np.clip(probe, 0, None)) + self.dark
+        return np.clip(counts, 0, self.max_intensity).astype(float)
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return '<Spectrometer ' + self.model + ':' + self.serial_number + '>'
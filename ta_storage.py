@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Binary storage of transient absorption scans.
+
+A scan is a folder (extension .tas) holding one .npy file per array and a
+meta.json with the acquisition settings:
+
+    scan.tas/
+        delta_od.npy        deltaO, delays x wavelengths
+        wavelengths.npy     nm
+        delays.npy          fs
+        meta.json
+        <extra>.npy         anything else saved with the scan (off_index, ...)
+
+The .npy files are opened memory-mapped, so only the parts that are looked
+at are read from disk, however large the scan is. Text files written by
+save('transient_spectrum') (wavelength column, one deltaO column per delay,
+delays in the header) are read too, fully into memory.
+
+Compressed scans (save_scan(..., compression='zlib')) keep deltaO as
+delta_od.tac instead: float32 in blocks of chunk_rows delays, byte-shuffled
+and compressed one by one (zlib, or zstd/blosc when those packages are
+installed). It is read through a ChunkedArray, which decompresses only the
+blocks of the rows asked for. With precision (for example 1e-6 OD, far
+below the noise of a scan; lossy, so only when asked for) the values are
+stored as integer multiples of it, which compresses about twice as well as
+the float32 noise bits. By default (no precision) a scan takes about 2.3x
+less room than float64 and no more can be had without loss: float32 halves
+it, the sign and exponent bytes compress well, but the mantissa bits below
+the noise of the scan are random and do not compress at all. The 4-10x of
+integer storage (5x at 1e-6 OD) needs precision. The other arrays saved with a scan (stderr,
+timestamps, ...) are always kept as they are, in .npy files.
+
+Usage
+-----
+import ta_storage
+
+ta_storage.save_scan('sample.tas', wl, delays, delta_od, {'int_time': 10000})
+ta_storage.save_scan('small.tas', wl, delays, delta_od, compression='auto')
+scan = ta_storage.load('sample.tas')
+kinetic = scan.delta_od[:, 512]
+ta_storage.merge_scans(['a.tas', 'b.tas'], 'merged.tas')
+'''
+
+import os
+import json
+import zlib
+import time
+import struct
+from functools import lru_cache
+import numpy as np
+
+EXTENSION = '.tas'
+CHUNKED = '.tac'
+MAGIC = b'TAC1'
+
+def _codecs():
+    codecs = {'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress)}
+    try:
+        import zstandard
+        codecs['zstd'] = (lambda data, level: zstandard.ZstdCompressor(level=level).compress(data),
+                          lambda data: zstandard.ZstdDecompressor().decompress(data))
+    except ImportError:
+        pass
+    try:
+        import blosc
+        codecs['blosc'] = (lambda data, level: blosc.compress(data, typesize=1, clevel=min(level, 9)),
+                           blosc.decompress)
+    except ImportError:
+        pass
+    return codecs
+
+CODECS = _codecs()
+
+def best_codec():
+    '''Fastest codec installed: zstd, then blosc, then zlib (always available).'''
+    for name in ('zstd', 'blosc', 'zlib'):
+        if name in CODECS:
+            return name
+
+def _shuffle(block):
+    '''Bytes of the same significance together (exponents with exponents), as blosc does.'''
+    return np.ascontiguousarray(block.view(np.uint8).reshape(-1, block.dtype.itemsize).T).tobytes()
+
+def _unshuffle(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    raw = np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, -1).T
+    return np.ascontiguousarray(raw).view(dtype).reshape(shape)
+
+def compact_dtype(array):
+    '''uint16 for counts that fit, float32 for other floats, None for other integers.'''
+    array = np.asarray(array)
+    counts = array.dtype.kind in 'iu' or (array.size and np.all(np.mod(array, 1) == 0))
+    if counts and array.size and array.min() >= 0 and array.max() <= 65535:
+        return np.uint16
+    return np.float32 if array.dtype.kind == 'f' else None
+
+def save_chunked(file_name, array, dtype=None, chunk_rows=16, codec='zlib', level=3, precision=None):
+    array = np.asarray(array)
+    dtype = np.dtype(dtype if dtype is not None else compact_dtype(array))
+    scale = None
+    if precision and dtype.kind == 'f':
+        missing = np.isnan(array)
+        steps = np.round(np.where(missing, 0, array)/precision)
+        largest = np.abs(steps).max(initial=0)
+        if largest < 2**31 - 1:                                     #else kept as float32
+            scale = precision
+            array = steps
+            dtype = np.dtype(np.int16 if largest < 2**15 - 1 else np.int32)
+            array[missing] = np.iinfo(dtype).min                    #NaN (delays not measured)
+    compress = CODECS[codec][0]
+    blocks = [compress(_shuffle(np.ascontiguousarray(array[i:i + chunk_rows], dtype=dtype)), level)
+              for i in range(0, len(array), chunk_rows)]
+    header = json.dumps({'shape': list(array.shape), 'dtype': dtype.str, 'chunk_rows': chunk_rows,
+                         'codec': codec, 'scale': scale, 'sizes': [len(block) for block in blocks]}).encode()
+    with open(file_name, 'wb') as file:
+        file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        for block in blocks:
+            file.write(block)
+
+class ChunkedArray():
+    '''
+    Read-only array stored by save_chunked. Indexing (rows, columns) reads and
+    decompresses only the blocks holding the rows asked for; the last
+    cache_size blocks are kept decompressed.
+    '''
+
+    def __init__(self, file_name, cache_size=64):
+        self.file_name = file_name
+        with open(file_name, 'rb') as file:
+            if file.read(4) != MAGIC:
+                raise ValueError('Not a chunked TA array: ' + str(file_name))
+            length = struct.unpack('<I', file.read(4))[0]
+            header = json.loads(file.read(length))
+        self.shape = tuple(header['shape'])
+        self.stored = np.dtype(header['dtype'])
+        self.scale = header.get('scale')
+        self.dtype = self.stored if self.scale is None else np.dtype(np.float32)
+        self.chunk_rows = header['chunk_rows']
+        self.codec = header['codec']
+        self.offsets = 8 + length + np.concatenate(([0], np.cumsum(header['sizes'])))
+        self.block = lru_cache(maxsize=cache_size)(self._block)
+
+    def __len__(self):
+        return self.shape[0]
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def _block(self, k):
+        with open(self.file_name, 'rb') as file:
+            file.seek(self.offsets[k])
+            data = CODECS[self.codec][1](file.read(self.offsets[k + 1] - self.offsets[k]))
+        rows = min(self.chunk_rows, self.shape[0] - k*self.chunk_rows)
+        block = _unshuffle(data, self.stored, (rows,) + self.shape[1:])
+        if self.scale is None:
+            return block
+        return np.where(block == np.iinfo(self.stored).min, np.nan, block*self.scale).astype(np.float32)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        rows = np.arange(self.shape[0])[key[0]]
+        blocks = {k: self.block(k) for k in np.unique(np.atleast_1d(rows)//self.chunk_rows)}
+        if np.ndim(rows) == 0:
+            data = blocks[rows//self.chunk_rows][rows % self.chunk_rows]
+        else:
+            data = np.empty((len(rows),) + self.shape[1:], dtype=self.dtype)
+            for k, block in blocks.items():
+                inside = rows//self.chunk_rows == k
+                data[inside] = block[rows[inside] % self.chunk_rows]
+        return data[(slice(None),)*(np.ndim(rows) > 0) + key[1:]] if len(key) > 1 else data
+
+    def __array__(self, dtype=None, copy=None):
+        array = self[:]
+        return array.astype(dtype) if dtype is not None else array
+
+class Scan():
+    def __init__(self, wl, delays, delta_od, meta=None, path=None, extra=None):
+        self.wl = wl
+        self.delays = delays
+        self.delta_od = delta_od
+        self.meta = meta if meta is not None else {}
+        self.path = path
+        self.extra = extra if extra is not None else {}
+
+    @property
+    def shape(self):
+        return self.delta_od.shape
+
+def _save_array(folder, name, array, compression=None, precision=None):
+    '''2D arrays as .tac when compressing, everything else as .npy.'''
+    array = np.asarray(array)
+    for ext in ('.npy', CHUNKED):               #a scan saved again may change format
+        if os.path.exists(os.path.join(folder, name + ext)):
+            os.remove(os.path.join(folder, name + ext))
+    if compression and array.ndim == 2 and array.size and compact_dtype(array) is not None:
+        save_chunked(os.path.join(folder, name + CHUNKED), array,
+                     codec=best_codec() if compression == 'auto' else compression, precision=precision)
+    else:
+        np.save(os.path.join(folder, name + '.npy'), array)
+
+def save_scan(folder, wl, delays, delta_od, meta=None, compression=None, precision=None, **extra):
+    '''
+    compression: None (.npy, float64), 'auto' (best installed codec) or a name
+    of CODECS for delta_od; precision: step of the stored deltaO values
+    (float32 if None). extra arrays are saved unchanged.
+    '''
+    os.makedirs(folder, exist_ok=True)
+    meta = dict(meta or {})
+    meta.setdefault('date', time.strftime('%Y-%m-%d %H:%M:%S'))
+    np.save(os.path.join(folder, 'wavelengths.npy'), np.asarray(wl, dtype=float))
+    np.save(os.path.join(folder, 'delays.npy'), np.asarray(delays, dtype=float))
+    _save_array(folder, 'delta_od', delta_od, compression, precision)
+    for name, array in extra.items():
+        _save_array(folder, name, array)
+    with open(os.path.join(folder, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=4)
+
+class ScanWriter():
+    '''
+    Scan folder written row by row while measuring: delta_od.npy is created
+    memory-mapped (NaN rows until measured), so a sweep is never held in RAM.
+    With compression, it is replaced by delta_od.tac when the sweep is closed.
+    '''
+
+    def __init__(self, folder, wl, delays, meta=None, dtype=float, compression=None, precision=None):
+        save_scan(folder, wl, delays, np.empty((0, len(wl))), meta)
+        self.folder = folder
+        self.compression = compression
+        self.precision = precision
+        self.delta_od = np.lib.format.open_memmap(os.path.join(folder, 'delta_od.npy'), mode='w+',
+                                                  dtype=dtype, shape=(len(delays), len(wl)))
+        self.delta_od[:] = np.nan
+
+    def write(self, i, row):
+        self.delta_od[i] = row
+
+    def close(self, **extra):
+        for name, array in extra.items():
+            _save_array(self.folder, name, array)
+        self.delta_od.flush()
+        if self.compression:
+            delta_od = np.array(self.delta_od)
+            del self.delta_od
+            _save_array(self.folder, 'delta_od', delta_od, self.compression, self.precision)
+        else:
+            del self.delta_od
+
+def load_scan(folder, mmap=True):
+    mode = 'r' if mmap else None
+    arrays = {}
+    for file_name in os.listdir(folder):
+        name, ext = os.path.splitext(file_name)
+        if ext == '.npy':
+            arrays[name] = np.load(os.path.join(folder, file_name), mmap_mode=mode)
+        elif ext == CHUNKED:
+            arrays[name] = ChunkedArray(os.path.join(folder, file_name))
+            if not mmap:
+                arrays[name] = np.asarray(arrays[name])
+    meta = {}
+    if os.path.exists(os.path.join(folder, 'meta.json')):
+        with open(os.path.join(folder, 'meta.json')) as file:
+            meta = json.load(file)
+    return Scan(np.array(arrays.pop('wavelengths')), np.array(arrays.pop('delays')),
+                arrays.pop('delta_od'), meta, folder, arrays)
+
+def load_text(file_spec):
+    with open(file_spec) as file:
+        header = ' '.join(line[1:] for line in file if line.startswith('#'))
+    ta_data = np.loadtxt(file_spec).transpose()
+    return Scan(ta_data[0], np.array(header.split(), dtype=float), ta_data[1:], {}, file_spec)
+
+def load(path, mmap=True):
+    '''Scan folder (memory-mapped) or text file, chosen by the path.'''
+    if os.path.isdir(path):
+        return load_scan(path, mmap)
+    return load_text(path)
+
+def merge_scans(paths, output):
+    '''
+    Merge scans with the same wavelength axis into one scan sorted by delay.
+    Rows are copied one by one through memory maps, so the merged scan never
+    has to fit in RAM.
+    '''
+    scans = [load(path) for path in paths]
+    wl = scans[0].wl
+    for scan in scans[1:]:
+        if scan.wl.shape != wl.shape or not np.allclose(scan.wl, wl):
+            raise ValueError('Scans with different wavelength axes: ' + str(scan.path))
+    delays = np.concatenate([scan.delays for scan in scans])
+    source = np.concatenate([np.full(len(scan.delays), n) for n, scan in enumerate(scans)])
+    row = np.concatenate([np.arange(len(scan.delays)) for scan in scans])
+    order = np.argsort(delays, kind='stable')
+    os.makedirs(output, exist_ok=True)
+    merged = np.lib.format.open_memmap(os.path.join(output, 'delta_od.npy'), mode='w+',
+                                       dtype=scans[0].delta_od.dtype, shape=(len(delays), len(wl)))
+    for k, i in enumerate(order):
+        merged[k] = scans[source[i]].delta_od[row[i]]
+    merged.flush()
+    del merged
+    np.save(os.path.join(output, 'wavelengths.npy'), wl)
+    np.save(os.path.join(output, 'delays.npy'), delays[order])
+    with open(os.path.join(output, 'meta.json'), 'w') as file:
+        json.dump({'merged_from': [str(scan.path) for scan in scans]}, file, indent=4)
+    return load_scan(output)
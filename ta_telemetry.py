@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+import threading
+from collections import deque
+import numpy as np
+
+SAMPLE = np.dtype([('t', 'f8'),                 #time.monotonic(), s
+                   ('position', 'i8'),          #counts
+                   ('velocity', 'f4'),
+                   ('moving', 'i1'),            #+1 forward, -1 reverse, 0 stopped
+                   ('settled', 'i1'),
+                   ('shutter', 'i1')])          #1 open, 0 closed, -1 unknown
+EVENT = np.dtype([('t_command', 'f8'), ('t_done', 'f8'), ('state', 'i1')])     #shutter commands
+
+class Telemetry():
+    '''
+    Background recorder of the stage status and the shutter state.
+
+    A thread copies stage.status (kept up to date by the APT driver's own
+    status messages, so reading it sends nothing to the controller) into a
+    preallocated ring buffer rate times per second, with its timestamp. The
+    shutter is not polled: its serial line is busy with the scan commands,
+    so watch_shutter() wraps open_shutter()/close_shutter() and the state
+    recorded is the one of the last completed command; events keeps the
+    start and end time of every command (the last event_capacity ones).
+
+    The samples of a scan are saved with it, so the delay of every point at
+    the time its frames were integrated (true_delays()), slow moves or
+    position jitter can be looked at after the scan, without one more device
+    query while measuring.
+
+    Usage
+    -----
+    import ta_telemetry
+
+    telemetry = ta_telemetry.Telemetry(stage, shutter, rate=200)
+    telemetry.start()
+    t_start = time.monotonic()
+    ...
+    samples = telemetry.samples(t_start)
+    telemetry.stop()
+    '''
+
+    def __init__(self, stage, shutter=None, rate=200, capacity=360000, event_capacity=100000):
+        self.stage = stage
+        self.rate = rate                #samples per second
+        self.buffer = np.zeros(capacity, dtype=SAMPLE)
+        self.count = 0                  #samples written since the start
+        self.shutter_state = -1
+        self.events = deque(maxlen=event_capacity)     #(t_command, t_done, state) of shutter commands (EVENT)
+        self.lock = threading.Lock()
+        self.running = threading.Event()
+        self.thread = None
+        if shutter is not None:
+            self.watch_shutter(shutter)
+
+    def watch_shutter(self, shutter):
+        for name, state in (('open_shutter', 1), ('close_shutter', 0)):
+            method = getattr(shutter, name)
+            if getattr(method, 'telemetry', None) is not None:     #already watched
+                method = method.wrapped
+
+            def watched(*args, method=method, state=state, **kwargs):
+                t_command = time.monotonic()
+                result = method(*args, **kwargs)
+                self.shutter_state = state
+                with self.lock:
+                    self.events.append((t_command, time.monotonic(), state))
+                return result
+            watched.telemetry = self
+            watched.wrapped = method
+            setattr(shutter, name, watched)
+
+    def start(self):
+        if self.thread is None:
+            self.running.set()
+            self.thread = threading.Thread(target=self._sample, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running.clear()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _sample(self):
+        period = 1/self.rate
+        next_t = time.monotonic()
+        while self.running.is_set():
+            status = self.stage.status
+            now = time.monotonic()
+            moving = 1 if status.get('moving_forward') else -1 if status.get('moving_reverse') else 0
+            with self.lock:
+                self.buffer[self.count % len(self.buffer)] = (now, status['position'], status.get('velocity', 0),
+                                                              moving, bool(status.get('settled', True)),
+                                                              self.shutter_state)
+                self.count += 1
+            next_t += period
+            time.sleep(max(next_t - time.monotonic(), 0))
+            if time.monotonic() - next_t > period:          #fell behind: do not catch up in a burst
+                next_t = time.monotonic()
+
+    def samples(self, t_from=None, t_to=None):
+        '''Copy of the samples still in the buffer between t_from and t_to (time.monotonic()), oldest first.'''
+        with self.lock:
+            n = min(self.count, len(self.buffer))
+            k = np.arange(self.count - n, self.count) % len(self.buffer)
+            samples = self.buffer[k]
+        return samples[_between(samples['t'], t_from, t_to)]
+
+    def shutter_events(self, t_from=None, t_to=None):
+        '''Shutter commands sent between t_from and t_to, as an EVENT array.'''
+        with self.lock:
+            events = np.array(list(self.events), dtype=EVENT)
+        return events[_between(events['t_command'], t_from, t_to)]
+
+def _between(t, t_from, t_to):
+    keep = np.ones(len(t), dtype=bool)
+    if t_from is not None:
+        keep &= t >= t_from
+    if t_to is not None:
+        keep &= t <= t_to
+    return keep
+
+def true_delays(samples, windows, calibration):
+    '''
+    Mean delay (fs) of the stage position sampled during every acquisition
+    window (t_start, t_end), interpolated when no sample falls inside; NaN
+    for windows with no samples around them. windows has shape (..., 2).
+    '''
+    windows = np.asarray(windows, dtype=float)
+    t, position = samples['t'], samples['position'].astype(float)
+    delays = np.full(windows.shape[:-1], np.nan)
+    if len(t) < 2:
+        return delays
+    for index in np.ndindex(delays.shape):
+        t_start, t_end = windows[index]
+        if not (np.isfinite(t_start) and t[0] <= t_start and t_end <= t[-1]):
+            continue
+        inside = (t >= t_start) & (t <= t_end)
+        counts = position[inside].mean() if inside.any() else np.interp((t_start + t_end)/2, t, position)
+        delays[index] = calibration.delay(counts)
+    return delays
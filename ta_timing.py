@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import time
+from contextlib import contextmanager
+
+class ScanTimer():
+    '''
+    Per-delay timing of the phases of a TA scan (stage move, settle sleeps,
+    shutter serial queries, spectrometer reads, deltaO processing, plotting).
+
+    Usage
+    -----
+    import ta_timing
+
+    timer = ta_timing.ScanTimer()
+    timer.start_scan(n_points)
+    for d in delays:
+        timer.point(d)
+        with timer.phase('move'):
+            move_stage_fs(d)
+    timer.finish()                  #later phases (one-shot spectra...) are not timed
+    print(timer.summary())
+    timer.save('scan_timing.txt')
+    '''
+
+    def __init__(self):
+        self.rows = []
+        self.phases = []            #phase names in order of first appearance
+        self.n_points = 0
+        self.t_start = None
+        self.running = False        #phases are timed between start_scan() and finish()
+
+    def start_scan(self, n_points):
+        self.rows = []
+        self.phases = []
+        self.n_points = n_points
+        self.t_start = time.perf_counter()
+        self.running = True
+
+    def finish(self):
+        self.running = False
+
+    def point(self, delay):
+        self.rows.append({'delay': delay, 'start': time.perf_counter() - self.t_start})
+
+    @contextmanager
+    def phase(self, name, row=-1):
+        '''
+        Add the time spent in the block to phase name of a delay point (the
+        latest one by default; pipelined scans pass the index of the point).
+        '''
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.running and self.rows:
+                if name not in self.phases:
+                    self.phases.append(name)
+                row = self.rows[row]
+                row[name] = row.get(name, 0) + time.perf_counter() - t0
+
+    def totals(self):
+        return {name: sum(row.get(name, 0) for row in self.rows) for name in self.phases}
+
+    def summary(self):
+        '''
+        Points/min, ETA and share of the elapsed time per phase. In pipelined
+        scans the phases overlap, so the shares can add up to more than 100%.
+        '''
+        if not self.rows:
+            return ''
+        elapsed = time.perf_counter() - self.t_start
+        rate = len(self.rows)/elapsed * 60
+        eta = (self.n_points - len(self.rows)) * elapsed/len(self.rows)
+        shares = ', '.join(name + ' ' + str(round(100*total/elapsed)) + '%'
+                           for name, total in self.totals().items())
+        return (str(round(rate, 1)) + ' points/min, ETA ' + str(round(eta)) + ' s\n' + shares)
+
+    def save(self, file_name):
+        with open(file_name, 'w') as file:
+            file.write('# delay_fs\tstart_s\t' + '\t'.join(name + '_s' for name in self.phases) + '\n')
+            for row in self.rows:
+                values = [row['delay'], row['start']] + [row.get(name, 0) for name in self.phases]
+                file.write('\t'.join('%.6g' % value for value in values) + '\n')
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import os
+import numpy as np
+import pyqtgraph as pg
+from pyqtgraph.Qt import QtWidgets as qtw
+import ta_storage
+import ta_catalog
+
+class OfflineViewer(qtw.QWidget):
+    '''
+    Browser of saved TA scans: 2D deltaO map (wavelength x delay index) with a
+    draggable wavelength line and delay line, and the kinetic and spectral
+    cuts at those lines.
+
+    Scan folders are memory-mapped: the map shows a strided view of at most
+    max_image_size rows/columns, and the cuts read one row or one column, so
+    multi-gigabyte merged scans are never loaded whole. The search box looks
+    up the scan catalog (sample or path, see ta_catalog); double-click a
+    result to open it.
+
+    Usage
+    -----
+    python ta_viewer.py [scan.tas | scan.txt]
+    '''
+
+    max_image_size = 2000           #rows/columns of the displayed map
+
+    def __init__(self, path=None, parent=None):
+        super().__init__(parent)
+        self.setObjectName("Viewer")
+        self.setWindowTitle("Transient Absorption Viewer")
+        self.resize(1000, 800)
+        self.scan = None
+
+        self.open_pushButton = qtw.QPushButton("Open")
+        self.open_folder_pushButton = qtw.QPushButton("Open .tas")
+        self.file_label = qtw.QLabel("")
+        self.cursor_label = qtw.QLabel("")
+        self.search_lineEdit = qtw.QLineEdit()
+        self.search_lineEdit.setPlaceholderText("Search catalog")
+        self.results_listWidget = qtw.QListWidget()
+        self.results_listWidget.setMaximumHeight(120)
+        self.results_listWidget.hide()
+        buttons = qtw.QHBoxLayout()
+        buttons.addWidget(self.open_pushButton)
+        buttons.addWidget(self.open_folder_pushButton)
+        buttons.addWidget(self.search_lineEdit)
+        buttons.addWidget(self.file_label, 1)
+        buttons.addWidget(self.cursor_label)
+
+        self.graphics = pg.GraphicsLayoutWidget()
+        self.map_plot = self.graphics.addPlot(row=0, col=0, rowspan=2)
+        self.map_plot.setLabel("bottom", "Wavelength", units="nm")
+        self.map_plot.setLabel("left", "Delay index")
+        self.image = pg.ImageItem(autoDownsample=True)
+        self.map_plot.addItem(self.image)
+        self.colorbar = pg.ColorBarItem(colorMap=pg.colormap.get('CET-D1'), interactive=True)
+        self.colorbar.setImageItem(self.image, insert_in=self.map_plot)
+        self.wl_line = pg.InfiniteLine(angle=90, movable=True, pen='w')
+        self.delay_line = pg.InfiniteLine(angle=0, movable=True, pen='w')
+        self.map_plot.addItem(self.wl_line)
+        self.map_plot.addItem(self.delay_line)
+
+        self.kinetic_plot = self.graphics.addPlot(row=0, col=1)
+        self.kinetic_plot.setLabel("bottom", "Delay", units="fs")
+        self.kinetic_plot.setLabel("left", "deltaO", units="a.u.")
+        self.kinetic_plot.showGrid(x=True, y=True, alpha=True)
+        self.spectrum_plot = self.graphics.addPlot(row=1, col=1)
+        self.spectrum_plot.setLabel("bottom", "Wavelength", units="nm")
+        self.spectrum_plot.setLabel("left", "deltaO", units="a.u.")
+        self.spectrum_plot.showGrid(x=True, y=True, alpha=True)
+        self.kinetic_curve = self.kinetic_plot.plot(pen=(0, 114, 189), symbolPen='w', symbol='o', symbolSize=3)
+        self.spectrum_curve = self.spectrum_plot.plot(pen=(0, 114, 189))
+        for curve in (self.kinetic_curve, self.spectrum_curve):
+            curve.setDownsampling(auto=True, method='peak')
+            curve.setClipToView(True)
+
+        layout = qtw.QVBoxLayout(self)
+        layout.addLayout(buttons)
+        layout.addWidget(self.results_listWidget)
+        layout.addWidget(self.graphics)
+
+        self.open_pushButton.clicked.connect(lambda: self.open_scan())
+        self.open_folder_pushButton.clicked.connect(self.open_folder)
+        self.wl_line.sigPositionChanged.connect(self.kinetic_cut)
+        self.delay_line.sigPositionChanged.connect(self.spectral_cut)
+        self.search_lineEdit.returnPressed.connect(self.search)
+        self.results_listWidget.itemDoubleClicked.connect(lambda item: self.open_scan(item.data(pg.QtCore.Qt.UserRole)))
+
+        if path:
+            self.open_scan(path)
+
+    def open_folder(self):
+        folder = qtw.QFileDialog.getExistingDirectory(self, "Open scan folder")
+        if folder:
+            self.open_scan(folder)
+
+    def open_scan(self, path=None):
+        if not path:
+            path = qtw.QFileDialog.getOpenFileName(self, "Open scan")[0]
+            if not path:
+                return
+        self.show_scan(ta_storage.load(path))
+
+    def search(self):
+        catalog = ta_catalog.Catalog()
+        entries = catalog.find(text=self.search_lineEdit.text())
+        catalog.close()
+        self.results_listWidget.clear()
+        for entry in entries:
+            item = qtw.QListWidgetItem(entry['date'] + "  " + str(entry['sample'] or "") + "  "
+                                       + str(entry['n_delays']) + " delays, " + str(entry['delay_min']) + " to "
+                                       + str(entry['delay_max']) + " fs  " + entry['path'])
+            item.setData(pg.QtCore.Qt.UserRole, entry['path'])
+            self.results_listWidget.addItem(item)
+        self.results_listWidget.setVisible(bool(entries))
+
+    def show_scan(self, scan):
+        self.scan = scan
+        n_delays, n_pixels = scan.shape
+        step_delay = max(1, int(np.ceil(n_delays/self.max_image_size)))
+        step_wl = max(1, int(np.ceil(n_pixels/self.max_image_size)))
+        preview = np.asarray(scan.delta_od[::step_delay, ::step_wl], dtype=np.float32)
+        finite = preview[np.isfinite(preview)]
+        levels = np.percentile(finite, (1, 99)) if finite.size else (0, 1)
+        self.image.setImage(np.nan_to_num(preview).T, levels=levels)
+        self.image.setRect(pg.QtCore.QRectF(scan.wl[0], 0, scan.wl[-1] - scan.wl[0], n_delays))
+        self.colorbar.setLevels(levels)
+        self.file_label.setText(os.path.basename(str(scan.path).rstrip('/\\')) + "  " + str(n_delays)
+                                + " delays x " + str(n_pixels) + " pixels")
+        self.wl_line.setBounds((scan.wl[0], scan.wl[-1]))
+        self.delay_line.setBounds((0, n_delays - 1))
+        self.wl_line.setValue(scan.wl[n_pixels//2])
+        self.delay_line.setValue(n_delays//2)
+        self.kinetic_cut()
+        self.spectral_cut()
+
+    def pixel(self):
+        return int(np.clip(np.searchsorted(self.scan.wl, self.wl_line.value()), 0, len(self.scan.wl) - 1))
+
+    def row(self):
+        return int(np.clip(round(self.delay_line.value()), 0, len(self.scan.delays) - 1))
+
+    def kinetic_cut(self):
+        if self.scan is None:
+            return
+        pixel = self.pixel()
+        self.kinetic_curve.setData(self.scan.delays, np.asarray(self.scan.delta_od[:, pixel]))
+        self.update_cursor()
+
+    def spectral_cut(self):
+        if self.scan is None:
+            return
+        self.spectrum_curve.setData(self.scan.wl, np.asarray(self.scan.delta_od[self.row()]))
+        self.update_cursor()
+
+    def update_cursor(self):
+        self.cursor_label.setText(str(round(self.scan.wl[self.pixel()], 2)) + " nm, "
+                                  + str(self.scan.delays[self.row()]) + " fs")
+
+if __name__ == '__main__':
+    import sys
+    app = qtw.QApplication([])
+    viewer = OfflineViewer(sys.argv[1] if len(sys.argv) > 1 else None)
+    viewer.show()
+    app.exec_()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+'''
+Automatic search of zero delay.
+
+The stage is scanned over a window of delays around the current guess, the
+signal (one fast deltaO per delay) is fitted with an error-function rise (or
+a Gaussian for the coherent artifact), and the window is shrunk around the
+fitted zero for the next level. The number of stage moves is fixed:
+levels x points.
+
+Fits start from the best (t0, sigma) of a coarse grid, for which the offset
+and the amplitude are solved by linear least squares (no local minima to
+fall into), and are refined by ta_kinetics.fit_model.
+
+Usage
+-----
+import ta_zero
+
+search = ta_zero.ZeroSearch(move=move_stage_fs, measure=signal, span=2000)
+t0, sigma = search.run()            #fs, relative to the delay zero used by move
+'''
+
+import numpy as np
+import ta_kinetics
+
+def model(t, t0, sigma, shape='rise'):
+    '''Unit step smoothed by a Gaussian of width sigma ('rise') or the Gaussian itself ('peak').'''
+    if shape == 'peak':
+        return np.exp(-((np.asarray(t, dtype=float) - t0)/sigma)**2/2)
+    return ta_kinetics.step_irf(t, t0, sigma)
+
+def fit(t, y, shape='rise', t0_range=None, n_t0=51, n_sigma=12):
+    '''
+    Fit y = offset + amplitude*model(t, t0, sigma), t0 within t0_range (the
+    range of t by default). Returns t0, sigma, offset, amplitude, residual
+    sum of squares.
+    '''
+    best = grid_fit(t, y, shape, t0_range, n_t0, n_sigma)
+    if t0_range is None:
+        t0_range = (np.min(t), np.max(t))
+    try:
+        params, cov, rss, n = ta_kinetics.fit_model(lambda t, t0, sigma, offset, amplitude:
+                                                    offset + amplitude*model(t, t0, sigma, shape),
+                                                    t, y, best[:4], [-np.inf, 1e-3, -np.inf, -np.inf])
+    except (RuntimeError, ValueError):          #no convergence: the grid point
+        return best
+    if not (t0_range[0] <= params[0] <= t0_range[1]) or rss > best[4]:
+        return best
+    return tuple(params) + (rss,)
+
+def grid_fit(t, y, shape='rise', t0_range=None, n_t0=51, n_sigma=12):
+    '''Best (t0, sigma) of a grid, offset and amplitude by linear least squares: the start of fit().'''
+    t = np.asarray(t, dtype=float)
+    y = np.asarray(y, dtype=float)
+    spacing = np.diff(np.unique(t))
+    step = spacing.min()
+    span = t.max() - t.min()
+    if t0_range is None:
+        t0_range = (t.min(), t.max())
+    t0 = np.linspace(t0_range[0], t0_range[1], n_t0)
+    best = None
+    for sigma in np.geomspace(step/4, span/2, n_sigma):
+        basis = model(t[None, :], t0[:, None], sigma, shape)        #t0 x t
+        basis_mean = basis.mean(axis=1, keepdims=True)
+        centered = basis - basis_mean
+        var = (centered**2).sum(axis=1)
+        amplitude = centered @ (y - y.mean())/np.where(var > 0, var, np.inf)
+        offset = y.mean() - amplitude*basis_mean[:, 0]
+        rss = ((offset[:, None] + amplitude[:, None]*basis - y)**2).sum(axis=1)
+        k = int(np.argmin(rss))
+        if best is None or rss[k] < best[4]:
+            best = (t0[k], sigma, offset[k], amplitude[k], rss[k])
+    return best
+
+class ZeroSearch():
+    '''
+    Coarse-to-fine search of zero delay.
+
+    move(delay_fs) must return once the stage is at delay_fs; measure()
+    returns one number per delay (for example the rms deltaO of a spectral
+    window). Every level scans points delays over center +/- span and the
+    next level is centred on the fitted zero with span/shrink.
+    '''
+
+    def __init__(self, move, measure, span=2000, points=11, levels=3, shrink=4, shape='rise'):
+        self.move = move
+        self.measure = measure
+        self.span = span            #fs, half width of the first window
+        self.points = points
+        self.levels = levels
+        self.shrink = shrink
+        self.shape = shape
+        self.delays = []
+        self.signal = []
+        self.result = None
+
+    def level(self, center, span):
+        delays = np.linspace(center - span, center + span, self.points)
+        signal = []
+        for d in delays:
+            self.move(d)
+            signal.append(self.measure())
+        self.delays.extend(delays)
+        self.signal.extend(signal)
+        return fit(delays, signal, self.shape)
+
+    def run(self, center=0):
+        '''Returns (t0, sigma) in fs; every measured point is kept in delays/signal.'''
+        self.delays = []
+        self.signal = []
+        span = self.span
+        for n in range(self.levels):
+            self.result = self.level(center, span)
+            center = self.result[0]
+            span = span/self.shrink
+        span = span*self.shrink
+        self.result = fit(self.delays, self.signal, self.shape,    #all levels together
+                          (center - span, center + span))
+        return float(self.result[0]), float(self.result[1])
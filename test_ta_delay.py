@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import numpy as np
+import ta_delay
+import ta_scan_engine
+import ta_timing
+import ta_simulation as sim
+
+def test_backlash_on_by_default():
+    assert ta_delay.DelayCalibration(zero=2200000).backlash == ta_delay.BACKLASH > 0
+
+def test_approach_from_the_same_side():
+    calibration = ta_delay.DelayCalibration(zero=2200000)
+    for current in (2100000, 2300000):
+        path = calibration.approach(current, 2200000)
+        legs = [current] + path
+        assert path[-1] == 2200000
+        assert legs[-1] - legs[-2] > 0          #last leg always in +1 direction
+
+class Moves(sim.SimulatedBBD201):
+    '''Simulated stage keeping every commanded position.'''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.commands = []
+
+    def move_absolute(self, position, *args, **kwargs):
+        self.commands.append((self.status['position'], position))
+        return super().move_absolute(position, *args, **kwargs)
+
+def test_scan_both_directions_ends_moving_forward():
+    stage = Moves(home=False, position=2200000, time_scale=0)
+    calibration = ta_delay.DelayCalibration(zero=2200000)
+    delays = np.arange(-500, 600, 100)
+    targets = set(calibration.counts(delays).tolist())
+    timer = ta_timing.ScanTimer()
+    timer.start_scan(2*len(delays))
+    engine = ta_scan_engine.ScanEngine(stage, calibration, acquire=lambda: None, timer=timer, poll=0)
+    reached = []
+    for sweep in (delays, delays[::-1]):       #forward, then a reverse sweep
+        stage.commands = []
+        engine.run(sweep, lambda i, d, position, frames: reached.append(position))
+        final = [(start, end) for start, end in stage.commands if end in targets]
+        assert len(final) == len(sweep)
+        assert all(end >= start for start, end in final)     #equal: already there, no move
+        assert sweep[0] < sweep[-1] or len(stage.commands) > len(sweep)     #reverse: pre-positions past the targets
+    assert set(reached) == targets
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# revisão 19/10/2026
+
+import numpy as np
+import ta_background as bg
+import ta_quality
+import ta_simulation as sim
+
+def frames(seed=0):
+    spectrometer = sim.SimulatedSpectrometer(time_scale=0, seed=seed)
+    return spectrometer.intensities(), spectrometer.intensities()
+
+def test_good_pair_accepted():
+    off, on = frames()
+    assert ta_quality.QualityCheck(saturation=65535).check(off, on) is None
+
+def test_bad_read_rejected_although_delta_od_is_finite():
+    off, on = frames()
+    on[100:200] = 0                     #pixels lost by the read
+    assert np.all(np.isfinite(bg.delta_od(on, off)))        #clipped: the deltaO alone looks valid
+    reason = ta_quality.QualityCheck(saturation=65535).check(off, on)
+    assert reason is not None and reason.startswith('bad read')
+
+def test_nan_frame_rejected():
+    off, on = frames()
+    off[5] = np.nan
+    assert ta_quality.QualityCheck().check(off, on).startswith('bad read')
+
+def test_saturation_rejected():
+    off, on = frames()
+    on[1000] = 65535
+    assert ta_quality.QualityCheck(saturation=65535).check(off, on) == 'saturation'
+
+def test_probe_dropout_rejected():
+    quality = ta_quality.QualityCheck(saturation=65535)
+    for seed in range(5):
+        assert quality.check(*frames(seed)) is None
+    off, on = frames(9)
+    assert quality.check(off, on*0.5).startswith('probe dropout')
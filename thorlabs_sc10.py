@@ -1,8 +1,6 @@
 # -*- coding: utf-8 -*-
 # revisão 30/08/2023
 
-import pyvisa as visa
-from pyvisa import constants
 import time
 
 class ThorlabsSC10():
@@ -88,7 +86,8 @@ class ThorlabsSC10():
         self.brand = 'Thorlabs'
         self.model = 'SC10'
         
-    def rs232_set_up(self, com_port):
+    def rs232_set_up(self, com_port, timeout=25000):
+        import pyvisa as visa                   #imported here so analysis-only use needs no VISA
         self.rm = visa.ResourceManager()
         #self.ports = rm.list_resources()
         self.ser = self.rm.open_resource(com_port)
@@ -99,13 +98,13 @@ class ThorlabsSC10():
         self.ser.parity = visa.constants.Parity.none
         self.ser.stop_bits = visa.constants.StopBits.one
         self.ser.flow_control = visa.constants.VI_ASRL_FLOW_NONE
-        self.ser.timeout = 25000
+        self.ser.timeout = timeout
         #return self.com
 
     def id(self):
-        self.id = self.ser.query('id?')
-        self.id = self.id[3:]
-        return self.id
+        self.identity = self.ser.query('id?')
+        self.identity = self.identity[3:]
+        return self.identity
     
     def shutter_state(self):
         self.state = self.ser.query('closed?')
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-# revisão 28/09/2023
+# revisão 19/10/2026
 
 import sys
 import os
@@ -9,12 +9,31 @@ from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QComboBox
 import pyqtgraph as pg
 from pyqtgraph.Qt import QtWidgets as qtw
-from seabreeze.spectrometers import Spectrometer
-from thorlabs_apt_device import BBD201
-import thorlabs_sc10 as tl
+import ta_devices
+import ta_background as bg
+import ta_reference as ref
+import ta_timing
+import ta_scan_engine
+import ta_sequencer
+import ta_storage
+import ta_accumulator
+import ta_quality
+import ta_queue
+import ta_remote
+import ta_burst
+import ta_exposure
+import ta_catalog
+import ta_motion
+import ta_delay
+import ta_telemetry
+import ta_replay
 import numpy as np
 import time
-import keyboard
+from concurrent.futures import ThreadPoolExecutor
+
+def escape_pressed():
+    import keyboard                         #imported on first use, not needed for analysis
+    return keyboard.is_pressed('Escape')
 
 class TransientAbsorption(qtw.QMainWindow, Ui_MainWindow):
     '''
@@ -81,12 +100,34 @@ class TransientAbsorption(qtw.QMainWindow, Ui_MainWindow):
     delay_array = []
     dynamics_array = []
     deltaO_array = []
+    off_index_array = []
+    background_frames = 10              #frames averaged into each dark/scatter reference
+    reference_region = None             #(wl_min, wl_max) in nm, used when no reference spectrometer
+    shutter_settle = 0.5                #s waited after each shutter toggle
+    off_frame_max_age = 5.0             #s a pump-off frame may be shared by neighboring delays
+    sweeps_folder = 'sweeps'            #individual sweeps of repeated scans are kept here
+    max_remeasure = 2                   #attempts to re-acquire a delay point that fails ta_quality
+    zero_search_span = 2000             #fs, half width of the first zero delay search window
+    zero_search_region = None           #(wl_min, wl_max) in nm of the zero delay signal, None = all
+    queue_folder = 'scans'              #output of the recipes run from the scan queue
+    remote_port = ta_remote.PORT        #localhost port of the remote control server
+    burst_capacity = 1000               #frames kept by the burst mode ring buffer
+    max_int_time = 1000000              #us, longest exposure chosen by auto exposure
+    exposure_region = None              #(wl_min, wl_max) in nm watched by auto exposure, None = all
+    exposure_recheck_s = 600            #s after which auto exposure optimizes again during a scan
+    storage_compression = 'auto'        #.tas deltaO: None = float64 .npy, 'auto' = float32, best codec installed
+    storage_precision = None            #OD step of the compressed deltaO values (lossy), None = float32
+    stage_tolerance = 3                 #counts, a target is reached within this distance
+    stage_settle = 0.5                  #s between a stage move and the next pump-on frame
+    telemetry_rate = 200                #Hz, stage status samples recorded while scanning
+    telemetry_capacity = 720000         #samples kept (1 h at 200 Hz)
            
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.setObjectName("Transient Absorption")
         self.setupUi(self)
+        self.calibration = ta_delay.DelayCalibration(**ta_devices.load_config()['delay_calibration'])
 
         self.strt_inttime_lineEdit.setText("10")
         self.strt_delay_lineEdit.setText("200")
@@ -98,26 +139,103 @@ class TransientAbsorption(qtw.QMainWindow, Ui_MainWindow):
         self.dyn_stpdelay_lineEdit.setText("10000")
         self.dyn_inttime_lineEdit.setText("10")
                 
-        self.initialize_pushButton.clicked.connect(self.initialization)
+        self.initialize_pushButton.clicked.connect(lambda: self.device_action(self.initialization))
         self.set_zerodelay_pushButton.clicked.connect(self.zero_delay)
-        self.align_pushButton.clicked.connect(self.alignment)
+        self.find_zero_pushButton = qtw.QPushButton("Find zero", self.tab)
+        self.horizontalLayout_2.insertWidget(2, self.find_zero_pushButton)
+        self.find_zero_pushButton.clicked.connect(lambda: self.device_action(self.find_zero))
+        self.align_pushButton.clicked.connect(lambda checked: self.device_action(self.alignment, checked))
         self.align_exit_pushButton.clicked.connect(self.exit)
-        self.arb_move_pushButton.clicked.connect(self.move_stage_mm)
-        self.one_fs_pushButton.clicked.connect(lambda: self.move_stage_rel(1))
-        self.none_fs_pushButton.clicked.connect(lambda: self.move_stage_rel(-1))
-        self.five_fs_pushButton.clicked.connect(lambda: self.move_stage_rel(5))
-        self.nfive_fs_pushButton.clicked.connect(lambda: self.move_stage_rel(-5))
-        self.ten_fs_pushButton.clicked.connect(lambda: self.move_stage_rel(10))
-        self.nten_fs_pushButton.clicked.connect(lambda: self.move_stage_rel(-10))        
-        self.spc_meas_pushButton.clicked.connect(lambda: self.ta_dynamics(True))
+        self.arb_move_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_mm))
+        self.one_fs_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_rel, 1))
+        self.none_fs_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_rel, -1))
+        self.five_fs_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_rel, 5))
+        self.nfive_fs_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_rel, -5))
+        self.ten_fs_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_rel, 10))
+        self.nten_fs_pushButton.clicked.connect(lambda: self.device_action(self.move_stage_rel, -10))        
+        self.spc_meas_pushButton.clicked.connect(lambda: self.device_action(self.ta_dynamics, True))
         self.spc_clean_pushButton.clicked.connect(self.clear)
         self.spc_save_pushButton.clicked.connect(self.save)
         self.spc_exit_pushButton.clicked.connect(self.exit)
-        self.dyn_meas_pushButton.clicked.connect(lambda: self.ta_dynamics(False))
+        self.dyn_meas_pushButton.clicked.connect(lambda: self.device_action(self.ta_dynamics, False))
         self.dyn_pushButton.clicked.connect(self.open_ta_window)
         self.dyn_clean_pushButton.clicked.connect(self.clear)
         self.dyn_save_pushButton.clicked.connect(lambda: self.save('transient_spectrum'))
         self.dyn_exit_pushButton.clicked.connect(self.exit)
+        self.sweeps_label = qtw.QLabel("Sweeps", self.tab_2)
+        self.dyn_sweeps_spinBox = qtw.QSpinBox(self.tab_2)
+        self.dyn_sweeps_spinBox.setRange(1, 10000)
+        self.horizontalLayout_5.addWidget(self.sweeps_label)
+        self.horizontalLayout_5.addWidget(self.dyn_sweeps_spinBox)
+        self.averages_label = qtw.QLabel("Averages", self.tab_2)
+        self.dyn_averages_spinBox = qtw.QSpinBox(self.tab_2)
+        self.dyn_averages_spinBox.setRange(1, 10000)
+        self.horizontalLayout_5.addWidget(self.averages_label)
+        self.horizontalLayout_5.addWidget(self.dyn_averages_spinBox)
+        self.dyn_autoexposure_checkBox = qtw.QCheckBox("Auto exposure", self.tab_2)
+        self.horizontalLayout_5.addWidget(self.dyn_autoexposure_checkBox)
+        self.open_action = self.menubar.addAction("Open scan")
+        self.open_action.triggered.connect(lambda: self.load_scan())
+        self.viewer_action = self.menubar.addAction("Viewer")
+        self.viewer_action.triggered.connect(self.open_viewer)
+        self.queue_action = self.menubar.addAction("Queue")
+        self.queue_action.triggered.connect(self.open_queue_window)
+        self.remote_action = self.menubar.addAction("Remote control")
+        self.remote_action.setCheckable(True)
+        self.remote_action.toggled.connect(lambda checked: self.start_remote() if checked else self.stop_remote())
+        self.burst_action = self.menubar.addAction("Burst mode")
+        self.burst_action.setCheckable(True)
+        self.burst_action.toggled.connect(lambda checked: self.start_burst() if checked else self.stop_burst())
+        self.tune_action = self.menubar.addAction("Tune stage")
+        self.tune_action.triggered.connect(lambda: self.device_action(self.tune_stage))
+
+        self.stage = None
+        self.shutter = None
+        self.oceanoptics = None
+        self.reference = None
+        self.accumulator = None
+        self.remeasure_log = []
+        self.queue = ta_queue.ScanQueue()
+        self.queue_running = False
+        self.remote = None
+        self.remote_busy = False
+        self.scanning = False               #a measurement or move is using the devices
+        self.engine = None
+        self.burst = None
+        self.motion_profile = ta_motion.MotionProfile.load()
+        self.telemetry = None
+        self.recorder = None                #ta_replay.Recorder of the device traffic, if configured
+        self.scan_window = None
+        self.acquisition_windows = None
+        self.averages = 1
+        self.exposure = None
+        self.reexpose = False
+        self.background = bg.BackgroundCache()
+        self.background_declined = None     #integration time whose background prompt was cancelled
+        self.background_box = None          #non-modal background prompt of a paused scan
+        self.timer = ta_timing.ScanTimer()
+        self.background_pushButton = qtw.QPushButton("Background", self.tab_2)
+        self.horizontalLayout_6.addWidget(self.background_pushButton)
+        self.sample_label = qtw.QLabel("Sample", self.tab_2)
+        self.dyn_sample_lineEdit = qtw.QLineEdit(self.tab_2)
+        self.horizontalLayout_6.addWidget(self.sample_label)
+        self.horizontalLayout_6.addWidget(self.dyn_sample_lineEdit)
+        self.background_pushButton.clicked.connect(lambda: self.device_action(
+            self.acquire_background, int(self.dyn_inttime_lineEdit.text()) * 1000))
+        self.live_fit = None
+        self.fit_layout = qtw.QHBoxLayout()
+        self.fitbands_label = qtw.QLabel("Fit bands (nm)", self.tab_2)
+        self.dyn_fitbands_lineEdit = qtw.QLineEdit(self.tab_2)
+        self.dyn_fitbands_lineEdit.setPlaceholderText("580:620 700:740")
+        self.fitexp_label = qtw.QLabel("Exponentials", self.tab_2)
+        self.dyn_fitexp_spinBox = qtw.QSpinBox(self.tab_2)
+        self.dyn_fitexp_spinBox.setRange(1, 4)
+        self.dyn_fitstop_checkBox = qtw.QCheckBox("Stop when converged", self.tab_2)
+        self.dyn_fit_label = qtw.QLabel("", self.tab_2)
+        for widget in (self.fitbands_label, self.dyn_fitbands_lineEdit, self.fitexp_label, self.dyn_fitexp_spinBox,
+                       self.dyn_fitstop_checkBox, self.dyn_fit_label):
+            self.fit_layout.addWidget(widget)
+        self.gridLayout_4.addLayout(self.fit_layout, 3, 0, 1, 1)
 
     def open_ta_window(self):
         self.ta_window = qtw.QWidget()
@@ -133,133 +251,418 @@ class TransientAbsorption(qtw.QMainWindow, Ui_MainWindow):
         self.graphicsView.plot(TransientAbsorption.wl_array, TransientAbsorption.deltaO_array)
 
     def initialization(self):
-        self.stage = BBD201(serial_port='COM7', home=False)  #set up thorlabs translation stage
-        self.stage.set_enabled(True)
-        self.stage.home()
-        self.zero = 'Delay zero not defined'
-        while True:            
-            if self.stage.status_[0][0]['homing'] == True:
-                initialize_pos = self.stage.status["position"]
-                self.initialize_label.setText("Homing: position = " + str(initialize_pos))
-            elif self.stage.status_[0][0]['homed'] == True:
-                initialize_pos = self.stage.status["position"]
-                self.initialize_label.setText("Homed: position = " + str(initialize_pos))
-                break                
+        '''
+        Connect the devices that are still missing, all in parallel. Pressing
+        Initialize again after a failure retries only the missing ones.
+        '''
+        config = ta_devices.load_config()
+        connected = [name for name, device in (('stage', self.stage), ('shutter', self.shutter),
+                                               ('spectrometers', self.oceanoptics)) if device is not None]
+        if config['record'] and self.recorder is None:
+            self.recorder = ta_replay.Recorder(config['record'])
+        futures = ta_devices.connect(config, skip=connected, recorder=self.recorder)
+        status = {}
+        while True:
+            for name, future in list(futures.items()):
+                if not future.done():
+                    continue
+                del futures[name]
+                try:
+                    device = future.result()
+                except Exception as error:
+                    status[name] = name + ': ' + str(error)
+                    continue
+                if name == 'stage':
+                    self.stage = device
+                    if self.calibration.backlash:       #the approach is done by DelayCalibration
+                        self.stage.set_move_params(0)
+                elif name == 'shutter':
+                    self.shutter, config['shutter_port'] = device
+                    status['shutter'] = self.shutter.identity.strip() + ' - OK'
+                else:
+                    self.oceanoptics, self.reference = device
+                    if self.reference is None and self.reference_region is not None:
+                        self.reference = ref.RegionReference(*self.reference_region)
+                    status['spectrometers'] = str(self.oceanoptics)[1:-10] + ' - OK'
+                    if self.reference is not None:
+                        status['spectrometers'] += '\n' + str(self.reference) + ' - OK'
+            homed = self.stage is not None and self.stage.status_[0][0]['homed'] == True
+            if self.stage is not None:
+                status['stage'] = (("Homed" if homed else "Homing") + ": position = "
+                                   + str(self.stage.status["position"]))
+            self.initialize_label.setText('\n'.join(status[name] for name in ('stage', 'shutter', 'spectrometers')
+                                                     if name in status))
             qtw.QApplication.processEvents()
-        self.shutter = tl.ThorlabsSC10()                        #set up thorlabs shutter
-        self.shutter.rs232_set_up('COM5')
-        if self.shutter.id() == 'THORLABS SC10 VERSION 1.07':
-            self.initialize_label.setText("Homed: position = " + str(initialize_pos)
-                                          + '\nTHORLABS SC10 VERSION 1.07 - OK')
-        self.oceanoptics = Spectrometer.from_first_available()  #set up ocean optics spectrometer
-        if 'Spectrometer' in str(self.oceanoptics):
-            self.initialize_label.setText("Homed: position = " + str(initialize_pos)
-                                          + '\nTHORLABS SC10 VERSION 1.07 - OK'
-                                          + '\n' + str(self.oceanoptics)[1:-10] + ' - OK')
-        
+            if not futures and (homed or self.stage is None):
+                break
+            time.sleep(0.02)
+        ta_devices.save_config(config)
+
         self.graph_start_up()
 
+    @property
+    def zero(self):
+        '''Stage position of zero delay (counts), None until it is set.'''
+        return self.calibration.zero
+
+    @zero.setter
+    def zero(self, counts):
+        self.calibration.zero = counts
+
     def zero_delay(self):        
         self.zero = self.stage.status["position"]
-        self.zero_pos_mm = self.zero/20000
+        self.zero_pos_mm = self.calibration.mm(self.zero)
         self.set_zero_delay_label.setText("Zero delay = " + str(self.zero_pos_mm) + " mm")
         return self.zero      
 
+    def find_zero(self, shape='rise'):
+        '''
+        Coarse-to-fine search of zero delay around the current zero (or the
+        current stage position) with one deltaO per delay; the fitted rise
+        ('rise') or coherent artifact ('peak') becomes the new zero.
+        '''
+        self.int_time = int(self.strt_inttime_lineEdit.text()) * 1000  #read integration time in ms
+        self.refresh_background()
+        center = self.zero if self.calibration.defined else self.stage.status["position"]
+        engine = ta_scan_engine.ScanEngine(self.stage, self.calibration.at(center), None, self.timer,
+                                           self.stage_tolerance)
+        sequencer = ta_sequencer.FrameSequencer(self.shutter, self.referenced_spectrum, self.shutter_settle,
+                                                self.off_frame_max_age, self.timer, self.stage_settle)
+
+        def move(delay_fs):
+            self.timer.point(delay_fs)
+            with self.timer.phase('move'):
+                engine.start_move(delay_fs)
+                engine.wait_move()
+
+        def measure():
+            frames = sequencer.acquire()
+            wl, delta_od = self.process_frames(frames)
+            probe = frames[0][1]
+            use = probe >= probe.min() + 0.2*(probe.max() - probe.min())   #skip the noisy probe wings
+            if self.zero_search_region is not None:
+                use &= (wl >= self.zero_search_region[0]) & (wl <= self.zero_search_region[1])
+            qtw.QApplication.processEvents()
+            return np.sqrt(np.nanmean(delta_od[use]**2))    #rms deltaO, whatever the sign of the signal
+
+        import ta_zero                      #scipy, imported on first use, not needed for analysis
+        search = ta_zero.ZeroSearch(move, measure, self.zero_search_span, shape=shape)
+        self.timer.start_scan(search.points*search.levels)
+        sequencer.start()
+        try:
+            t0, sigma = search.run()
+            sequencer.finish()
+        finally:
+            self.timer.finish()
+        self.zero = engine.counts(t0)
+        self.zero_pos_mm = self.calibration.mm(self.zero)
+        self.set_zero_delay_label.setText("Zero delay = " + str(self.zero_pos_mm) + " mm, width = "
+                                          + str(round(sigma)) + " fs")
+        delays = np.sort(search.delays) - t0
+        self.graphicsView.plot(np.array(search.delays) - t0, search.signal, pen=None, symbolPen='w',
+                               symbol='o', symbolSize=4, clear=True)
+        self.graphicsView.plot(delays, search.result[2] + search.result[3]*ta_zero.model(delays, 0, sigma, shape),
+                               pen=(0, 114, 189))
+        self.graphicsView.setLabel("bottom", "Delay", units="fs")
+        self.move_stage_fs(0)
+        return self.zero
+
+    def tune_stage(self, steps_fs=(1, 10, 100, 1000, 10000, 100000)):
+        '''
+        Time moves of the usual step sizes (and of the Dynamics step) around
+        zero delay for the ta_motion settings grid; the quickest settings that
+        keep the position within tolerance are saved and used by the scans.
+        '''
+        steps_fs = set(steps_fs)
+        if self.dyn_stpdelay_lineEdit.text().lstrip('-').isdigit():
+            steps_fs.add(abs(int(self.dyn_stpdelay_lineEdit.text())))
+        center = self.zero if self.calibration.defined else self.stage.status["position"]
+        tuner = ta_motion.MotionTuner(self.stage, self.stage_tolerance, calibration=self.calibration)
+        steps = [self.calibration.distance(fs) for fs in sorted(steps_fs - {0})]
+        grid = ta_devices.load_config()['motion_grid']
+        with ThreadPoolExecutor(max_workers=1) as executor:     #the window stays responsive, Escape stops
+            future = executor.submit(tuner.tune, steps, center=center, **grid)
+            while not future.done():
+                done, total = tuner.progress
+                self.align_label.setText("Tuning the stage motion: " + str(done) + "/" + str(total)
+                                         + " settings (Escape stops)")
+                qtw.QApplication.processEvents()
+                if escape_pressed():
+                    tuner.stop()
+                time.sleep(0.02)
+        try:
+            profile = future.result()
+        except ValueError as error:         #a step beyond the stage travel
+            self.align_label.setText("Stage tuning failed: " + str(error))
+            return
+        if not profile.entries:
+            self.align_label.setText("Stage tuning failed: no setting settles within tolerance")
+            return
+        profile.save()
+        self.motion_profile = profile
+        self.align_label.setText('\n'.join("<= " + str(round(entry['max_step']/self.calibration.counts_per_fs)) + " fs: "
+                                           + "%.0f ms" % (entry['settle']*1000) for entry in profile.entries))
+
     def move_stage_rel(self, step_fs):
-        step = int(step_fs * 0.0003 * 20000)                     
-        if (int(self.stage.status["position"]) + step) <= 4400000:          
-            self.stage.move_relative(step)            
-            while True:
-                curr_pos_mm = self.stage.status["position"]
-                if type(self.zero) == int:
-                    curr_pos_fs = int((curr_pos_mm - self.zero)/(20000*0.0003))
-                    self.align_label.setText("Position = " + str(curr_pos_fs) + " fs")
-                    self.arb_move_label.setText("Position = " + str(curr_pos_mm/20000) + " mm")
-                    if curr_pos_fs == step_fs:
-                        break
-                else:
-                    self.arb_move_label.setText("Position = " + str(curr_pos_mm/20000) + " mm")                
-                    self.align_label.setText("Delay zero not defined")
-                    if curr_pos_mm == step_fs:
-                        break
-                qtw.QApplication.processEvents() 
+        self.move_stage_counts(self.stage.status["position"] + self.calibration.distance(step_fs))
 
     def move_stage_mm(self):
-        position_mm = float(self.arb_move_lineEdit.text()) * 20000
-        position_mm = int(position_mm)
-        if position_mm <= 4400000 or position_mm >= 0:          
-            self.stage.move_absolute(position_mm)         
-            while True:
-                curr_pos_mm = self.stage.status["position"]
-                if type(self.zero) == int:
-                    self.curr_pos_fs = int((curr_pos_mm - self.zero)/(20000*0.0003))
-                    self.arb_move_label.setText("Position = " + str(curr_pos_mm/20000) + " mm")                
-                    self.align_label.setText("Position = " + str(self.curr_pos_fs) + " fs")
-                    if curr_pos_mm == position_mm:
-                        break
-                else:
-                    self.curr_pos_fs = int(curr_pos_mm/(20000*0.0003))
-                    self.arb_move_label.setText("Position = " + str(curr_pos_mm/20000) + " mm")                
-                    self.align_label.setText("Delay zero not defined")
-                    if curr_pos_mm == position_mm:
-                        break
-                qtw.QApplication.processEvents()
+        self.move_stage_counts(self.calibration.from_mm(float(self.arb_move_lineEdit.text())))
 
     def move_stage_fs(self, position_fs):
-        position_mm = int(round(position_fs * 0.0003 * 20000))
-        delay_zero = self.zero
-        new_position = delay_zero + position_mm                
-        if new_position <= 4400000 or position_mm >= 0:          
-            self.stage.move_absolute(new_position)            
+        if not self.calibration.defined:
+            self.align_label.setText("Delay zero not defined")
+            return False
+        return self.move_stage_counts(self.calibration.counts(position_fs))
+
+    def move_stage_counts(self, target):
+        '''
+        Move to target (counts) through the unidirectional approach of the
+        calibration, showing the position; False if target is outside the
+        stage travel.
+        '''
+        try:
+            self.calibration.check(target)
+        except ValueError as error:
+            self.align_label.setText(str(error))
+            return False
+        for position in self.calibration.approach(self.stage.status["position"], target):
+            self.stage.move_absolute(position)
             while True:
-                curr_pos_mm = self.stage.status["position"]
-                self.curr_pos_fs = int((curr_pos_mm - self.zero)/(20000*0.0003))
-                self.align_label.setText("Position = " + str(self.curr_pos_fs) + " fs")
-                self.arb_move_label.setText("Position = " + str(curr_pos_mm/20000) + " mm")              
-                if self.curr_pos_fs == position_fs:
+                current = self.stage.status["position"]
+                self.show_position(current)
+                if abs(current - position) <= self.stage_tolerance:
                     break
                 qtw.QApplication.processEvents()
+        return True
+
+    def show_position(self, counts):
+        self.arb_move_label.setText("Position = " + str(self.calibration.mm(counts)) + " mm")
+        if self.calibration.defined:
+            self.curr_pos_fs = int(round(self.calibration.delay(counts)))
+            self.align_label.setText("Position = " + str(self.curr_pos_fs) + " fs")
+        else:
+            self.align_label.setText("Delay zero not defined")
 
     def spectrum(self):    
+        if self.burst is not None:          #frames integrated after this call, from the ring buffer
+            self.burst.set_integration_time(self.int_time)
+            if self.averages == 1:
+                return self.burst.wl, self.burst.read()
+            return self.burst.wl, self.burst.average(self.averages)
         self.oceanoptics.integration_time_micros(self.int_time)       #set integration time                               
         wl = self.oceanoptics.wavelengths()                     #take spectrum
         intensity = self.oceanoptics.intensities()
+        for i in range(1, self.averages):
+            intensity = intensity + self.oceanoptics.intensities()
         
-        return wl, intensity
+        return wl, intensity/self.averages
+
+    def exposure_frame(self, int_time):
+        '''One raw frame at int_time (us), for ta_exposure.'''
+        self.int_time = int_time
+        averages, self.averages = self.averages, 1
+        try:
+            return self.spectrum()[1]
+        finally:
+            self.averages = averages
+
+    def optimize_exposure(self, budget):
+        '''
+        Integration time and averages (budget = us per spectrum) that bring the
+        pump-off probe close to saturation without reaching it; the chosen
+        values are written back to the Dynamics fields.
+        '''
+        if self.exposure is None:
+            limits = getattr(self.oceanoptics, 'integration_time_micros_limits', (1000, self.max_int_time))
+            roi = slice(None)
+            if self.exposure_region is not None:
+                wl = self.burst.wl if self.burst is not None else self.oceanoptics.wavelengths()
+                roi = (wl >= self.exposure_region[0]) & (wl <= self.exposure_region[1])
+            self.exposure = ta_exposure.AutoExposure(self.exposure_frame,
+                                                     getattr(self.oceanoptics, 'max_intensity', 65535),
+                                                     (limits[0], min(limits[1], self.max_int_time)), roi=roi,
+                                                     recheck_s=self.exposure_recheck_s)
+        self.shutter.close_shutter()
+        time.sleep(self.shutter_settle)
+        self.int_time, self.averages = self.exposure.optimize(self.int_time, budget)
+        self.reexpose = False
+        self.dyn_inttime_lineEdit.setText(str(self.int_time//1000))
+        self.dyn_averages_spinBox.setValue(self.averages)
+        return self.int_time, self.averages
+
+    def start_burst(self):
+        '''Read the spectrometer continuously on a thread (see ta_burst).'''
+        if self.burst is None:
+            self.burst = ta_burst.BurstReader(self.oceanoptics, self.burst_capacity)
+            self.burst.start(getattr(self, 'int_time', 10000))
+        self.burst_action.setChecked(True)
+
+    def stop_burst(self):
+        if self.burst is not None:
+            self.burst.stop()
+            self.burst = None
+        self.burst_action.setChecked(False)
+
+    def referenced_spectrum(self):
+        '''Main spectrum plus the probe reference read in parallel (None without reference).'''
+        if self.reference is None:
+            return self.spectrum(), None
+        self.reference.start(self.int_time)
+        spec = self.spectrum()
+        return spec, self.reference.finish(spec[0], spec[1])
 
     def alignment(self, integ_time):
         self.move_stage_fs(int(self.strt_delay_lineEdit.text()))
         self.int_time = int(self.strt_inttime_lineEdit.text()) * 1000  #read integration time in ms
+        self.graphicsView.setLabel("bottom", "Wavelength", units="nm")
         while True:
-            if keyboard.is_pressed('Escape'):
+            if escape_pressed():
                 break
-            spec = self.spectrum()
+            if self.burst is not None:          #every frame of the stream, nothing skipped
+                self.burst.set_integration_time(self.int_time)
+                spec = self.burst.wl, self.burst.stream()
+                self.align_label.setText(str(round(self.burst.frame_rate(), 1)) + " frames/s")
+            else:
+                spec = self.spectrum()
             self.graphicsView.plot(spec[0], spec[1], clear=True)
             pg.QtWidgets.QApplication.processEvents()
 
+    def acquire_background(self, int_time):
+        '''Dark (pump closed) and pump-scatter (pump open) frames with the probe blocked.'''
+        answer = qtw.QMessageBox.question(self, "Background", "Block the probe beam and press OK.",
+                                          qtw.QMessageBox.Ok | qtw.QMessageBox.Cancel)
+        if answer != qtw.QMessageBox.Ok:
+            return False
+        self.measure_background(int_time)
+        qtw.QMessageBox.information(self, "Background", "Unblock the probe beam and press OK.")
+        self.statusBar().clearMessage()
+        return True
+
+    def measure_background(self, int_time):
+        '''Background frames (device I/O only), the probe already blocked.'''
+        self.int_time = int_time
+        self.shutter.close_shutter()
+        time.sleep(self.shutter_settle)
+        if self.reference is not None:
+            self.reference.dark = 0
+        dark = [self.referenced_spectrum() for i in range(self.background_frames)]
+        self.background.store_dark(int_time, [spec[1] for spec, reference in dark])
+        if self.reference is not None:
+            self.reference.store_dark([reference for spec, reference in dark])
+        self.shutter.open_shutter()
+        time.sleep(self.shutter_settle)
+        self.background.store_scatter(int_time, [self.spectrum()[1] for i in range(self.background_frames)])
+        self.shutter.close_shutter()
+
+    def refresh_background(self, prompt=True):
+        '''
+        New dark/scatter frames when they are stale. Once the prompt is
+        cancelled, it is not shown again for that integration time in this
+        session: the old frames (or none) are used, as the status bar says.
+        With prompt=False (scan running) the old frames are always used.
+        '''
+        if not self.background.stale(self.int_time):
+            return
+        if (prompt and not (self.queue_running or self.remote_busy)     #nobody to block the probe
+                and self.background_declined != self.int_time):
+            if self.acquire_background(self.int_time):
+                return
+            self.background_declined = self.int_time
+        self.statusBar().showMessage("Background not refreshed: " + ("measuring with the old one"
+                                     if self.int_time in self.background.dark else "measuring without one"))
+
+    def background_prompt(self, text, buttons, answered):
+        '''Non-modal message box: answered(ok) is called from the GUI event loop, nothing waits on it.'''
+        box = qtw.QMessageBox(qtw.QMessageBox.Question, "Background", text, buttons, self)
+        box.setWindowModality(Qt.NonModal)
+        box.buttonClicked.connect(lambda button: answered(box.standardButton(button) == qtw.QMessageBox.Ok))
+        self.background_box = box
+        box.show()
+
+    def close_background_prompt(self):
+        if self.background_box is not None:
+            self.background_box.done(0)
+            self.background_box = None
+            self.statusBar().clearMessage()
+
+    def scan_background(self, engine, int_time):
+        '''
+        Background for a new integration time in the middle of a scan, with
+        the engine paused: the prompts are non-modal, so the GUI (Escape,
+        remote stop) stays live while nobody answers, and the engine is
+        resumed once they are answered.
+        '''
+        def blocked(ok):
+            self.background_box = None
+            if engine.stopped.is_set():             #scan stopped while waiting
+                return
+            if not ok:
+                self.background_declined = int_time
+                self.refresh_background(prompt=False)
+                engine.resume()
+                return
+            self.measure_background(int_time)
+            self.background_prompt("Unblock the probe beam and press OK to go on with the scan.",
+                                   qtw.QMessageBox.Ok, unblocked)
+
+        def unblocked(ok):
+            self.background_box = None
+            self.statusBar().clearMessage()
+            engine.resume()
+
+        self.statusBar().showMessage("Scan paused: background needed for the new integration time")
+        self.background_prompt("Scan paused: block the probe beam and press OK (Cancel to go on without "
+                               "a background).", qtw.QMessageBox.Ok | qtw.QMessageBox.Cancel, blocked)
+
+    def acquire_frames(self):
+        '''Pump-off and pump-on frames (device I/O only, safe to run off the GUI thread).'''
+        with self.timer.phase('shutter'):
+            self.shutter.close_shutter()        #close shutter
+        with self.timer.phase('settle'):
+            time.sleep(self.shutter_settle)
+        with self.timer.phase('spectrum'):
+            spec_off, ref_off = self.referenced_spectrum()
+        with self.timer.phase('shutter'):
+            self.shutter.open_shutter()         #open shutter
+        with self.timer.phase('settle'):
+            time.sleep(self.shutter_settle)
+        with self.timer.phase('spectrum'):
+            spec_on, ref_on = self.referenced_spectrum()
+        with self.timer.phase('shutter'):
+            self.shutter.close_shutter()
+
+        return spec_off, ref_off, spec_on, ref_on
+
+    def process_frames(self, frames, row=-1):
+        spec_off, ref_off, spec_on, ref_on = frames[:4]
+        with self.timer.phase('deltaO', row):
+            off, on = self.background.correct(self.int_time, spec_off[1], spec_on[1])
+            if self.reference is not None:
+                on = ref.normalize(on, ref_on, ref_off)     #remove probe drift between the two frames
+            TransientAbsorption.wl_array = np.round(spec_on[0], 2)
+            TransientAbsorption.deltaO_array = bg.delta_od(on, off)
+
+        return TransientAbsorption.wl_array, TransientAbsorption.deltaO_array         
+
     def ta_spectrum(self):
         TransientAbsorption.wl_array = []
         TransientAbsorption.deltaO_array = []
-        
-        self.shutter.close_shutter()            #close shutter
-        time.sleep(0.5)
-        spec_off = self.spectrum()
-        self.shutter.open_shutter()             #open shutter
-        time.sleep(0.5)
-        spec_on = self.spectrum()
-        self.shutter.close_shutter()
-        
-        TransientAbsorption.wl_array = np.round(spec_on[0], 2)
-        TransientAbsorption.deltaO_array = - np.log10(spec_on[1]/spec_off[1])
 
-        return TransientAbsorption.wl_array, TransientAbsorption.deltaO_array         
+        return self.process_frames(self.acquire_frames())
 
     def ta_dynamics(self, one_shot=bool):
+        self.graphicsView.setLabel("bottom", "Wavelength", units="nm")     #find_zero plots against delay
         if one_shot == True:
             TransientAbsorption.ta_array = []
             
             self.int_time = int(self.spc_inttime_lineEdit.text()) * 1000  #read integration time in ms
-            self.move_stage_fs(int(self.spc_delay_lineEdit.text()))         #delay
+            self.refresh_background()
+            if not self.move_stage_fs(int(self.spc_delay_lineEdit.text())):      #delay
+                self.spec_currpos_label.setText(self.align_label.text())
+                if self.queue_running or self.remote_busy:
+                    raise ValueError(self.align_label.text())
+                return
             self.spec_currpos_label.setText("Position = " + str(self.curr_pos_fs) + " fs")
             qtw.QApplication.processEvents()
             TransientAbsorption.ta_array = self.ta_spectrum()
@@ -272,49 +675,545 @@ class TransientAbsorption(qtw.QMainWindow, Ui_MainWindow):
             self.ini_delay = int(self.dyn_inidelay_lineEdit.text())
             self.fin_delay = int(self.dyn_findelay_lineEdit.text())
             self.stp_delay = int(self.dyn_stpdelay_lineEdit.text())
-            d_array = []
-        
-            for d in range(self.ini_delay, (self.fin_delay + self.stp_delay), self.stp_delay):
-                if keyboard.is_pressed('Escape'):
-                    break
-                d_array.append(d)
-                
-                self.move_stage_fs(d)
-                self.dyn_currpos_label.setText("Position = " + str(self.curr_pos_fs) + " fs")
-                qtw.QApplication.processEvents()
-                ta = self.ta_spectrum()
-                self.graphicsView.plot(ta[0], ta[1], pen =(0, 114, 189), symbolPen ='w',
-                                       symbol='o', symbolSize=3, clear=False)
-                if d == self.ini_delay:
-                    TransientAbsorption.ta_array = (ta)
-                else:
-                    TransientAbsorption.ta_array = np.vstack((TransientAbsorption.ta_array, ta[1]))
-                    
-                pg.QtWidgets.QApplication.processEvents()
+            n_sweeps = self.dyn_sweeps_spinBox.value()
+            self.averages = self.dyn_averages_spinBox.value()
+            auto_exposure = self.dyn_autoexposure_checkBox.isChecked()
+            budget = self.int_time*self.averages            #us per spectrum
+            if self.recorder is not None:
+                self.record_scan_start(n_sweeps, auto_exposure)
+            if auto_exposure:
+                self.optimize_exposure(budget)
+            self.refresh_background()
+            delays = np.arange(self.ini_delay, (self.fin_delay + self.stp_delay), self.stp_delay)
+            try:
+                self.calibration.check(self.calibration.counts(delays))
+            except ValueError as error:         #zero not set or grid beyond the stage travel
+                self.dyn_out_range_label.setText(str(error))
+                if self.queue_running or self.remote_busy:
+                    raise
+                return
+            self.n_points = len(delays)
+            self.timer.start_scan(self.n_points * n_sweeps)
+            self.accumulator = None
+            self.scan_delays = delays
+            self.live_fit = self.start_live_fit()
+            self.scan_curves = {}
+            self.scan_wl = None
+            self.stderr_curves = None
+            self.scan_folder = None
+            if n_sweeps > 1:                    #every sweep is also kept on disk
+                self.scan_folder = os.path.join(self.sweeps_folder, time.strftime('%Y%m%d_%H%M%S'))
+
+            sequencer = ta_sequencer.FrameSequencer(self.shutter, self.referenced_spectrum, self.shutter_settle,
+                                                    self.off_frame_max_age, self.timer, self.stage_settle)
+            self.engine = ta_scan_engine.ScanEngine(self.stage, self.calibration, sequencer.acquire, self.timer,
+                                                    self.stage_tolerance, profile=self.motion_profile)
+            self.quality = ta_quality.QualityCheck(saturation=getattr(self.oceanoptics, 'max_intensity', None))
+            self.remeasure_log = []
+            self.rejected_off = set()           #pump-off frames of rejected points
+            self.sequencer = sequencer
+            self.off_index = np.full((n_sweeps, self.n_points), -1)
+            self.start_telemetry()
+            self.acquisition_windows = np.full((n_sweeps, self.n_points, 2), np.nan)
+            self.scan_window = [time.monotonic(), None]
+            try:
+                for self.sweep in range(n_sweeps):
+                    self.sweep_order = np.arange(self.n_points)
+                    if self.sweep % 2 == 1:
+                        self.sweep_order = self.sweep_order[::-1]   #no fly-back move between sweeps
+                    self.sweep_writer = None
+                    self.attempts = {}
+                    self.engine.run(delays[self.sweep_order], self.scan_point,
+                                    idle=pg.QtWidgets.QApplication.processEvents, stop_requested=escape_pressed,
+                                    on_pause=lambda: self.reexpose_scan(budget, sequencer))
+                    if self.sweep_writer is not None:
+                        self.sweep_writer.close(off_index=self.off_index[self.sweep])
+                    if self.engine.stopped.is_set():
+                        break
+                    if auto_exposure and self.sweep + 1 < n_sweeps and self.exposure.recheck():
+                        self.engine.pause()     #served at the first point of the next sweep, as a drift
+                sequencer.finish()
+            finally:
+                self.close_background_prompt()     #left open by a scan stopped while paused
+                self.timer.finish()      #later one-shot phases are not added to the scan
+            self.scan_window[1] = time.monotonic()
+            off_index = self.off_index
+            if auto_exposure and self.reexpose:     #seen in the last points, too late to act on
+                self.dyn_out_range_label.setText("Exposure drifted at the end of the scan")
 
-            TransientAbsorption.delay_array = d_array
-            TransientAbsorption.delay_array = np.array(TransientAbsorption.delay_array)
+            if self.accumulator is None:            #stopped or every point rejected before the first was kept
+                TransientAbsorption.ta_array = (self.scan_wl[np.newaxis] if self.scan_wl is not None
+                                                else np.empty((1, 0)))     #header (wavelengths) only
+                valid = np.zeros(self.n_points, dtype=bool)
+                self.dyn_out_range_label.setText("No points acquired")
+            else:
+                valid = self.accumulator.count > 0
+                TransientAbsorption.ta_array = TransientAbsorption.ta_array[np.r_[True, valid]]
+            TransientAbsorption.delay_array = delays[valid]
+            TransientAbsorption.off_index_array = off_index[0][valid] if n_sweeps == 1 else off_index[:, valid]
             self.delay_string = np.array2string(self.delay_array, precision=2, separator=' ',
                                                 suppress_small=True)
+            if self.recorder is not None:
+                self.recorder.mark('ta_dynamics_end', {'seconds': self.recorder.now() - self.recorder.marks[-1][0],
+                                                       'checksum': ta_replay.checksum(TransientAbsorption.ta_array,
+                                                                                      TransientAbsorption.delay_array)})
+                self.recorder.save()
+
+    def reexpose_scan(self, budget, sequencer):
+        '''
+        New exposure in the middle of a scan (engine paused at a point
+        boundary): every point keeps the deltaO of its own frames, so a
+        single long sweep follows the probe drift too. Never blocks: the
+        stored background of the new integration time is used, even if stale;
+        without one, the engine stays paused on a non-modal prompt
+        (scan_background) and False is returned.
+        '''
+        self.optimize_exposure(budget)
+        sequencer.start()                           #off frame of the old exposure not reused
+        if (self.int_time in self.background.dark or self.queue_running or self.remote_busy
+                or self.background_declined == self.int_time):
+            self.refresh_background(prompt=False)
+            return True
+        self.scan_background(self.engine, self.int_time)
+        return False
+
+    def record_scan_start(self, n_sweeps, auto_exposure):
+        '''Settings of the scan about to start, for ta_replay to run it again from the device log.'''
+        values = {'zero': self.zero, 'int_time': self.int_time, 'sweeps': n_sweeps, 'averages': self.averages,
+                  'auto_exposure': auto_exposure, 'shutter_settle': self.shutter_settle,
+                  'stage_settle': self.stage_settle, 'off_frame_max_age': self.off_frame_max_age,
+                  'exposure_recheck_s': self.exposure_recheck_s, 'background_refresh_s': self.background.refresh_s}
+        for name in ('dyn_inttime', 'dyn_inidelay', 'dyn_findelay', 'dyn_stpdelay', 'dyn_fitbands'):
+            values[name] = getattr(self, name + '_lineEdit').text()
+        background = {}
+        if not self.background.stale(self.int_time):
+            background = {'dark': self.background.dark[self.int_time][1],
+                          'scatter': self.background.scatter[self.int_time][1]}
+        self.recorder.mark('ta_dynamics', values, **background)
+
+    def scan_point(self, i, d, position, frames):
+        '''
+        Process, store and plot acquisition i of the current sweep while the
+        stage moves to the next delay. Repeated sweeps are averaged into
+        ta_array (running mean) and the plot shows the average of every delay
+        plus the standard error band of the latest one.
+        '''
+        k = self.sweep_order[i]                     #delay index in the grid
+        row = self.engine.row                       #timer row
+        self.curr_pos_fs = int(round(self.calibration.delay(position)))
+        self.dyn_currpos_label.setText("Position = " + str(self.curr_pos_fs) + " fs")
+        ta = self.process_frames(frames, row)
+        self.scan_wl = ta[0]
+        if self.exposure is not None and self.dyn_autoexposure_checkBox.isChecked():
+            self.reexpose |= self.exposure.check(frames[0][1]) | self.exposure.check(frames[2][1])
+            if self.reexpose:                       #at the next point boundary, see reexpose_scan
+                self.engine.pause()
+        reason = self.quality.check(frames[0][1], frames[2][1])
+        if reason is None and frames[4] in self.rejected_off:      #shared before the rejection reached us
+            reason = 'pump-off frame of a rejected point'
+        if reason is not None:                      #measure the point again at the end of the sweep
+            self.rejected_off.add(frames[4])
+            self.sequencer.discard_off(frames[4])
+            self.attempts[k] = self.attempts.get(k, 0) + 1
+            action = 'remeasure' if self.attempts[k] <= self.max_remeasure else 'dropped'
+            self.remeasure_log.append({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'sweep': self.sweep,
+                                       'delay': int(d), 'attempt': self.attempts[k], 'reason': reason,
+                                       'action': action})
+            if action == 'remeasure':
+                self.engine.requeue(i)
+            self.dyn_out_range_label.setText(str(int(d)) + " fs: " + reason + " - " + action)
+            return
+        self.off_index[self.sweep, k] = frames[4]
+        self.acquisition_windows[self.sweep, k] = self.engine.window
+        if self.accumulator is None:
+            TransientAbsorption.ta_array = np.empty((self.n_points + 1, len(ta[0])))
+            TransientAbsorption.ta_array[0] = ta[0]
+            self.accumulator = ta_accumulator.SweepAccumulator(self.n_points, len(ta[0]),
+                                                               mean=TransientAbsorption.ta_array[1:])
+        self.accumulator.add(k, ta[1])
+        if self.scan_folder is not None:
+            if self.sweep_writer is None:
+                self.sweep_writer = ta_storage.ScanWriter(
+                    os.path.join(self.scan_folder, 'sweep_%03d' % self.sweep + ta_storage.EXTENSION),
+                    ta[0], np.arange(self.ini_delay, (self.fin_delay + self.stp_delay), self.stp_delay),
+                    {'int_time': self.int_time, 'sweep': self.sweep}, np.float32,
+                    self.storage_compression, self.storage_precision)
+            self.sweep_writer.write(k, ta[1])
+        if self.live_fit is not None:
+            self.update_live_fit(ta[0], row)
+        mean = self.accumulator.mean[k]
+        with self.timer.phase('plot', row):
+            if k in self.scan_curves:
+                self.scan_curves[k].setData(ta[0], mean)
+            else:
+                self.scan_curves[k] = self.graphicsView.plot(ta[0], mean, pen =(0, 114, 189), symbolPen ='w',
+                                                             symbol='o', symbolSize=3, clear=False)
+            if self.accumulator.count[k] > 1:
+                stderr = self.accumulator.stderr(k)
+                if self.stderr_curves is None:
+                    self.stderr_curves = [self.graphicsView.plot(pen=pg.mkPen((255, 152, 138), width=1))
+                                          for sign in (1, -1)]
+                for curve, sign in zip(self.stderr_curves, (1, -1)):
+                    curve.setData(ta[0], mean + sign*stderr)
+        summary = self.timer.summary()
+        if self.accumulator.count.max() > 1:
+            summary = ("Sweep " + str(self.sweep + 1) + ", median standard error = "
+                       + "%.2g" % np.nanmedian(self.accumulator.stderr(k)) + "\n" + summary)
+        self.dyn_out_range_label.setText(summary)
+        if self.remote is not None and self.remote.subscribed('point'):
+            self.remote.publish('point', {'sweep': self.sweep, 'index': int(k), 'delay': float(d),
+                                          'position': int(position), 'delta_od': ta[1].tolist()})
+        self.publish_status()
+
+    def start_live_fit(self):
+        '''LiveFit of the bands typed in the Dynamics tab, None if there are none.'''
+        try:
+            bands = [tuple(float(value) for value in band.split(':'))
+                     for band in self.dyn_fitbands_lineEdit.text().split()]
+        except ValueError:
+            self.dyn_fit_label.setText("Fit bands: wl_min:wl_max in nm, separated by spaces")
+            return None
+        if not bands or any(len(band) != 2 for band in bands):
+            self.dyn_fit_label.setText("")
+            return None
+        import ta_livefit                   #scipy, imported on first use, not needed for analysis
+        return ta_livefit.LiveFit(bands, self.dyn_fitexp_spinBox.value())
+
+    def start_telemetry(self):
+        '''Start recording the stage and shutter state, once the devices are connected.'''
+        if self.telemetry is None and self.stage is not None:
+            self.telemetry = ta_telemetry.Telemetry(self.stage, self.shutter, self.telemetry_rate,
+                                                    self.telemetry_capacity)
+            self.telemetry.start()
+
+    def scan_telemetry(self):
+        '''
+        Telemetry samples of the last scan and the delay (fs) measured during
+        the acquisition of every point (sweeps x valid delays, NaN where not
+        acquired or no longer in the buffer); None without telemetry.
+        '''
+        if self.telemetry is None or self.scan_window is None or self.scan_window[1] is None:
+            return None
+        samples = self.telemetry.samples(*self.scan_window)
+        windows = self.acquisition_windows
+        if self.accumulator is not None:
+            windows = windows[:, self.accumulator.count > 0]
+        true_delay = ta_telemetry.true_delays(samples, windows, self.calibration)
+        return samples, true_delay, self.telemetry.shutter_events(*self.scan_window)
+
+    def update_live_fit(self, wl, row=-1):
+        '''Fit the bands again with the latest point; stop the scan once converged if asked to.'''
+        measured = self.accumulator.count > 0
+        with self.timer.phase('fit', row):
+            self.live_fit.update(wl, self.scan_delays[measured], self.accumulator.mean[measured])
+        text = self.live_fit.summary()
+        if self.live_fit.converged and self.dyn_fitstop_checkBox.isChecked() and not self.engine.stopped.is_set():
+            self.engine.stop()
+            text += "\nScan stopped: fit converged"
+        self.dyn_fit_label.setText(text)
+        if self.remote is not None and self.remote.subscribed('fit'):
+            self.remote.publish('fit', {'sweep': self.sweep, 'bands': self.live_fit.results()})
 
     def save(self, mode=str):
         if mode == 'transient_spectrum':
+            file_spec = qtw.QFileDialog.getSaveFileName(filter="Text (*.txt);;TA scan folder (*.tas)")[0]
+            if file_spec.endswith(ta_storage.EXTENSION):
+                self.save_scan(file_spec)
+                return
             raw_ta_array = np.vstack(TransientAbsorption.ta_array)
             ta_data = raw_ta_array.transpose()
-            file_spec = qtw.QFileDialog.getSaveFileName()[0]
             np.savetxt(file_spec, ta_data, header=self.delay_string[1:-1])  #fmt='%1.2f',
+            self.register_scan(file_spec)
+            if self.timer.rows:
+                self.timer.save(os.path.splitext(file_spec)[0] + '_timing.txt')
+            if self.remeasure_log:
+                with open(os.path.splitext(file_spec)[0] + '_remeasured.txt', 'w') as file:
+                    for entry in self.remeasure_log:
+                        file.write('\t'.join(str(value) for value in entry.values()) + '\n')
+            telemetry = self.scan_telemetry()
+            if telemetry is not None:
+                np.save(os.path.splitext(file_spec)[0] + '_telemetry.npy', telemetry[0])
+                np.savetxt(os.path.splitext(file_spec)[0] + '_true_delay.txt', telemetry[1].T,
+                           header='delay (fs) measured during the acquisition, one column per sweep')
+            if np.shape(TransientAbsorption.off_index_array) == np.shape(TransientAbsorption.delay_array):
+                np.savetxt(os.path.splitext(file_spec)[0] + '_off_index.txt',
+                           np.transpose([TransientAbsorption.delay_array, TransientAbsorption.off_index_array]),
+                           fmt='%d', header='delay (fs), pump-off frame used')
         elif mode == 'dynamics':
             raw_ta_array = np.vstack(TransientAbsorption.dynamics_array)                      
             ta_data = raw_ta_array.transpose()
             file_spec = qtw.QFileDialog.getSaveFileName()[0]
             np.savetxt(file_spec, ta_data)                                  #, fmt='%1.2f'
 
+    def save_scan(self, folder):
+        '''Binary scan folder (see ta_storage), readable memory-mapped by the viewer.'''
+        extra = {}
+        if np.shape(TransientAbsorption.off_index_array)[-1:] == np.shape(TransientAbsorption.delay_array):
+            extra['off_index'] = TransientAbsorption.off_index_array
+        if self.accumulator is not None and self.accumulator.count.max() > 1:
+            valid = self.accumulator.count > 0
+            extra['stderr'] = self.accumulator.stderr()[valid]
+            extra['sweep_count'] = self.accumulator.count[valid]
+        telemetry = self.scan_telemetry()
+        if telemetry is not None:                   #stage/shutter samples, delays measured, shutter commands
+            extra['telemetry'], extra['true_delay'], extra['shutter_events'] = telemetry
+        ta_storage.save_scan(folder, TransientAbsorption.ta_array[0], TransientAbsorption.delay_array,
+                             TransientAbsorption.ta_array[1:], {'int_time': self.int_time,
+                                                                'sample': self.dyn_sample_lineEdit.text(),
+                                                                'sweeps': self.dyn_sweeps_spinBox.value(),
+                                                                'remeasured': self.remeasure_log,
+                                                                'live_fit': self.live_fit.results()
+                                                                if self.live_fit is not None else []},
+                             self.storage_compression, self.storage_precision, **extra)
+        if self.timer.rows:
+            self.timer.save(os.path.join(folder, 'timing.txt'))
+        self.register_scan(folder)
+
+    def register_scan(self, path):
+        '''Add a saved scan to the catalog searched by the viewer (see ta_catalog).'''
+        catalog = ta_catalog.Catalog()
+        catalog.register(path, sample=self.dyn_sample_lineEdit.text() or None,
+                         int_time=getattr(self, 'int_time', None))
+        catalog.close()
+
+    def load_scan(self, file_spec=None):
+        '''Load a saved scan and show its dynamics (no devices needed).'''
+        if not file_spec:
+            file_spec = qtw.QFileDialog.getOpenFileName()[0]
+            if not file_spec:
+                return
+        scan = ta_storage.load(file_spec, mmap=False)
+        TransientAbsorption.ta_array = np.vstack((scan.wl, scan.delta_od))
+        TransientAbsorption.wl_array = scan.wl
+        TransientAbsorption.delay_array = scan.delays
+        self.delay_string = np.array2string(self.delay_array, precision=2, separator=' ',
+                                            suppress_small=True)
+        self.open_ta_window()
+
+    def open_viewer(self, path=None):
+        import ta_viewer
+        self.viewer = ta_viewer.OfflineViewer(path)
+        self.viewer.show()
+
+    def recipe(self, name):
+        '''Recipe with the current fields of the Dynamics tab.'''
+        return ta_queue.recipe(name, ini_delay=int(self.dyn_inidelay_lineEdit.text()),
+                               fin_delay=int(self.dyn_findelay_lineEdit.text()),
+                               stp_delay=int(self.dyn_stpdelay_lineEdit.text()),
+                               int_time=int(self.dyn_inttime_lineEdit.text()),
+                               averages=self.dyn_averages_spinBox.value(), sweeps=self.dyn_sweeps_spinBox.value())
+
+    def apply_recipe(self, recipe):
+        self.dyn_inidelay_lineEdit.setText(str(recipe['ini_delay']))
+        self.dyn_findelay_lineEdit.setText(str(recipe['fin_delay']))
+        self.dyn_stpdelay_lineEdit.setText(str(recipe['stp_delay']))
+        self.dyn_inttime_lineEdit.setText(str(recipe['int_time']))
+        self.dyn_sweeps_spinBox.setValue(recipe['sweeps'])
+        self.dyn_averages_spinBox.setValue(recipe.get('averages', 1))
+
+    def run_queue(self):
+        '''
+        Measure the queued recipes back to back until the queue is empty,
+        paused (after the current recipe) or stopped with Escape. Each scan
+        is saved to queue_folder/<name>.tas; a recipe that fails is logged
+        and the queue goes on with the next one.
+        '''
+        if self.queue_running:
+            return
+        if self.scanning:
+            self.statusBar().showMessage("Busy: the queue starts once the running measurement is over", 5000)
+            return
+        self.queue.paused = False
+        self.queue_running = True
+        self.scanning = True
+        try:
+            while True:
+                recipe = self.queue.next()
+                if recipe is None:
+                    break
+                self.queue.start(recipe)
+                self.queue_changed()
+                self.apply_recipe(recipe)
+                output = os.path.join(self.queue_folder, recipe['name'] + ta_storage.EXTENSION)
+                if os.path.exists(output):
+                    output = os.path.join(self.queue_folder, recipe['name'] + time.strftime('_%Y%m%d_%H%M%S')
+                                          + ta_storage.EXTENSION)
+                self.clear()
+                try:
+                    stale = self.background.stale(int(recipe['int_time']) * 1000)
+                    self.ta_dynamics(False)
+                    self.save_scan(output)
+                except Exception as error:
+                    self.queue.finish(recipe, 'failed', error=repr(error))
+                    continue
+                finally:
+                    self.queue_changed()
+                stopped = self.engine.stopped.is_set()
+                self.queue.finish(recipe, 'stopped' if stopped else 'done', output, stale_background=stale,
+                                  remeasured=len(self.remeasure_log))
+                if stopped:
+                    break
+        finally:
+            self.queue_running = False
+            self.scanning = False
+            self.queue_changed()
+            self.publish_status()
+
+    def queue_changed(self):
+        if getattr(self, 'queue_window', None) is not None:
+            self.queue_window.update_list()
+
+    def open_queue_window(self):
+        self.queue_window = QueueWindow(self)
+        self.queue_window.show()
+
+    def start_remote(self, port=None):
+        '''Serve the remote_* methods on localhost (see ta_remote).'''
+        if self.remote is not None:
+            return self.remote.port
+        methods = {'status': self.remote_status, 'move': self.remote_move, 'measure': self.remote_measure,
+                   'scan': self.remote_scan, 'queue_list': self.remote_queue_list,
+                   'queue_add': self.remote_queue_add, 'queue_remove': self.remote_queue_remove,
+                   'queue_run': self.remote_queue_run, 'queue_pause': self.remote_queue_pause,
+                   'stop': self.remote_stop}
+        self.remote = ta_remote.RemoteServer(methods, port=self.remote_port if port is None else port)
+        self.remote.start()
+        self.remote_timer = pg.QtCore.QTimer()
+        self.remote_timer.timeout.connect(self.remote.process)
+        self.remote_timer.start(20)
+        self.remote_action.setChecked(True)
+        self.remote_action.setText("Remote control (localhost:" + str(self.remote.port) + ")")
+        return self.remote.port
+
+    def stop_remote(self):
+        if self.remote is None:
+            return
+        self.remote_timer.stop()
+        self.remote.stop()
+        self.remote = None
+        self.remote_action.setChecked(False)
+        self.remote_action.setText("Remote control")
+
+    def device_action(self, function, *args):
+        '''Run an action of the window that uses the devices, unless another one is running.'''
+        if self.scanning:
+            self.statusBar().showMessage("Busy: wait for the running measurement to finish", 5000)
+            return None
+        self.scanning = True
+        try:
+            return function(*args)
+        finally:
+            self.scanning = False
+
+    def check_idle(self):
+        if self.scanning:
+            raise RuntimeError('Busy')
+
+    def device_call(self, function, *args):
+        '''Run a remote command that uses the devices, one at a time and never during a scan.'''
+        self.check_idle()
+        self.scanning = self.remote_busy = True
+        try:
+            return function(*args)
+        finally:
+            self.scanning = self.remote_busy = False
+            self.publish_status()
+
+    def remote_status(self):
+        position = self.stage.status["position"] if self.stage is not None else None
+        zero = self.zero
+        return {'position': position, 'zero': zero,
+                'delay_fs': self.calibration.delay(position) if None not in (position, zero) else None,
+                'int_time': getattr(self, 'int_time', None), 'busy': self.scanning,
+                'queue_pending': len(self.queue.recipes), 'queue_running': self.queue_running,
+                'progress': self.timer.summary() if self.timer.running else ''}
+
+    def publish_status(self):
+        '''Push remote_status() to the 'status' subscribers (every scan point and the end of a measurement).'''
+        if self.remote is not None and self.remote.subscribed('status'):
+            self.remote.publish('status', self.remote_status())
+
+    def remote_move(self, delay_fs):
+        if not self.device_call(self.move_stage_fs, int(delay_fs)):
+            raise ValueError(self.align_label.text())
+        return self.remote_status()                 #also pushed to the 'status' subscribers
+
+    def remote_measure(self, delay_fs, int_time=10):
+        '''One pump-on/pump-off spectrum at delay_fs (int_time in ms).'''
+        self.check_idle()                   #the fields of a running measurement are left alone
+        self.spc_delay_lineEdit.setText(str(int(delay_fs)))
+        self.spc_inttime_lineEdit.setText(str(int(int_time)))
+        self.device_call(self.ta_dynamics, True)
+        return {'wl': np.asarray(TransientAbsorption.ta_array[0]).tolist(),
+                'delta_od': np.asarray(TransientAbsorption.ta_array[1]).tolist(), 'delay_fs': self.curr_pos_fs}
+
+    def remote_scan(self, ini_delay, fin_delay, stp_delay, int_time=10, averages=1, sweeps=1, output=None):
+        '''
+        Scan with the given fields and return the delays; the deltaO of each
+        point is streamed to the 'point' subscribers, and the scan is saved
+        when output (a .tas folder) is given.
+        '''
+        recipe = ta_queue.recipe('remote', ini_delay=ini_delay, fin_delay=fin_delay, stp_delay=stp_delay,
+                                 int_time=int_time, averages=averages, sweeps=sweeps)
+        self.check_idle()
+        self.apply_recipe(recipe)
+        self.clear()
+        self.device_call(self.ta_dynamics, False)
+        if output:
+            self.save_scan(output)
+        return {'delays': np.asarray(TransientAbsorption.delay_array).tolist(),
+                'wl': np.asarray(TransientAbsorption.ta_array[0]).tolist(), 'output': output,
+                'stopped': self.engine.stopped.is_set()}
+
+    def remote_queue_list(self):
+        return {'recipes': self.queue.recipes, 'paused': self.queue.paused, 'running': self.queue_running}
+
+    def remote_queue_add(self, name, **fields):
+        recipe = ta_queue.recipe(name, **fields)
+        self.queue.add(recipe)
+        self.queue_changed()
+        return recipe
+
+    def remote_queue_remove(self, index):
+        '''Remove pending recipe index; the one being measured stays (see remote_stop).'''
+        index = int(index)
+        if self.queue_running and index == 0:
+            raise ValueError('Recipe 0 is being measured')
+        recipe = self.queue.remove(index)
+        self.queue_changed()
+        return recipe
+
+    def remote_stop(self):
+        '''Stop the running scan after the current point, and with it the queue; False when nothing runs.'''
+        if not (self.scanning and self.engine is not None and self.timer.running):
+            return False
+        self.engine.stop()
+        return True
+
+    def remote_queue_run(self):
+        '''Start the queue after the reply is sent (it runs until the queue is empty).'''
+        self.check_idle()
+        pg.QtCore.QTimer.singleShot(0, self.run_queue)
+        return len(self.queue.recipes)
+
+    def remote_queue_pause(self, paused=True):
+        self.queue.paused = paused
+        self.queue_changed()
+        return paused
+
     def clear(self):
         self.graphicsView.clear()
 
     def exit(self):
-        self.stage.set_enabled(False)
-        self.stage.close()
+        self.stop_remote()
+        self.stop_burst()
+        if self.telemetry is not None:
+            self.telemetry.stop()
+        if self.recorder is not None:
+            self.recorder.save()
+        if self.stage is not None:
+            self.stage.set_enabled(False)
+            self.stage.close()
         self.close()
 
     def open_ta_window(self):
@@ -362,8 +1261,100 @@ class DynamicsWindow(qtw.QWidget, Ui_Form):
     def exit(self):
         self.close()
 
+class QueueWindow(qtw.QWidget):
+    '''Pending recipes (run in order from the top) and the log of the finished ones.'''
+
+    def __init__(self, main):
+        super().__init__()
+        self.setObjectName("Queue")
+        self.setWindowTitle("Scan queue")
+        self.resize(700, 500)
+        self.main = main
+
+        self.name_lineEdit = qtw.QLineEdit("scan")
+        self.add_pushButton = qtw.QPushButton("Add current")
+        self.remove_pushButton = qtw.QPushButton("Remove")
+        self.up_pushButton = qtw.QPushButton("Up")
+        self.down_pushButton = qtw.QPushButton("Down")
+        self.run_pushButton = qtw.QPushButton("Run")
+        self.pause_pushButton = qtw.QPushButton("Pause")
+        self.recipes_listWidget = qtw.QListWidget()
+        self.log_listWidget = qtw.QListWidget()
+        self.status_label = qtw.QLabel("")
+
+        buttons = qtw.QHBoxLayout()
+        buttons.addWidget(qtw.QLabel("Name"))
+        buttons.addWidget(self.name_lineEdit)
+        for button in (self.add_pushButton, self.remove_pushButton, self.up_pushButton, self.down_pushButton,
+                       self.run_pushButton, self.pause_pushButton):
+            buttons.addWidget(button)
+        layout = qtw.QVBoxLayout(self)
+        layout.addLayout(buttons)
+        layout.addWidget(self.recipes_listWidget, 2)
+        layout.addWidget(qtw.QLabel("Finished"))
+        layout.addWidget(self.log_listWidget, 1)
+        layout.addWidget(self.status_label)
+
+        self.add_pushButton.clicked.connect(self.add)
+        self.remove_pushButton.clicked.connect(self.remove)
+        self.up_pushButton.clicked.connect(lambda: self.move(-1))
+        self.down_pushButton.clicked.connect(lambda: self.move(1))
+        self.run_pushButton.clicked.connect(main.run_queue)
+        self.pause_pushButton.clicked.connect(self.pause)
+        self.update_list()
+
+    def update_list(self):
+        queue = self.main.queue
+        row = self.recipes_listWidget.currentRow()
+        self.recipes_listWidget.clear()
+        self.recipes_listWidget.addItems([ta_queue.describe(recipe) for recipe in queue.recipes])
+        self.recipes_listWidget.setCurrentRow(min(row, len(queue.recipes) - 1))
+        self.log_listWidget.clear()
+        self.log_listWidget.addItems([entry['finished'] + '  ' + entry['status'] + '  ' + entry['name']
+                                      + '  ' + str(entry['output'] or entry.get('error', ''))
+                                      for entry in queue.log[::-1]])
+        if self.main.queue_running:
+            status = "Paused after the current scan" if queue.paused else "Running"
+        else:
+            status = str(len(queue.recipes)) + " recipe(s) pending"
+        self.status_label.setText(status)
+        self.pause_pushButton.setText("Resume" if queue.paused else "Pause")
+
+    def add(self):
+        self.main.queue.add(self.main.recipe(self.name_lineEdit.text() or "scan"))
+        self.update_list()
+
+    def remove(self):
+        row = self.recipes_listWidget.currentRow()
+        if row < 0:
+            return
+        if self.main.queue_running and row == 0:     #the recipe being measured
+            return
+        self.main.queue.remove(row)
+        self.update_list()
+
+    def move(self, step):
+        row = self.recipes_listWidget.currentRow()
+        if row < 0 or (self.main.queue_running and min(row, row + step) == 0):
+            return
+        self.recipes_listWidget.setCurrentRow(self.main.queue.move(row, step))
+        self.update_list()
+
+    def pause(self):
+        queue = self.main.queue
+        queue.paused = not queue.paused
+        self.update_list()
+        if not queue.paused and not self.main.queue_running:
+            self.main.run_queue()
+
 if __name__ == '__main__':
     app = qtw.QApplication([])
     tela = TransientAbsorption()
-    tela.show()
+    if '--viewer' in sys.argv:                  #analysis only: python transient_absorption_v3_ed.pyw --viewer [scan]
+        files = sys.argv[sys.argv.index('--viewer') + 1:]
+        tela.open_viewer(files[0] if files else None)
+    else:
+        if '--remote' in sys.argv:              #python transient_absorption_v3_ed.pyw --remote
+            tela.start_remote()
+        tela.show()
     app.exec_()